@@ -19,7 +19,7 @@ def main():
         db = Database(cfg["POSTGRES_DSN"])  # garante criação de schema
         # Contagem total
         try:
-            with db.conn.cursor() as cur:
+            with db.pool.connection() as conn, conn.cursor() as cur:
                 cur.execute("SELECT COUNT(*) FROM top_trends")
                 total = cur.fetchone()[0]
             print("Total rows:", total)
@@ -32,7 +32,7 @@ def main():
             print(r)
         # Últimos códigos
         try:
-            with db.conn.cursor() as cur:
+            with db.pool.connection() as conn, conn.cursor() as cur:
                 cur.execute("SELECT code, isposted, tag, created_at FROM top_trends ORDER BY created_at DESC LIMIT 10")
                 last = cur.fetchall()
             print("Last rows:", last)
@@ -40,7 +40,7 @@ def main():
             print("Last rows error:", e)
         # Verificar seeds específicos
         try:
-            with db.conn.cursor() as cur:
+            with db.pool.connection() as conn, conn.cursor() as cur:
                 cur.execute("SELECT COUNT(*) FROM top_trends WHERE code IN (%s, %s)", ("trae_demo_1", "trae_demo_2"))
                 c = cur.fetchone()[0]
             print("Seed demo present count (1/2):", c)
@@ -48,14 +48,14 @@ def main():
             print("Seed check error:", e)
         # Diagnóstico de defaults e triggers
         try:
-            with db.conn.cursor() as cur:
+            with db.pool.connection() as conn, conn.cursor() as cur:
                 cur.execute("SELECT column_name, column_default FROM information_schema.columns WHERE table_name='top_trends'")
                 cols = cur.fetchall()
             print("Column defaults:", cols)
         except Exception as e:
             print("Column defaults error:", e)
         try:
-            with db.conn.cursor() as cur:
+            with db.pool.connection() as conn, conn.cursor() as cur:
                 cur.execute("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgrelid = 'top_trends'::regclass")
                 trigs = cur.fetchall()
             print("Triggers:", trigs)
@@ -1,15 +1,26 @@
 import argparse
+import asyncio
 from typing import List
 import os
 import time
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from config import load_config
-from pipeline.collect import collect_hashtags, collect_userposts
-from pipeline.generate_and_publish import generate_and_publish
+from pipeline.collect import collect_hashtags, collect_userposts, collect_for_accounts
+from pipeline.generate_and_publish import generate_and_publish, generate_and_publish_async
 from services.db import Database
+from services.db_pool import close_pools
+from services.db_migrations import applied_versions
 from services.rapidapi_client import RapidAPIClient
+from services.response_cache import get_response_cache
+from services.host_health import get_host_scoreboard
+from services.blob_cache import get_blob_cache
+from services.jpeg_encoder import get_jpeg_encoder
+from services.provider_limits import provider_limiter, OPENAI, REPLICATE, GRAPH_API
+from services.http_transport import get_transport
+from services.adaptive_poller import poll_stats
 import json
 from reports.service_status_report import export_service_status
 from reports.ltm_reporter import sign_exports, export_all
@@ -44,6 +55,169 @@ def cmd_generate(image_url: str, style: str | None = None):
     print("Resultado:", result)
 
 
+def run_generate_and_publish(args, **kwargs) -> dict:
+    """Gera e publica; com --dag (ou PIPELINE_DAG=1) usa o pipeline assíncrono em grafo de estágios."""
+    if getattr(args, "dag", False):
+        return asyncio.run(generate_and_publish_async(**kwargs))
+    return generate_and_publish(**kwargs)
+
+
+def run_multirun_account(acc: dict, cfg: dict, args, collected: dict) -> dict:
+    """Consulta e publicação de uma conta do multirun.
+
+    Isolado por conta: exceções não se propagam para as demais contas e o
+    retorno resume status e latência de cada fase para a tabela final.
+    `collected` é o resultado de `collect_for_accounts` para a conta: a coleta
+    já foi feita de forma compartilhada e a conta só reserva itens no banco
+    (`consulta_s`). Se a coleta ou a reserva falharem, a conta publica o
+    conteúdo temático de fallback e o status fica "FALHA".
+    """
+    nome = acc.get("nome")
+    is_stories_mode = getattr(args, "stories", False)
+    summary = {"nome": nome, "itens": 0, "publicados": 0, "status": "OK",
+               "consulta_s": 0.0, "publicacao_s": 0.0, "total_s": 0.0}
+    started = time.perf_counter()
+    try:
+        hashtags = acc.get("hashtags_pesquisa", [])
+        users = acc.get("usernames", [])
+        collection_failed = bool(collected.get("failed"))
+        rows = []
+        db = None
+        try:
+            db = Database(cfg["POSTGRES_DSN"]) 
+            filter_tags = hashtags + users
+            # Reserva os itens (lease) para que workers concorrentes não publiquem o mesmo código
+            rows = db.claim_unposted(args.limit, tags=filter_tags)
+        except Exception as e:
+            print(f"⚠️ Falha ao reservar itens para {nome}: {e}")
+            collection_failed = True
+        summary["consulta_s"] = time.perf_counter() - started
+        if collection_failed:
+            summary["status"] = "FALHA"
+        if len(rows) == 0:
+            import random
+            themes = ["motivacional", "produtividade", "lideranca", "mindset", "negocios"]
+            theme_images = {
+                "motivacional": "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
+                "produtividade": "https://images.unsplash.com/photo-1484480974693-6ca0a78fb36b?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
+                "lideranca": "https://images.unsplash.com/photo-1552664730-d307ca884978?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
+                "mindset": "https://images.unsplash.com/photo-1499209974431-9dddcece7f88?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
+                "negocios": "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
+            }
+            t = random.choice(themes)
+            fallback_image = theme_images.get(t, theme_images["motivacional"]) 
+            rows = [{
+                "thumbnail_url": fallback_image,
+                "code": f"fallback_{t}_{int(time.time())}",
+                "prompt": f"Conteúdo temático sobre {t}"
+            }]
+        acc_instagram_id = acc.get("instagram_id") or cfg["INSTAGRAM_BUSINESS_ACCOUNT_ID"]
+        acc_instagram_token = acc.get("instagram_access_token") or cfg["INSTAGRAM_ACCESS_TOKEN"]
+        acc_supa_url = acc.get("supabase_url") or cfg.get("SUPABASE_URL")
+        acc_supa_key = acc.get("supabase_service_key") or cfg.get("SUPABASE_SERVICE_KEY")
+        acc_supa_bucket = acc.get("supabase_bucket") or cfg.get("SUPABASE_BUCKET")
+        summary["itens"] = len(rows)
+        publish_started = time.perf_counter()
+        for item in rows:
+            published = False
+            try:
+                result = run_generate_and_publish(
+                    args,
+                    openai_key=acc.get("openai_api_key", cfg["OPENAI_API_KEY"]),
+                    replicate_token=acc.get("replicate_token", cfg["REPLICATE_TOKEN"]),
+                    instagram_business_id=acc_instagram_id,
+                    instagram_access_token=acc_instagram_token,
+                    telegram_bot_token=acc.get("telegram_bot_token", cfg["TELEGRAM_BOT_TOKEN"]),
+                    telegram_chat_id=acc.get("telegram_chat_id", cfg["TELEGRAM_CHAT_ID"]),
+                    source_image_url=item["thumbnail_url"],
+                    caption_style=getattr(args, "style", None),
+                    content_prompt=acc.get("prompt_ia_geracao_conteudo"),
+                    caption_prompt=acc.get("prompt_ia_legenda"),
+                    original_text=item.get("prompt"),
+                    disable_replicate=bool(acc.get("disable_replicate", False)),
+                    validate_image=bool(acc.get("validate_image", False)),
+                    replicate_prompt=acc.get("prompt_ia_replicate"),
+                    supabase_url=acc_supa_url,
+                    supabase_service_key=acc_supa_key,
+                    supabase_bucket=acc_supa_bucket,
+                    account_name=nome,
+                    account_config=acc,
+                    publish_to_stories=is_stories_mode,
+                    stories_text_position="auto" if is_stories_mode else None,
+                )
+                print(f"✅ RESULTADO para {nome}: {result}")
+                if result.get("status") == "PUBLISHED":
+                    published = True
+                    summary["publicados"] += 1
+                    try:
+                        db.complete_claim(item.get("code", ""))
+                        print(f"✅ Marcado como postado: {item.get('code', '')}")
+                    except Exception:
+                        pass
+            except Exception as e:
+                print(f"❌ ERRO ao processar item para {nome}: {e}")
+                continue
+            finally:
+                if not published and db is not None:
+                    # Devolver à fila para outra tentativa
+                    try:
+                        db.release_claim(item.get("code", ""))
+                    except Exception:
+                        pass
+        summary["publicacao_s"] = time.perf_counter() - publish_started
+    except Exception as e:
+        summary["status"] = "ERRO"
+        print(f"❌ ERRO inesperado na conta {nome}: {e}")
+    summary["total_s"] = time.perf_counter() - started
+    return summary
+
+
+def print_multirun_summary(summaries: List[dict], elapsed: float, collect_s: float = 0.0):
+    """Imprime a tabela de latência por conta ao final do multirun (a coleta é compartilhada, em `collect_s`)."""
+    if not summaries:
+        print("Nenhuma conta processada.")
+        return
+    width = max(5, max(len(str(s["nome"])) for s in summaries))
+    header = f"{'Conta':<{width}}  {'Status':<6}  {'Itens':>5}  {'Pub.':>4}  {'Consulta':>8}  {'Publicação':>10}  {'Total':>8}"
+    print("\n📊 RESUMO MULTIRUN")
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(
+            f"{str(s['nome']):<{width}}  {s['status']:<6}  {s['itens']:>5}  {s['publicados']:>4}  "
+            f"{s['consulta_s']:>7.1f}s  {s['publicacao_s']:>9.1f}s  {s['total_s']:>7.1f}s"
+        )
+    print("-" * len(header))
+    print(f"Coleta compartilhada: {collect_s:.1f}s")
+    print(f"Tempo total: {elapsed:.1f}s | Soma sequencial: {sum(s['total_s'] for s in summaries):.1f}s")
+    http_metrics = get_transport().metrics()
+    if http_metrics:
+        print("\n🌐 HTTP por host")
+        for host, m in sorted(http_metrics.items(), key=lambda kv: -kv[1]["requests"]):
+            print(f"{host}: {m['requests']} req, {m['errors']} erros, média {m['avg_ms']:.0f}ms, máx {m['max_ms']:.0f}ms")
+    cache = get_response_cache().stats()
+    lookups = cache["memory_hits"] + cache["disk_hits"] + cache["misses"]
+    if lookups:
+        print(f"\n🗄️ Cache RapidAPI: {cache['memory_hits']} hits memória, {cache['disk_hits']} hits disco, "
+              f"{cache['misses']} faltas, {cache['memory_evictions'] + cache['disk_evictions']} evicções")
+    blobs = get_blob_cache().summary()
+    if blobs["hits"] + blobs["misses"]:
+        print(f"🖼️ Cache de imagens: {blobs['hits']} reaproveitadas ({blobs['bytes_saved'] / 1024:.0f} KB), "
+              f"{blobs['misses']} baixadas ({blobs['bytes_downloaded'] / 1024:.0f} KB), {blobs['evictions']} evicções")
+    encoded = get_jpeg_encoder().summary()
+    if encoded:
+        print("\n🗜️ JPEG por classe")
+        for image_class, st in encoded.items():
+            print(f"{image_class}: {st['images']} imagens, qualidade {st['quality']}, média {st['avg_kb']:.0f} KB "
+                  f"em {st['avg_ms']:.0f}ms ({st['probes_per_image']} tentativas/imagem, {st['over_budget']} acima do orçamento)")
+    polling = poll_stats.summary()
+    if polling:
+        print("\n⏳ Polling do Instagram por fase")
+        for phase, st in polling.items():
+            print(f"{phase}: {st['runs']}x, média {st['avg_s']:.1f}s, p50 {st['p50_s']:.1f}s, "
+                  f"máx {st['max_s']:.1f}s, {st['avg_attempts']:.1f} tentativas, {st['timeouts']} timeouts")
+
+
 def main():
     """Função principal do agente de postagem automática"""
     # Obter nome do cron das variáveis de ambiente
@@ -55,6 +229,12 @@ def main():
 
     try:
         parser = argparse.ArgumentParser(description="Agente de Post Automático Instagram")
+        parser.add_argument(
+            "--dag",
+            action="store_true",
+            default=os.getenv("PIPELINE_DAG", "").lower() in ("1", "true", "yes"),
+            help="Gerar e publicar pelo pipeline assíncrono (texto e imagem em paralelo)",
+        )
         sub = parser.add_subparsers(dest="cmd")
 
         p_collect = sub.add_parser("collect", help="Coletar tendências por hashtags")
@@ -112,12 +292,28 @@ def main():
         p_multirun.add_argument("--limit", type=int, default=1, help="Qtde de itens por conta")
         p_multirun.add_argument("--only", type=str, required=False, help="Rodar apenas uma conta pelo nome exato")
         p_multirun.add_argument("--stories", action="store_true", help="Publicar como Stories em vez de Feed")
+        p_multirun.add_argument("--workers", type=int, default=1, help="Qtde de contas processadas em paralelo")
+        p_multirun.add_argument("--openai_concurrency", type=int, default=None, help="Máximo de chamadas simultâneas à OpenAI")
+        p_multirun.add_argument("--replicate_concurrency", type=int, default=None, help="Máximo de gerações simultâneas no Replicate")
+        p_multirun.add_argument("--graph_concurrency", type=int, default=None, help="Máximo de chamadas simultâneas à Graph API")
+
+        sub.add_parser("db_migrate", help="Aplica migrações pendentes do banco e lista as versões")
+
+        p_archive = sub.add_parser("db_archive", help="Arquiva itens já postados (retenção da tabela top_trends)")
+        p_archive.add_argument("--days", type=int, default=30, help="Arquivar itens postados há mais de N dias")
+
+        p_plan = sub.add_parser("db_check_plan", help="Verifica (EXPLAIN) se a reserva da fila (claim) usa o índice parcial")
+        p_plan.add_argument("--tags", required=True, help="Lista de tags separadas por vírgula")
+        p_plan.add_argument("--limit", type=int, default=10)
 
         p_clear = sub.add_parser("clear_cache", help="Limpa cache persistente do RapidAPI")
         p_clear.add_argument("--url-contains", dest="url_contains", type=str, default=None, help="Filtrar por texto no URL")
-        p_clear.add_argument("--path", dest="path", type=str, default=None, help="Nome de arquivo de cache específico")
+        p_clear.add_argument("--path", dest="path", type=str, default=None, help="Chave de uma entrada de cache específica")
         p_clear.add_argument("--older", dest="older", type=int, default=None, help="Remover entradas mais antigas que N segundos")
 
+        sub.add_parser("cache_stats", help="Mostra ocupação e acertos/faltas/evicções do cache do RapidAPI e do cache de imagens")
+        sub.add_parser("host_health", help="Mostra o placar de saúde e o circuito de cada host do RapidAPI")
+
         p_standalone = sub.add_parser("standalone", help="Gerar e publicar conteúdo sem depender de APIs externas")
         p_standalone.add_argument("--account", required=False, default="Milton_Albanez", help="Nome da conta")
         p_standalone.add_argument("--content_prompt", required=False, help="Prompt personalizado para conteúdo")
@@ -146,7 +342,8 @@ def main():
             supa_bkt = getattr(args, "supabase_bucket", None)
             if supa_url or supa_key or supa_bkt:
                 cfg = load_config()
-                result = generate_and_publish(
+                result = run_generate_and_publish(
+                    args,
                     openai_key=cfg["OPENAI_API_KEY"],
                     replicate_token=cfg["REPLICATE_TOKEN"],
                     instagram_business_id=cfg["INSTAGRAM_BUSINESS_ACCOUNT_ID"],
@@ -188,7 +385,8 @@ def main():
                 if acc_instagram_token == "TEMPORARIO_USAR_CREDENCIAIS_MILTON":
                     acc_instagram_token = cfg["INSTAGRAM_ACCESS_TOKEN"]
                 
-                result = generate_and_publish(
+                result = run_generate_and_publish(
+                    args,
                     openai_key=cfg["OPENAI_API_KEY"],
                     replicate_token=cfg["REPLICATE_TOKEN"],
                     instagram_business_id=acc_instagram_id,
@@ -267,9 +465,9 @@ def main():
                     tags_arg = getattr(args, "tags", None) or os.environ.get("POST_TAGS")
                     if tags_arg:
                         tags = [t.strip() for t in tags_arg.split(",") if t.strip()]
-                        rows = conexao_db.list_unposted_by_tags(tags, 1)
+                        rows = conexao_db.claim_unposted(1, tags=tags)
                     else:
-                        rows = conexao_db.list_unposted(1)
+                        rows = conexao_db.claim_unposted(1)
                 except Exception as e:
                     print(f"⚠️ Erro ao conectar/consultar o banco: {e}. Ativando fallback Standalone.")
                     rows = []
@@ -298,7 +496,8 @@ def main():
                 acc_caption_prompt = acc.get("prompt_ia_legenda") if acc else None
                 acc_replicate_prompt = acc.get("prompt_ia_replicate") if acc else None
                 try:
-                    result = generate_and_publish(
+                    result = run_generate_and_publish(
+                        args,
                         openai_key=cfg["OPENAI_API_KEY"],
                         replicate_token=cfg["REPLICATE_TOKEN"],
                         instagram_business_id=cfg["INSTAGRAM_BUSINESS_ACCOUNT_ID"],
@@ -327,6 +526,7 @@ def main():
                 return 0
 
             item = rows[0]
+            result = None
             acc_content_prompt = None
             acc_caption_prompt = None
             acc_replicate_prompt = None
@@ -342,7 +542,8 @@ def main():
             except Exception:
                 pass
             try:
-                result = generate_and_publish(
+                result = run_generate_and_publish(
+                    args,
                     openai_key=cfg["OPENAI_API_KEY"],
                     replicate_token=cfg["REPLICATE_TOKEN"],
                     instagram_business_id=cfg["INSTAGRAM_BUSINESS_ACCOUNT_ID"],
@@ -368,104 +569,77 @@ def main():
                 if result.get("status") == "PUBLISHED":
                     try:
                         if db_available and conexao_db:
-                            conexao_db.mark_posted(item["code"])
+                            conexao_db.complete_claim(item["code"])
                             print(f"Marcado como postado: {item['code']}")
                     except Exception:
                         pass
             except Exception as e:
                 print(f"❌ Erro na publicação: {e}")
+            finally:
+                # Item não publicado volta para a fila (sem esperar a lease expirar)
+                try:
+                    if conexao_db and not (result or {}).get("status") == "PUBLISHED":
+                        conexao_db.release_claim(item["code"])
+                except Exception:
+                    pass
             return 0
         
         elif args.cmd == "multirun":
             cfg = load_config()
-            is_stories_mode = getattr(args, "stories", False)
             try:
                 with open("accounts.json", "r", encoding="utf-8") as f:
                     accounts = json.load(f)
             except Exception as e:
                 print(f"❌ ERRO ao carregar accounts.json: {e}")
                 return 0
-            for acc in accounts:
-                nome = acc.get("nome")
-                if getattr(args, "only", None) and nome != args.only:
-                    continue
-                hashtags = acc.get("hashtags_pesquisa", [])
-                users = acc.get("usernames", [])
-                rapidapi_failed = False
-                try:
-                    if hashtags:
-                        collect_hashtags(cfg["RAPIDAPI_KEY"], cfg["RAPIDAPI_HOST"], cfg["POSTGRES_DSN"], hashtags)
-                except Exception:
-                    rapidapi_failed = True
-                try:
-                    if users and not rapidapi_failed:
-                        collect_userposts(cfg["RAPIDAPI_KEY"], cfg["RAPIDAPI_HOST"], cfg["POSTGRES_DSN"], users)
-                except Exception:
-                    rapidapi_failed = True
-                rows = []
-                try:
-                    db = Database(cfg["POSTGRES_DSN"]) 
-                    filter_tags = hashtags + users
-                    rows = db.list_unposted_by_tags(filter_tags, args.limit)
-                except Exception:
-                    rapidapi_failed = True
-                if len(rows) == 0:
-                    import random
-                    themes = ["motivacional", "produtividade", "lideranca", "mindset", "negocios"]
-                    theme_images = {
-                        "motivacional": "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
-                        "produtividade": "https://images.unsplash.com/photo-1484480974693-6ca0a78fb36b?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
-                        "lideranca": "https://images.unsplash.com/photo-1552664730-d307ca884978?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
-                        "mindset": "https://images.unsplash.com/photo-1499209974431-9dddcece7f88?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
-                        "negocios": "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?ixlib=rb-4.0.3&auto=format&fit=crop&w=1080&h=1080&q=80",
-                    }
-                    t = random.choice(themes)
-                    fallback_image = theme_images.get(t, theme_images["motivacional"]) 
-                    rows = [{
-                        "thumbnail_url": fallback_image,
-                        "code": f"fallback_{t}_{int(time.time())}",
-                        "prompt": f"Conteúdo temático sobre {t}"
-                    }]
-                acc_instagram_id = acc.get("instagram_id") or cfg["INSTAGRAM_BUSINESS_ACCOUNT_ID"]
-                acc_instagram_token = acc.get("instagram_access_token") or cfg["INSTAGRAM_ACCESS_TOKEN"]
-                acc_supa_url = acc.get("supabase_url") or cfg.get("SUPABASE_URL")
-                acc_supa_key = acc.get("supabase_service_key") or cfg.get("SUPABASE_SERVICE_KEY")
-                acc_supa_bucket = acc.get("supabase_bucket") or cfg.get("SUPABASE_BUCKET")
-                for item in rows:
-                    try:
-                        result = generate_and_publish(
-                            openai_key=acc.get("openai_api_key", cfg["OPENAI_API_KEY"]),
-                            replicate_token=acc.get("replicate_token", cfg["REPLICATE_TOKEN"]),
-                            instagram_business_id=acc_instagram_id,
-                            instagram_access_token=acc_instagram_token,
-                            telegram_bot_token=acc.get("telegram_bot_token", cfg["TELEGRAM_BOT_TOKEN"]),
-                            telegram_chat_id=acc.get("telegram_chat_id", cfg["TELEGRAM_CHAT_ID"]),
-                            source_image_url=item["thumbnail_url"],
-                            caption_style=getattr(args, "style", None),
-                            content_prompt=acc.get("prompt_ia_geracao_conteudo"),
-                            caption_prompt=acc.get("prompt_ia_legenda"),
-                            original_text=item.get("prompt"),
-                            disable_replicate=bool(acc.get("disable_replicate", False)),
-                            replicate_prompt=acc.get("prompt_ia_replicate"),
-                            supabase_url=acc_supa_url,
-                            supabase_service_key=acc_supa_key,
-                            supabase_bucket=acc_supa_bucket,
-                            account_name=nome,
-                            account_config=acc,
-                            publish_to_stories=is_stories_mode,
-                            stories_text_position="auto" if is_stories_mode else None,
-                        )
-                        print(f"✅ RESULTADO para {nome}: {result}")
-                        if result.get("status") == "PUBLISHED":
-                            try:
-                                db.mark_posted(item.get("code", ""))
-                                print(f"✅ Marcado como postado: {item.get('code', '')}")
-                            except Exception:
-                                pass
-                    except Exception as e:
-                        print(f"❌ ERRO ao processar item para {nome}: {e}")
-                        continue
+            selected = [
+                acc for acc in accounts
+                if not (getattr(args, "only", None) and acc.get("nome") != args.only)
+            ]
+            workers = max(1, getattr(args, "workers", 1) or 1)
+            provider_limiter.configure(OPENAI, getattr(args, "openai_concurrency", None))
+            provider_limiter.configure(REPLICATE, getattr(args, "replicate_concurrency", None))
+            provider_limiter.configure(GRAPH_API, getattr(args, "graph_concurrency", None))
+            started = time.perf_counter()
+            # Coleta única para todas as contas: hashtags/usuários em comum são buscados uma vez
+            collected = collect_for_accounts(cfg["RAPIDAPI_KEY"], cfg["RAPIDAPI_HOST"], cfg["POSTGRES_DSN"], selected)
+            collect_s = time.perf_counter() - started
+            print(f"⏱️ Coleta compartilhada: {collect_s:.1f}s")
+            if workers == 1:
+                summaries = [run_multirun_account(acc, cfg, args, col) for acc, col in zip(selected, collected)]
+            else:
+                print(f"⚙️ Multirun com {workers} workers para {len(selected)} contas")
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="multirun") as pool:
+                    summaries = list(pool.map(lambda pair: run_multirun_account(pair[0], cfg, args, pair[1]),
+                                              zip(selected, collected)))
+            print_multirun_summary(summaries, time.perf_counter() - started, collect_s)
+            return 0
+        elif args.cmd == "db_migrate":
+            cfg = load_config()
+            conexao_db = Database(cfg["POSTGRES_DSN"])
+            with conexao_db.pool.connection() as conn:
+                print(f"Versões aplicadas: {applied_versions(conn)}")
             return 0
+        elif args.cmd == "db_archive":
+            cfg = load_config()
+            conexao_db = Database(cfg["POSTGRES_DSN"])
+            archived = conexao_db.archive_posted(args.days)
+            print(f"Itens arquivados: {archived}")
+            return 0
+        elif args.cmd == "db_check_plan":
+            cfg = load_config()
+            conexao_db = Database(cfg["POSTGRES_DSN"])
+            tags = [t.strip() for t in args.tags.split(",") if t.strip()]
+            check = conexao_db.check_unposted_plan(tags, args.limit)
+            print("\n".join(check["plan"]))
+            if check["uses_index"]:
+                print("✅ Plano usa o índice parcial")
+                return 0
+            if check["index_usable"]:
+                print("ℹ️ Índice aplicável, mas o planner preferiu seq scan (tabela pequena)")
+                return 0
+            print("❌ Consulta não usa o índice parcial")
+            return 1
         elif args.cmd == "clear_cache":
             cfg = load_config()
             client = RapidAPIClient(cfg["RAPIDAPI_KEY"], cfg["RAPIDAPI_HOST"])
@@ -477,7 +651,30 @@ def main():
             if getattr(args, "older", None) is not None:
                 predicate["older_than_seconds"] = args.older
             removed = client.clear_cache(predicate or None)
-            print(f"Cache removido: {removed} arquivos")
+            print(f"Cache removido: {removed} entradas")
+            return 0
+        elif args.cmd == "cache_stats":
+            cache = get_response_cache()
+            st = cache.stats()
+            print(f"Memória: {st['memory_entries']} entradas, {st['memory_bytes'] / 1024:.0f} KB "
+                  f"(limite {cache.memory_budget_bytes / 1024 / 1024:.0f} MB)")
+            print(f"Disco: {st['disk_entries']} entradas, {st['disk_bytes'] / 1024:.0f} KB "
+                  f"(limite {cache.disk_budget_bytes / 1024 / 1024:.0f} MB) em {cache.db_path}")
+            for name, value in cache.lifetime_stats().items():
+                print(f"{name}: {value}")
+            blobs = get_blob_cache()
+            bst = blobs.summary()
+            print(f"Imagens: {bst['blobs']} arquivos, {bst['bytes'] / 1024:.0f} KB "
+                  f"(limite {blobs.max_bytes / 1024 / 1024:.0f} MB) em {blobs.root}")
+            return 0
+        elif args.cmd == "host_health":
+            board = get_host_scoreboard().summary()
+            if not board:
+                print("Nenhuma chamada registrada ainda.")
+            for host, h in sorted(board.items(), key=lambda kv: -kv[1]["success_rate"]):
+                last_429 = time.strftime("%Y-%m-%d %H:%M", time.localtime(h["last_429"])) if h["last_429"] else "-"
+                print(f"{host}: {h['calls']} chamadas, sucesso {100 * h['success_rate']:.0f}%, "
+                      f"p50 {h['p50_ms']:.0f}ms, p95 {h['p95_ms']:.0f}ms, último 429 {last_429}, circuito {h['circuit']}")
             return 0
         elif args.cmd == "standalone":
             print("🚀 MODO STANDALONE - Geração de conteúdo independente")
@@ -520,7 +717,8 @@ def main():
             try:
                 acc_instagram_id = selected_account.get("instagram_id") if selected_account else cfg["INSTAGRAM_BUSINESS_ACCOUNT_ID"]
                 acc_instagram_token = selected_account.get("instagram_access_token") if selected_account else cfg["INSTAGRAM_ACCESS_TOKEN"]
-                result = generate_and_publish(
+                result = run_generate_and_publish(
+                    args,
                     openai_key=cfg["OPENAI_API_KEY"],
                     replicate_token=cfg.get("REPLICATE_TOKEN", ""),
                     instagram_business_id=acc_instagram_id,
@@ -585,6 +783,11 @@ def main():
         except Exception:
             pass
 
+        try:
+            close_pools()
+        except Exception as e:
+            logger.warning(f"  ⚠️  Erro ao fechar pool do DB: {e}")
+
         logger.info(f"🏁 Finalizando agente {cron_name}")
 
 
@@ -1,138 +1,436 @@
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, Dict, List, Tuple
 import os
+import threading
+import time
 
-from services.rapidapi_client import RapidAPIClient
+from services.rapidapi_client import RapidAPIClient, RapidAPIError
 from services.db import Database
+from services.host_health import get_host_scoreboard
+from services.code_filter import KnownCodesFilter, get_known_codes_filter
 
+# Itens acumulados antes de cada INSERT em lote
+WRITE_BATCH_SIZE = 200
+# Códigos do topo guardados por chave como marcadores da coleta incremental
+STATE_CODES = 50
 
-def collect_hashtags(api_key: str, host: str, dsn: str, hashtags: List[str]) -> int:
-    """Coleta posts top por hashtags, filtra imagens e insere novos no DB.
-    Retorna quantidade de novos itens inseridos.
-    """
-    db = Database(dsn)
-    inserted = 0
 
-    # Preparar lista de hosts: primário + alternativos via env RAPIDAPI_ALT_HOSTS
+def _hosts_order(host: str) -> List[str]:
+    """Host primário + alternativos via env RAPIDAPI_ALT_HOSTS, sem duplicados e mantendo a ordem."""
     alt_hosts_env = os.environ.get("RAPIDAPI_ALT_HOSTS", "")
     alt_hosts = [h.strip() for h in alt_hosts_env.split(",") if h.strip()]
-    # Remover duplicados mantendo ordem
     seen = set()
     hosts_order: List[str] = []
     for h in [host] + alt_hosts:
         if h and h not in seen:
             hosts_order.append(h)
             seen.add(h)
+    return hosts_order
+
+
+def _count_raw(data: dict) -> int:
+    try:
+        return len(
+            data.get("data", {}).get("items", [])
+            or data.get("items")
+            or data.get("results")
+            or []
+        )
+    except Exception:
+        return 0
+
+
+def _fetch_sequential(
+    fetch: Callable[[str], Tuple[int, List[dict]]],
+    hosts: List[str],
+    label: str,
+) -> Tuple[List[dict], str | None]:
+    """Tenta cada host na ordem até obter dados; retorna os itens e o host que respondeu."""
+    for i, current_host in enumerate(hosts, 1):
+        try:
+            print(f"   📡 '{label}': host {i}/{len(hosts)} {current_host}")
+            total_raw, items = fetch(current_host)
+            # Se retornou qualquer dado bruto ou imagens, considerar sucesso
+            if total_raw > 0 or len(items) > 0:
+                print(f"   ✅ '{label}': {total_raw} itens brutos, {len(items)} imagens filtradas")
+                return items, current_host
+        except Exception as e:
+            error_msg = str(e)
+            if "timeout" in error_msg.lower():
+                print(f"   ⏰ Timeout no host {current_host} ('{label}')")
+            elif "403" in error_msg or "forbidden" in error_msg.lower():
+                print(f"   🚫 Acesso negado no host {current_host} ('{label}')")
+            else:
+                print(f"   ❌ Erro no host {current_host} ('{label}'): {error_msg[:100]}")
+    return [], None
+
+
+def _fetch_hedged(
+    fetch: Callable[[str], Tuple[int, List[dict]]],
+    hosts: List[str],
+    label: str,
+    hedge_delay: float,
+) -> Tuple[List[dict], str | None]:
+    """
+    Dispara o host primário e, se ele não responder em `hedge_delay` segundos
+    (ou falhar), também o próximo host, e assim por diante. A primeira resposta
+    com dados vence; tentativas ainda na fila são canceladas. As que já estão
+    em andamento não podem ser interrompidas: terminam em segundo plano (e
+    consomem cota da RapidAPI) e têm o resultado descartado.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(hosts), thread_name_prefix="rapidapi-hedge")
+    pending = {}
+    next_host = 0
+    try:
+        while True:
+            if next_host < len(hosts):
+                pending[executor.submit(fetch, hosts[next_host])] = hosts[next_host]
+                next_host += 1
+            if not pending:
+                return [], None
+            timeout = hedge_delay if next_host < len(hosts) else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                current_host = pending.pop(future)
+                try:
+                    total_raw, items = future.result()
+                except Exception as e:
+                    print(f"   ❌ Erro no host {current_host} ('{label}'): {str(e)[:100]}")
+                    continue
+                if total_raw > 0 or len(items) > 0:
+                    print(f"   ✅ '{label}': {total_raw} itens brutos, {len(items)} imagens filtradas ({current_host})")
+                    return items, current_host
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Uma busca da coleta: tipo, rótulo (hashtag/usuário) e a chamada de uma página
+# (cliente, cursor ou None para a primeira)
+Job = Tuple[str, str, Callable[[RapidAPIClient, str | None], dict]]
+
+
+def _hashtag_job(tag: str) -> Job:
+    return "hashtag", tag, lambda rapid, token: rapid.get_top_by_hashtag(tag, pagination_token=token)
+
 
-    for tag in hashtags:
+def _user_job(user: str) -> Job:
+    return "user", user, lambda rapid, token: rapid.get_user_posts(user, pagination_token=token)
+
+
+def _normalize_hashtags(hashtags: List[str]) -> List[str]:
+    tags: List[str] = []
+    for tag in hashtags or []:
         # Sanitização básica: remover espaços e prefixo '#'
         try:
             tag = (tag or "").strip().lstrip("#")
         except Exception:
             pass
-        if not tag:
-            continue
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def _normalize_users(usernames: List[str]) -> List[str]:
+    users: List[str] = []
+    for user in usernames or []:
+        user = (user or "").strip()
+        if user and user not in users:
+            users.append(user)
+    return users
+
+
+def _code(item: dict) -> str:
+    return str(item.get("content_code") or "")
+
+
+def _split_known(
+    items: List[dict],
+    markers: set,
+    db: Database,
+    known_filter: KnownCodesFilter,
+) -> Tuple[List[dict], bool]:
+    """
+    Separa os itens novos e indica se a página já continha conteúdo conhecido.
+    Só os códigos que o filtro de Bloom aponta como possivelmente conhecidos
+    vão à verificação exata no banco.
+    """
+    codes = [_code(item) for item in items]
+    known = {c for c in codes if c in markers}
+    candidates = known_filter.candidates(c for c in codes if c not in known)
+    if candidates:
+        confirmed = db.known_codes(candidates)
+        known_filter.record_check(candidates, confirmed)
+        known |= confirmed
+    return [item for item in items if _code(item) not in known], bool(known)
 
-        data = {}
-        total_raw = 0
-        items: List[dict] = []
-        last_err: Exception | None = None
 
-        # Tentar em cada host na ordem até obter dados
-        print(f"   🔍 Tentando hashtag '{tag}' em {len(hosts_order)} hosts...")
-        for i, current_host in enumerate(hosts_order, 1):
+def _collect(
+    api_key: str,
+    host: str,
+    dsn: str,
+    jobs: List[Job],
+    concurrency: int | None = None,
+    hedge: bool | None = None,
+) -> Tuple[int, Dict[str, int]]:
+    """
+    Executa as buscas em paralelo, no máximo `concurrency` por vez, e grava
+    os itens novos em lotes à medida que as respostas chegam. Retorna o total
+    de linhas novas e as imagens novas obtidas por rótulo.
+    A ordem dos hosts segue o placar de saúde (`services.host_health`), que
+    também tira da rotação hosts com o circuito aberto.
+
+    A coleta é incremental: cada chave guarda em `collect_state` os códigos do
+    topo da última coleta. A primeira página é sempre pedida (as APIs não têm
+    filtro "desde"), mas só se avança para as seguintes enquanto nenhuma delas
+    tiver conteúdo conhecido, até COLLECT_MAX_PAGES páginas. Se o limite
+    acabar antes de alcançar conteúdo conhecido, o cursor fica salvo e a
+    próxima coleta retoma a lacuna a partir dele.
+
+    Configuração por ambiente: COLLECT_CONCURRENCY (padrão 4), RAPIDAPI_HEDGE
+    ("1" dispara hosts alternativos em paralelo), RAPIDAPI_HEDGE_DELAY
+    (segundos de espera antes de acionar o próximo host, padrão 0.5) e
+    COLLECT_MAX_PAGES (padrão 3).
+    """
+    if concurrency is None:
+        concurrency = int(os.environ.get("COLLECT_CONCURRENCY", "4"))
+    if hedge is None:
+        hedge = os.environ.get("RAPIDAPI_HEDGE", "").lower() in ("1", "true", "yes")
+    hedge_delay = float(os.environ.get("RAPIDAPI_HEDGE_DELAY", "0.5"))
+    max_pages = max(1, int(os.environ.get("COLLECT_MAX_PAGES", "3")))
+    configured_hosts = _hosts_order(host)
+    scoreboard = get_host_scoreboard()
+    db = Database(dsn)
+    known_filter = get_known_codes_filter(dsn)
+    try:
+        known_filter.refresh(db)
+    except Exception as e:
+        print(f"   ⚠️ Filtro de códigos indisponível, verificação exata em todos: {str(e)[:100]}")
+    try:
+        states = db.load_collect_state([(kind, label) for kind, label, _ in jobs])
+    except Exception as e:
+        print(f"   ⚠️ Estado da coleta incremental indisponível: {str(e)[:100]}")
+        states = {}
+    new_states: Dict[Tuple[str, str], Dict] = {}
+    counters = {"pages": 0, "up_to_date": 0}
+    counters_lock = threading.Lock()
+
+    def fetch_page(fetch_job, current_host: str, token: str | None, record=scoreboard.record) -> dict:
+        client = RapidAPIClient(api_key, current_host)
+        started = time.monotonic()
+        try:
+            data = fetch_job(client, token)
+        except Exception as e:
+            # Uma falha coalescida chega a todos que esperavam: só quem chamou a rede a registra
+            if client.network_calls:
+                status = e.status if isinstance(e, RapidAPIError) else None
+                record(current_host, False, time.monotonic() - started, status)
+            raise
+        # Respostas do cache ou coalescidas não dizem nada sobre a saúde do host
+        if client.from_network:
+            record(current_host, True, time.monotonic() - started)
+        with counters_lock:
+            counters["pages"] += 1
+        return data
+
+    def follow(fetch_job, current_host: str, token: str | None, markers: set, budget: int):
+        """
+        Segue o cursor até conteúdo conhecido, fim da lista ou fim do orçamento
+        de páginas. Retorna os itens novos e o cursor pendente (None se alcançou
+        conteúdo conhecido ou o fim da lista).
+        """
+        items: List[dict] = []
+        used = 0
+        while token and used < budget:
             try:
-                print(f"   📡 Host {i}/{len(hosts_order)}: {current_host}")
-                rapid = RapidAPIClient(api_key, current_host)
-                print(f"   ⏳ Fazendo requisição para hashtag '{tag}'...")
-                data = rapid.get_top_by_hashtag(tag)
-                print(f"   ✅ Resposta recebida para '{tag}'")
-                try:
-                    total_raw = len(
-                        data.get("data", {}).get("items", [])
-                        or data.get("items")
-                        or data.get("results")
-                        or []
-                    )
-                except Exception:
-                    total_raw = 0
-                items = RapidAPIClient.filter_images(data)
-                # Se retornou qualquer dado bruto ou imagens, considerar sucesso
-                if total_raw > 0 or len(items) > 0:
-                    print(f"   ✅ Sucesso! {total_raw} itens brutos, {len(items)} imagens filtradas")
-                    break
+                data = fetch_page(fetch_job, current_host, token)
             except Exception as e:
-                error_msg = str(e)
-                if "timeout" in error_msg.lower():
-                    print(f"   ⏰ Timeout no host {current_host}")
-                elif "403" in error_msg or "forbidden" in error_msg.lower():
-                    print(f"   🚫 Acesso negado no host {current_host}")
-                else:
-                    print(f"   ❌ Erro no host {current_host}: {error_msg[:100]}")
-                last_err = e
-                continue
+                print(f"   ⚠️ Paginação interrompida em {current_host}: {str(e)[:100]}")
+                return items, token
+            used += 1
+            new, reached_known = _split_known(RapidAPIClient.filter_images(data), markers, db, known_filter)
+            items.extend(new)
+            if reached_known:
+                return items, None
+            token = RapidAPIClient.next_cursor(data)
+        return items, token
 
-        if not items and last_err:
-            pass
+    def fetch_one(job: Job) -> List[dict]:
+        kind, label, fetch_job = job
+        state = states.get((kind, label)) or {}
+        markers = set(state.get("last_codes") or [])
+        first_pages: Dict[str, dict] = {}
+        # Decidido o vencedor do hedge, tentativas que ainda terminarem são descartadas
+        # e não entram no placar (nem depois de `scoreboard.save()`)
+        hedge_lock = threading.Lock()
+        hedge_settled = False
+
+        def record(*args):
+            with hedge_lock:
+                if not hedge_settled:
+                    scoreboard.record(*args)
+
+        def fetch(current_host: str) -> Tuple[int, List[dict]]:
+            data = fetch_page(fetch_job, current_host, None, record)
+            first_pages[current_host] = data
+            return _count_raw(data), RapidAPIClient.filter_images(data)
+
+        # Reordena a cada busca: falhas desta execução já afastam o host
+        hosts = scoreboard.order(configured_hosts)
 
+        if hedge and len(hosts) > 1:
+            head, served_by = _fetch_hedged(fetch, hosts, label, hedge_delay)
+            with hedge_lock:
+                hedge_settled = True
+        else:
+            head, served_by = _fetch_sequential(fetch, hosts, label)
+        if served_by is None:
+            return []
+        items, reached_known = _split_known(head, markers, db, known_filter)
+        cursor, cursor_host = None, None
+        if markers and not reached_known:
+            # Tudo novo desde a última coleta: seguir as próximas páginas
+            token = RapidAPIClient.next_cursor(first_pages[served_by])
+            more, cursor = follow(fetch_job, served_by, token, markers, max_pages - 1)
+            items.extend(more)
+            cursor_host = served_by if cursor else None
+        elif state.get("cursor") and state.get("cursor_host") in hosts:
+            # Topo em dia: retomar a lacuna deixada por uma coleta anterior
+            more, cursor = follow(fetch_job, state["cursor_host"], state["cursor"], set(), max_pages - 1)
+            items.extend(more)
+            cursor_host = state["cursor_host"] if cursor else None
+        if reached_known:
+            with counters_lock:
+                counters["up_to_date"] += 1
+        new_states[(kind, label)] = {
+            "last_codes": [_code(item) for item in head if _code(item)][:STATE_CODES] or list(markers),
+            "cursor": cursor,
+            "cursor_host": cursor_host,
+        }
         for item in items:
             # Garantir que a tag seja preenchida mesmo se a API não retornar
             if not item.get("tag"):
-                item["tag"] = tag
-            if not db.exists_code(item["content_code"]):
-                db.insert_trend(item)
-                inserted += 1
-    return inserted
+                item["tag"] = label
+        return items
 
-def collect_userposts(api_key: str, host: str, dsn: str, usernames: List[str]) -> int:
-    """Coleta posts por usuário, filtra imagens e insere novos no DB.
+    print(f"   🔍 Coletando {len(jobs)} chaves em {len(configured_hosts)} hosts (concorrência={concurrency}, hedge={hedge})...")
+    inserted = 0
+    fetched: Dict[str, int] = {}
+    batch: List[dict] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="collect") as executor:
+        futures = {executor.submit(fetch_one, job): job[1] for job in jobs}
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                items = future.result()
+            except Exception as e:
+                print(f"   ❌ Falha ao coletar '{label}': {str(e)[:100]}")
+                continue
+            fetched[label] = fetched.get(label, 0) + len(items)
+            batch.extend(items)
+            # Gravação em lotes enquanto as demais chaves ainda estão em voo;
+            # conta apenas linhas realmente novas
+            if len(batch) >= WRITE_BATCH_SIZE:
+                inserted += db.insert_trends(batch)
+                known_filter.add_many(_code(item) for item in batch)
+                batch = []
+    if batch:
+        inserted += db.insert_trends(batch)
+        known_filter.add_many(_code(item) for item in batch)
+    try:
+        db.save_collect_state(new_states)
+    except Exception as e:
+        print(f"   ⚠️ Falha ao salvar estado da coleta incremental: {str(e)[:100]}")
+    scoreboard.save()
+    print(f"   🧭 Coleta incremental: {counters['pages']} páginas, {counters['up_to_date']}/{len(jobs)} chaves já em dia")
+    fs = known_filter.summary()
+    if fs["lookups"]:
+        print(f"   🧮 Filtro de códigos: {fs['filter_hits']}/{fs['lookups']} a verificar no banco, "
+              f"falsos positivos {100 * fs['measured_fp_rate']:.2f}% (teórico {100 * fs['expected_fp_rate']:.2f}%), "
+              f"{fs['loaded']} códigos lidos do banco{' (filtro restaurado do disco)' if fs['restored'] else ''}")
+    return inserted, fetched
+
+
+def collect_hashtags(
+    api_key: str,
+    host: str,
+    dsn: str,
+    hashtags: List[str],
+    concurrency: int | None = None,
+    hedge: bool | None = None,
+) -> int:
+    """Coleta posts top por hashtags, filtra imagens e insere novos no DB.
     Retorna quantidade de novos itens inseridos.
     """
-    db = Database(dsn)
-    inserted = 0
+    jobs = [_hashtag_job(tag) for tag in _normalize_hashtags(hashtags)]
+    return _collect(api_key, host, dsn, jobs, concurrency, hedge)[0]
 
-    # Preparar lista de hosts: primário + alternativos via env RAPIDAPI_ALT_HOSTS
-    alt_hosts_env = os.environ.get("RAPIDAPI_ALT_HOSTS", "")
-    alt_hosts = [h.strip() for h in alt_hosts_env.split(",") if h.strip()]
-    seen = set()
-    hosts_order: List[str] = []
-    for h in [host] + alt_hosts:
-        if h and h not in seen:
-            hosts_order.append(h)
-            seen.add(h)
 
-    for user in usernames:
-        data = {}
-        total_raw = 0
-        items: List[dict] = []
-        last_err: Exception | None = None
+def collect_userposts(
+    api_key: str,
+    host: str,
+    dsn: str,
+    usernames: List[str],
+    concurrency: int | None = None,
+    hedge: bool | None = None,
+) -> int:
+    """Coleta posts por usuário, filtra imagens e insere novos no DB.
+    Retorna quantidade de novos itens inseridos.
+    """
+    jobs = [_user_job(user) for user in _normalize_users(usernames)]
+    return _collect(api_key, host, dsn, jobs, concurrency, hedge)[0]
 
-        for current_host in hosts_order:
-            try:
-                rapid = RapidAPIClient(api_key, current_host)
-                data = rapid.get_user_posts(user)
-                try:
-                    total_raw = len(
-                        data.get("data", {}).get("items", [])
-                        or data.get("items")
-                        or data.get("results")
-                        or []
-                    )
-                except Exception:
-                    total_raw = 0
-                items = RapidAPIClient.filter_images(data)
-                if total_raw > 0 or len(items) > 0:
-                    break
-            except Exception as e:
-                last_err = e
-                continue
 
-        if not items and last_err:
-            pass
+def plan_collection(accounts: List[dict]) -> Dict[str, Any]:
+    """
+    União das hashtags (`hashtags_pesquisa`) e usuários (`usernames`) de
+    todas as contas, cada um uma única vez, com as chaves de cada conta
+    (na mesma ordem de `accounts`) para distribuir os resultados depois.
+    """
+    per_account = []
+    hashtags: List[str] = []
+    usernames: List[str] = []
+    for acc in accounts:
+        acc_tags = _normalize_hashtags(acc.get("hashtags_pesquisa", []))
+        acc_users = _normalize_users(acc.get("usernames", []))
+        hashtags.extend(t for t in acc_tags if t not in hashtags)
+        usernames.extend(u for u in acc_users if u not in usernames)
+        per_account.append({"hashtags": acc_tags, "usernames": acc_users})
+    requested = sum(len(a["hashtags"]) + len(a["usernames"]) for a in per_account)
+    return {"hashtags": hashtags, "usernames": usernames, "accounts": per_account, "requested": requested}
 
-        for item in items:
-            if not item.get("tag"):
-                item["tag"] = user
-            if not db.exists_code(item["content_code"]):
-                db.insert_trend(item)
-                inserted += 1
-    return inserted
\ No newline at end of file
+
+def collect_for_accounts(
+    api_key: str,
+    host: str,
+    dsn: str,
+    accounts: List[dict],
+    concurrency: int | None = None,
+    hedge: bool | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Coleta de uma vez as hashtags/usuários de várias contas (ex.: multirun):
+    chaves repetidas entre contas são buscadas uma única vez e o resultado
+    é distribuído a cada conta interessada. Retorna, na ordem de `accounts`,
+    `{"hashtags", "usernames", "items", "failed"}` por conta.
+    """
+    plan = plan_collection(accounts)
+    jobs = [_hashtag_job(tag) for tag in plan["hashtags"]] + [_user_job(user) for user in plan["usernames"]]
+    print(f"   🧮 Coleta planejada: {len(jobs)} buscas únicas para {plan['requested']} pedidos de {len(accounts)} contas")
+    failed = False
+    fetched: Dict[str, int] = {}
+    try:
+        if jobs:
+            _, fetched = _collect(api_key, host, dsn, jobs, concurrency, hedge)
+    except Exception as e:
+        print(f"   ❌ Falha na coleta compartilhada: {str(e)[:100]}")
+        failed = True
+    return [
+        dict(
+            keys,
+            items=sum(fetched.get(k, 0) for k in keys["hashtags"] + keys["usernames"]),
+            failed=failed,
+        )
+        for keys in plan["accounts"]
+    ]
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+
+class PipelineStage:
+    """Estágio do pipeline: função, dependências e modo de execução."""
+
+    def __init__(self, name: str, func: Callable[..., Any], deps: Iterable[str] = (), blocking: bool = True):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        # Estágios bloqueantes (HTTP via requests, SDKs síncronos) rodam em thread
+        self.blocking = blocking
+
+
+class PipelineDAG:
+    """
+    Executor assíncrono de estágios organizados como um grafo acíclico.
+
+    Cada estágio começa assim que suas dependências terminam e recebe os
+    resultados delas como argumentos nomeados, então trabalhos independentes
+    (ex.: legenda e renderização da imagem) rodam em paralelo.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, PipelineStage] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[..., Any], deps: Iterable[str] = (), blocking: bool = True) -> "PipelineDAG":
+        if name in self._stages:
+            raise ValueError(f"Estágio duplicado: {name}")
+        stage = PipelineStage(name, func, deps, blocking)
+        missing = [d for d in stage.deps if d not in self._stages]
+        if missing:
+            # Exigir declaração prévia das dependências garante ausência de ciclos
+            raise ValueError(f"Estágio '{name}' depende de estágios não declarados: {missing}")
+        self._stages[name] = stage
+        return self
+
+    async def _run_stage(self, stage: PipelineStage, tasks: Dict[str, "asyncio.Task"]) -> Any:
+        kwargs = {dep: await tasks[dep] for dep in stage.deps}
+        started = time.perf_counter()
+        try:
+            if stage.blocking:
+                return await asyncio.to_thread(stage.func, **kwargs)
+            return stage.func(**kwargs)
+        finally:
+            self.timings[stage.name] = time.perf_counter() - started
+
+    async def run(self) -> Dict[str, Any]:
+        """Executa todos os estágios e retorna o mapa nome -> resultado."""
+        tasks: Dict[str, asyncio.Task] = {}
+        for name, stage in self._stages.items():
+            tasks[name] = asyncio.create_task(self._run_stage(stage, tasks), name=name)
+        pending: List[asyncio.Task] = list(tasks.values())
+        try:
+            await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
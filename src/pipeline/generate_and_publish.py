@@ -1,4 +1,5 @@
-from typing import Dict
+from typing import Dict, Tuple
+import asyncio
 import random
 
 from services.openai_client import OpenAIClient
@@ -7,7 +8,7 @@ from services.instagram_client import InstagramClient
 from services.telegram_client import TelegramClient
 from services.public_uploader import PublicUploader
 from services.supabase_uploader import SupabaseUploader
-from services.content_format_manager import ContentFormatManager, get_format_enhanced_prompt
+from services.content_format_manager import get_format_enhanced_prompt
 from services.hashtag_manager import HashtagManager
 from services.performance_tracker import track_post_performance
 from services.ab_testing_framework import get_ab_test_config
@@ -15,6 +16,7 @@ from services.visual_quality_manager import VisualQualityManager, get_enhanced_i
 from services.superior_concept_manager import get_superior_concept_prompt
 from services.stories_image_processor import StoriesImageProcessor
 from services.weekly_theme_manager import WeeklyThemeManager, get_weekly_themed_content, is_morning_spiritual_time
+from pipeline.dag import PipelineDAG
 
 
 def generate_and_publish(
@@ -52,258 +54,423 @@ def generate_and_publish(
     use_weekly_themes: bool = True,
     force_day_of_week: int | None = None,
     force_time_slot: str | None = None,
+    # Validação opcional da imagem final (descrição via visão), executada após publicar
+    validate_image: bool = False,
 ):
     # Obter configurações de A/B testing
-    ab_config = {}
-    if account_name:
-        try:
-            ab_config = get_ab_test_config(account_name)
-            # print(f"Configurações A/B aplicadas: {ab_config}")
-        except Exception as e:
-            # print(f"Erro ao obter configurações A/B: {e}")
-            ab_config = {}
+    ab_config = _load_ab_config(account_name)
     
     # SISTEMA TEMÁTICO SEMANAL - Integração Principal
     weekly_theme_metadata = {}
     if use_weekly_themes:
-        try:
-            print("🗓️ Aplicando Sistema Temático Semanal...")
-            
-            # Obter conteúdo temático baseado no dia e horário
-            themed_content_prompt, themed_image_prompt, weekly_theme_metadata = get_weekly_themed_content(
-                day_of_week=force_day_of_week,
-                time_slot=force_time_slot,
-                custom_theme=original_text
-            )
-            
-            # Verificar se é horário matinal com cunho espiritual obrigatório
-            if is_morning_spiritual_time() or weekly_theme_metadata.get("spiritual_focus", False):
-                print("✨ CUNHO ESPIRITUAL OBRIGATÓRIO aplicado para postagem matinal")
-            
-            # Sobrescrever prompts se não foram fornecidos explicitamente
-            if not content_prompt:
-                content_prompt = themed_content_prompt
-                print(f"📝 Prompt de conteúdo temático aplicado: {weekly_theme_metadata.get('main_theme', 'N/A')}")
-            
-            if not replicate_prompt:
-                replicate_prompt = themed_image_prompt
-                print(f"🎨 Prompt de imagem temático aplicado: {weekly_theme_metadata.get('image_style', 'N/A')}")
-            
-            print(f"📅 Tema do dia: {weekly_theme_metadata.get('day_name', 'N/A')} - {weekly_theme_metadata.get('time_slot', 'N/A')}")
-            print(f"🎯 Foco: {weekly_theme_metadata.get('content_type', 'N/A')}")
-            
-        except Exception as e:
-            print(f"⚠️ Erro no sistema temático semanal: {e}")
-            print("Continuando com sistema padrão...")
+        content_prompt, replicate_prompt, weekly_theme_metadata = _apply_weekly_theme(
+            content_prompt, replicate_prompt, original_text, force_day_of_week, force_time_slot
+        )
     
     # Inicializa clientes
     openai = OpenAIClient(openai_key)
+    # Gerações no Replicate e uploads consumidos por este post
+    usage = _new_usage()
 
-    # Primeiro, decidir qual imagem será usada (Replicate ou original re-hospedada)
-    generated_image_url = source_image_url
+    replicate = None
     replicate_error = None
     if not disable_replicate:
         replicate = ReplicateClient(replicate_token)
+    else:
+        replicate_error = "DISABLED"
+
+    # FLUXO TEXTO-PRIMEIRO: gerar o texto e, a partir dele, a imagem (uma única geração)
+    use_superior_concepts = _use_superior_concepts(account_config)
+    
+    # 1. PRIMEIRO: Gerar o conteúdo/texto baseado no tema ou prompt
+    initial_content = _generate_initial_content(openai, content_prompt, source_image_url)
+    
+    # 2. SEGUNDO: Gerar a imagem baseada no conteúdo (ou manter a original)
+    generated_image_url = source_image_url
+    if replicate is not None:
+        content_based_image_prompt = _build_content_image_prompt(
+            initial_content, use_superior_concepts, replicate_prompt, caption_style, ab_config
+        )
+        generated_image_url, replicate_error = _generate_content_image(
+            replicate, content_based_image_prompt, initial_content, source_image_url, usage
+        )
+
+    # Sempre re-hospedar a imagem final (gerada ou original) no Supabase como JPEG, com fallback público
+    supa_url, supa_key, supa_bkt = _resolve_supabase_config(supabase_url, supabase_service_key, supabase_bucket)
+    generated_image_url = _rehost_image(generated_image_url, supa_url, supa_key, supa_bkt, usage)
+    
+    # Usar o conteúdo inicial como base principal (não a descrição da imagem)
+    description = initial_content
+    
+    caption_request = _prepare_caption_request(
+        description, caption_prompt, original_text, ab_config, use_weekly_themes, weekly_theme_metadata
+    )
+    caption = _generate_caption(openai, description, caption_style, caption_request)
+    _, chosen_format, dynamic_hashtags = caption_request
+
+    result = _publish(
+        instagram_business_id=instagram_business_id,
+        instagram_access_token=instagram_access_token,
+        telegram_bot_token=telegram_bot_token,
+        telegram_chat_id=telegram_chat_id,
+        description=description,
+        caption=caption,
+        generated_image_url=generated_image_url,
+        replicate_error=replicate_error,
+        account_name=account_name,
+        chosen_format=chosen_format,
+        dynamic_hashtags=dynamic_hashtags,
+        disable_replicate=disable_replicate,
+        use_weekly_themes=use_weekly_themes,
+        weekly_theme_metadata=weekly_theme_metadata,
+        publish_to_stories=publish_to_stories,
+        stories_background_type=stories_background_type,
+        stories_text=stories_text,
+        stories_text_position=stories_text_position,
+        supa_url=supa_url,
+        supa_key=supa_key,
+        supa_bkt=supa_bkt,
+        usage=usage,
+    )
+
+    # Descrição final da imagem (validação): só quando solicitada, fora do caminho crítico
+    if validate_image:
+        result["final_description"] = _describe_final_image(openai, result["generated_image_url"])
+    return result
+
+
+async def generate_and_publish_async(
+    openai_key: str,
+    replicate_token: str,
+    instagram_business_id: str,
+    instagram_access_token: str,
+    telegram_bot_token: str,
+    telegram_chat_id: str,
+    source_image_url: str,
+    caption_style: str | None = None,
+    content_prompt: str | None = None,
+    caption_prompt: str | None = None,
+    original_text: str | None = None,
+    disable_replicate: bool = False,
+    replicate_prompt: str | None = None,
+    supabase_url: str | None = None,
+    supabase_service_key: str | None = None,
+    supabase_bucket: str | None = None,
+    account_name: str | None = None,
+    account_config: Dict | None = None,
+    publish_to_stories: bool = False,
+    stories_background_type: str = "gradient",
+    stories_text: str | None = None,
+    stories_text_position: str = "auto",
+    use_weekly_themes: bool = True,
+    force_day_of_week: int | None = None,
+    force_time_slot: str | None = None,
+    validate_image: bool = False,
+):
+    """
+    Versão assíncrona de `generate_and_publish`, com o mesmo contrato de resultado.
+
+    O fluxo é modelado como um grafo de estágios: a preparação de hashtags/CTA e
+    a geração da legenda rodam enquanto o Replicate renderiza a imagem baseada no
+    conteúdo e ela é re-hospedada (sem Replicate, a imagem original é re-hospedada
+    em paralelo à geração de texto). A publicação começa quando imagem e legenda
+    estão prontas.
+    """
+    openai = OpenAIClient(openai_key)
+    replicate = None if disable_replicate else ReplicateClient(replicate_token)
+    supa_url, supa_key, supa_bkt = _resolve_supabase_config(supabase_url, supabase_service_key, supabase_bucket)
+    usage = _new_usage()
+
+    def theme():
+        if not use_weekly_themes:
+            return content_prompt, replicate_prompt, {}
+        return _apply_weekly_theme(content_prompt, replicate_prompt, original_text, force_day_of_week, force_time_slot)
+
+    def content_image(initial_content, theme, ab_config):
+        content_based_image_prompt = _build_content_image_prompt(
+            initial_content, _use_superior_concepts(account_config), theme[1], caption_style, ab_config
+        )
+        return _generate_content_image(
+            replicate, content_based_image_prompt, initial_content, source_image_url, usage
+        )
+
+    dag = PipelineDAG()
+    dag.add("ab_config", lambda: _load_ab_config(account_name))
+    dag.add("theme", theme)
+    dag.add("initial_content", lambda theme: _generate_initial_content(openai, theme[0], source_image_url),
+            deps=("theme",))
+    if replicate is not None:
+        dag.add("content_image", content_image, deps=("initial_content", "theme", "ab_config"))
+        dag.add("generated_image_url", lambda content_image: _rehost_image(
+            content_image[0], supa_url, supa_key, supa_bkt, usage
+        ), deps=("content_image",))
+    else:
+        dag.add("generated_image_url", lambda: _rehost_image(
+            source_image_url, supa_url, supa_key, supa_bkt, usage
+        ))
+    dag.add("caption_request", lambda initial_content, ab_config, theme: _prepare_caption_request(
+        initial_content, caption_prompt, original_text, ab_config, use_weekly_themes, theme[2]
+    ), deps=("initial_content", "ab_config", "theme"))
+    dag.add("caption", lambda initial_content, caption_request: _generate_caption(
+        openai, initial_content, caption_style, caption_request
+    ), deps=("initial_content", "caption_request"))
+    results = await dag.run()
+    print("⏱️ Estágios: " + ", ".join(f"{name}={secs:.1f}s" for name, secs in dag.timings.items()))
+
+    replicate_error = results["content_image"][1] if replicate is not None else "DISABLED"
+    _, chosen_format, dynamic_hashtags = results["caption_request"]
+
+    result = await asyncio.to_thread(
+        _publish,
+        instagram_business_id=instagram_business_id,
+        instagram_access_token=instagram_access_token,
+        telegram_bot_token=telegram_bot_token,
+        telegram_chat_id=telegram_chat_id,
+        description=results["initial_content"],
+        caption=results["caption"],
+        generated_image_url=results["generated_image_url"],
+        replicate_error=replicate_error,
+        account_name=account_name,
+        chosen_format=chosen_format,
+        dynamic_hashtags=dynamic_hashtags,
+        disable_replicate=disable_replicate,
+        use_weekly_themes=use_weekly_themes,
+        weekly_theme_metadata=results["theme"][2],
+        publish_to_stories=publish_to_stories,
+        stories_background_type=stories_background_type,
+        stories_text=stories_text,
+        stories_text_position=stories_text_position,
+        supa_url=supa_url,
+        supa_key=supa_key,
+        supa_bkt=supa_bkt,
+        usage=usage,
+    )
+
+    if validate_image:
+        result["final_description"] = await asyncio.to_thread(
+            _describe_final_image, openai, result["generated_image_url"]
+        )
+    return result
+
+
+def _load_ab_config(account_name: str | None) -> Dict:
+    """Obtém as configurações de A/B testing da conta (vazio em caso de erro)."""
+    ab_config = {}
+    if account_name:
+        try:
+            ab_config = get_ab_test_config(account_name)
+            # print(f"Configurações A/B aplicadas: {ab_config}")
+        except Exception as e:
+            # print(f"Erro ao obter configurações A/B: {e}")
+            ab_config = {}
+    return ab_config
+
+
+def _apply_weekly_theme(
+    content_prompt: str | None,
+    replicate_prompt: str | None,
+    original_text: str | None,
+    force_day_of_week: int | None,
+    force_time_slot: str | None,
+) -> Tuple[str | None, str | None, Dict]:
+    """Aplica o Sistema Temático Semanal aos prompts que não foram fornecidos explicitamente."""
+    weekly_theme_metadata = {}
+    try:
+        print("🗓️ Aplicando Sistema Temático Semanal...")
         
-        # Determinar formato de conteúdo para otimizar a imagem
-        content_manager = ContentFormatManager()
-        
-        # Aplicar configurações A/B para formato de conteúdo
-        if ab_config.get("force_format"):
-            suggested_format = ab_config["force_format"]
-        elif original_text:
-            analysis = content_manager.get_content_analysis(original_text)
-            suggested_format = analysis["suggested_format"]
-        else:
-            suggested_format = content_manager.get_random_format()
+        # Obter conteúdo temático baseado no dia e horário
+        themed_content_prompt, themed_image_prompt, weekly_theme_metadata = get_weekly_themed_content(
+            day_of_week=force_day_of_week,
+            time_slot=force_time_slot,
+            custom_theme=original_text
+        )
         
-        # Sistema inteligente de qualidade visual
-        if replicate_prompt:
-            # Usar prompt personalizado se fornecido
-            safer_image_prompt = replicate_prompt
-        else:
-            # Usar sistema de qualidade visual aprimorado
-            content_theme = "growth and leadership"
-            if original_text:
-                # Extrair tema do texto original
-                theme_keywords = {
-                    "crescimento": "growth and development",
-                    "liderança": "leadership and influence", 
-                    "transformação": "transformation and change",
-                    "sucesso": "success and achievement",
-                    "inovação": "innovation and creativity",
-                    "equipe": "teamwork and collaboration"
-                }
-                for keyword, theme in theme_keywords.items():
-                    if keyword in original_text.lower():
-                        content_theme = theme
-                        break
-            
-            # Sistema inteligente de conceitos superiores (baseado nas 3 imagens de referência)
-            # Verificar se a conta tem conceitos superiores habilitados
-            superior_concepts_enabled = False
-            superior_concepts_probability = 0.7  # Padrão
-            
-            if account_config:
-                superior_concepts_enabled = account_config.get("superior_concepts_enabled", False)
-                superior_concepts_probability = account_config.get("superior_concepts_probability", 0.7)
-            
-            use_superior_concepts = superior_concepts_enabled and random.random() < superior_concepts_probability
-            
-            if use_superior_concepts:
-                # Usar sistema de conceitos superiores baseado nas imagens de referência
-                safer_image_prompt, quality_metadata = get_superior_concept_prompt(
-                    content_theme=content_theme
-                )
-            else:
-                # Usar sistema de qualidade visual aprimorado (sistema anterior)
-                safer_image_prompt, quality_metadata = get_enhanced_image_prompt(
-                    content_theme=content_theme,
-                    current_style="professional",
-                    force_high_quality=True  # Sempre priorizar qualidade
-                )
+        # Verificar se é horário matinal com cunho espiritual obrigatório
+        if is_morning_spiritual_time() or weekly_theme_metadata.get("spiritual_focus", False):
+            print("✨ CUNHO ESPIRITUAL OBRIGATÓRIO aplicado para postagem matinal")
         
-        # Aprimorar prompt baseado no formato de conteúdo
-        safer_image_prompt = content_manager.enhance_replicate_prompt(safer_image_prompt, suggested_format)
+        # Sobrescrever prompts se não foram fornecidos explicitamente
+        if not content_prompt:
+            content_prompt = themed_content_prompt
+            print(f"📝 Prompt de conteúdo temático aplicado: {weekly_theme_metadata.get('main_theme', 'N/A')}")
         
-        # Aplicar configurações A/B para estilo de imagem
-        if ab_config.get("image_style"):
-            image_style = ab_config["image_style"]
-            if image_style == "minimalist":
-                safer_image_prompt += " Estilo ultra-minimalista, composição limpa, espaços em branco, elementos geométricos simples."
-            elif image_style == "dynamic":
-                safer_image_prompt += " Estilo dinâmico com movimento, gradientes vibrantes, elementos em perspectiva, energia visual."
+        if not replicate_prompt:
+            replicate_prompt = themed_image_prompt
+            print(f"🎨 Prompt de imagem temático aplicado: {weekly_theme_metadata.get('image_style', 'N/A')}")
         
-        if original_text:
-            safer_image_prompt += (
-                f" Baseie os elementos visuais no tema descrito: '{original_text}'. "
-                "Evite literalidade excessiva; use metáforas visuais diretas ligadas ao tema."
-            )
-        # Se veio um estilo do CLI, incluir como instrução de estilo
-        if caption_style:
-            safer_image_prompt += f" Estilo adicional: {caption_style}."
+        print(f"📅 Tema do dia: {weekly_theme_metadata.get('day_name', 'N/A')} - {weekly_theme_metadata.get('time_slot', 'N/A')}")
+        print(f"🎯 Foco: {weekly_theme_metadata.get('content_type', 'N/A')}")
         
-        try:
-            generated_image_url = replicate.generate_image(prompt=safer_image_prompt)
-        except Exception as e:
-            replicate_error = str(e)
-            generated_image_url = source_image_url
-    else:
-        replicate_error = "DISABLED"
+    except Exception as e:
+        print(f"⚠️ Erro no sistema temático semanal: {e}")
+        print("Continuando com sistema padrão...")
+    return content_prompt, replicate_prompt, weekly_theme_metadata
 
-    # Sempre re-hospedar a imagem final (gerada ou original) no Supabase como JPEG, com fallback público
-    try:
-        # Preferir overrides fornecidos pela chamada; senão, carregar de config
-        supa_url = supabase_url
-        supa_key = supabase_service_key
-        supa_bkt = supabase_bucket
-        if not (supa_url and supa_key and supa_bkt):
+
+def _use_superior_concepts(account_config: Dict | None) -> bool:
+    """Sorteia o uso de conceitos superiores conforme a configuração da conta."""
+    superior_concepts_enabled = False
+    superior_concepts_probability = 0.7  # Padrão
+    
+    if account_config:
+        superior_concepts_enabled = account_config.get("superior_concepts_enabled", False)
+        superior_concepts_probability = account_config.get("superior_concepts_probability", 0.7)
+    
+    return superior_concepts_enabled and random.random() < superior_concepts_probability
+
+
+def _new_usage() -> Dict[str, int]:
+    """Contadores de gerações no Replicate e uploads concluídos para um post."""
+    return {"replicate_generations": 0, "uploads": 0}
+
+
+def _resolve_supabase_config(
+    supabase_url: str | None,
+    supabase_service_key: str | None,
+    supabase_bucket: str | None,
+) -> Tuple[str | None, str | None, str | None]:
+    """Preferir overrides fornecidos pela chamada; senão, carregar de config."""
+    supa_url = supabase_url
+    supa_key = supabase_service_key
+    supa_bkt = supabase_bucket
+    if not (supa_url and supa_key and supa_bkt):
+        try:
             from config import load_config
             cfg = load_config()
             supa_url = supa_url or cfg.get("SUPABASE_URL")
             supa_key = supa_key or cfg.get("SUPABASE_SERVICE_KEY")
             supa_bkt = supa_bkt or cfg.get("SUPABASE_BUCKET")
-        if supa_url and supa_key and supa_bkt:
-            try:
-                hosted_url = SupabaseUploader(supa_url, supa_key, supa_bkt).upload_from_url(
-                    generated_image_url, force_jpeg=True
-                )
-                generated_image_url = hosted_url
-            except Exception as sup_err:
-                try:
-                    hosted_public = PublicUploader().upload_from_url(generated_image_url)
-                    generated_image_url = hosted_public
-                except Exception as up_err:
-                    pass
-        else:
+        except Exception as cfg_err:
+            pass
+    return supa_url, supa_key, supa_bkt
+
+
+def _rehost_image(
+    image_url: str,
+    supa_url: str | None,
+    supa_key: str | None,
+    supa_bkt: str | None,
+    usage: Dict[str, int],
+) -> str:
+    """Re-hospeda a imagem no Supabase como JPEG, com fallback público; mantém a URL em caso de falha."""
+    # Conta só uploads concluídos (tentativas que falharam não entram em `usage`)
+    if supa_url and supa_key and supa_bkt:
+        try:
+            hosted = SupabaseUploader(supa_url, supa_key, supa_bkt).upload_from_url(
+                image_url, force_jpeg=True
+            )
+            usage["uploads"] += 1
+            return hosted
+        except Exception as sup_err:
             try:
-                hosted_public = PublicUploader().upload_from_url(generated_image_url)
-                generated_image_url = hosted_public
+                hosted = PublicUploader().upload_from_url(image_url)
+                usage["uploads"] += 1
+                return hosted
             except Exception as up_err:
                 pass
-    except Exception as cfg_err:
-        pass
+    else:
+        try:
+            hosted = PublicUploader().upload_from_url(image_url)
+            usage["uploads"] += 1
+            return hosted
+        except Exception as up_err:
+            pass
+    return image_url
 
-    # NOVO FLUXO: GERAR TEXTO PRIMEIRO, DEPOIS IMAGEM BASEADA NO TEXTO
-    
-    # Definir variáveis de configuração de conceitos superiores
-    superior_concepts_enabled = False
-    superior_concepts_probability = 0.7  # Padrão
-    
-    if account_config:
-        superior_concepts_enabled = account_config.get("superior_concepts_enabled", False)
-        superior_concepts_probability = account_config.get("superior_concepts_probability", 0.7)
-    
-    use_superior_concepts = superior_concepts_enabled and random.random() < superior_concepts_probability
-    
-    # 1. PRIMEIRO: Gerar o conteúdo/texto baseado no tema ou prompt
+
+def _generate_initial_content(openai: OpenAIClient, content_prompt: str | None, source_image_url: str) -> str:
+    """Gera o conteúdo/texto base do post a partir do prompt ou da imagem original."""
     if content_prompt:
         # Usar prompt personalizado para gerar conteúdo inicial
-        initial_content = openai.generate_content_from_prompt(content_prompt)
-    else:
-        # Usar descrição básica da imagem original como base
-        initial_content = openai.describe_image(
-            source_image_url,
-            custom_prompt="Descreva brevemente o tema principal desta imagem para criar conteúdo relacionado."
+        return openai.generate_content_from_prompt(content_prompt)
+    # Usar descrição básica da imagem original como base
+    return openai.describe_image(
+        source_image_url,
+        custom_prompt="Descreva brevemente o tema principal desta imagem para criar conteúdo relacionado."
+    )
+
+
+def _describe_final_image(openai: OpenAIClient, image_url: str) -> str | None:
+    """Descrição técnica da imagem publicada, usada apenas para validação."""
+    try:
+        return openai.describe_image(
+            image_url,
+            custom_prompt="Descreva esta imagem de forma técnica e detalhada."
         )
-    
-    # 2. SEGUNDO: Refinar a imagem baseada no conteúdo gerado
-    if not disable_replicate:
-        # Analisar o conteúdo para identificar elementos específicos
-        content_lower = initial_content.lower()
-        
-        # Criar prompt de imagem mais específico baseado no conteúdo
-        content_based_image_prompt = f"""
+    except Exception as e:
+        print(f"⚠️ Validação da imagem final falhou: {e}")
+        return None
+
+
+def _build_content_image_prompt(
+    initial_content: str,
+    use_superior_concepts: bool,
+    replicate_prompt: str | None = None,
+    caption_style: str | None = None,
+    ab_config: Dict | None = None,
+) -> str:
+    """
+    Cria o prompt de imagem específico para ilustrar o conteúdo gerado.
+
+    O prompt de imagem da conta/tema (ou do `--replicate_prompt`) entra como
+    direção visual, e o estilo de imagem do A/B e o `caption_style` como
+    instruções de estilo adicionais.
+    """
+    # Analisar o conteúdo para identificar elementos específicos
+    content_lower = initial_content.lower()
+
+    # Criar prompt de imagem mais específico baseado no conteúdo
+    content_based_image_prompt = f"""
         CONTEÚDO A ILUSTRAR: "{initial_content}"
-        
+
         INSTRUÇÕES ESPECÍFICAS DE IMAGEM:
         """
-        
-        # Adicionar instruções específicas baseadas no conteúdo
-        if "geladeira" in content_lower or "refrigerador" in content_lower:
-            if "borracha" in content_lower or "vedação" in content_lower:
-                content_based_image_prompt += """
+
+    # Adicionar instruções específicas baseadas no conteúdo
+    if "geladeira" in content_lower or "refrigerador" in content_lower:
+        if "borracha" in content_lower or "vedação" in content_lower:
+            content_based_image_prompt += """
         - MOSTRAR: Geladeira com foco na borracha de vedação da porta
         - PROBLEMA VISÍVEL: Borracha ressecada, rachada, suja ou com mofo
         - ÂNGULO: Close-up na porta da geladeira mostrando a vedação danificada
         - CONTEXTO: Cozinha residencial, iluminação que destaque o problema
                 """
-            else:
-                content_based_image_prompt += """
+        else:
+            content_based_image_prompt += """
         - MOSTRAR: Geladeira em contexto de manutenção ou problema técnico
         - FOCO: Componentes internos, motor, ou técnico trabalhando
                 """
-        
-        elif "ar-condicionado" in content_lower or "ar condicionado" in content_lower or "split" in content_lower:
-            if "sujo" in content_lower or "fungo" in content_lower or "bactéria" in content_lower or "sujeira" in content_lower:
-                content_based_image_prompt += """
+
+    elif "ar-condicionado" in content_lower or "ar condicionado" in content_lower or "split" in content_lower:
+        if "sujo" in content_lower or "fungo" in content_lower or "bactéria" in content_lower or "sujeira" in content_lower:
+            content_based_image_prompt += """
         - MOSTRAR: Ar-condicionado split com filtros visivelmente sujos
         - PROBLEMA VISÍVEL: Filtros escuros, com acúmulo de poeira, fungos ou mofo
         - ÂNGULO: Ar-condicionado aberto mostrando o interior sujo
         - CONTRASTE: Lado sujo vs lado limpo (antes/depois)
         - AMBIENTE: Parede residencial, foco no equipamento
                 """
-            else:
-                content_based_image_prompt += """
+        else:
+            content_based_image_prompt += """
         - MOSTRAR: Ar-condicionado split em contexto de manutenção
         - FOCO: Técnico trabalhando, componentes internos, ou instalação
                 """
-        
-        elif "máquina de lavar" in content_lower or "lavadora" in content_lower:
-            content_based_image_prompt += """
+
+    elif "máquina de lavar" in content_lower or "lavadora" in content_lower:
+        content_based_image_prompt += """
         - MOSTRAR: Máquina de lavar em contexto de reparo ou manutenção
         - FOCO: Componentes internos, técnico trabalhando, ou problema específico
             """
-        
-        elif "elétrica" in content_lower or "eletricista" in content_lower or "instalação" in content_lower:
-            content_based_image_prompt += """
+
+    elif "elétrica" in content_lower or "eletricista" in content_lower or "instalação" in content_lower:
+        content_based_image_prompt += """
         - MOSTRAR: Trabalho elétrico profissional em andamento
         - FOCO: Técnico uniformizado, ferramentas específicas, instalação elétrica
             """
-        
-        # Adicionar requisitos gerais de qualidade
-        content_based_image_prompt += """
-        
+
+    # Adicionar requisitos gerais de qualidade
+    content_based_image_prompt += """
+
         QUALIDADE TÉCNICA:
         - Fotografia profissional, alta resolução
         - Iluminação técnica adequada
@@ -311,96 +478,165 @@ def generate_and_publish(
         - Foco nítido no problema/serviço
         - Ambiente residencial ou comercial real
         - NUNCA: escritórios, computadores, ambientes corporativos genéricos
-        
+
         OBJETIVO: Mostrar visualmente o problema específico mencionado no conteúdo para gerar urgência e necessidade do serviço técnico.
         """
-        
-        # Aplicar melhorias do sistema existente
-        if use_superior_concepts:
-            enhanced_prompt, quality_metadata = get_superior_concept_prompt(content_theme=initial_content)
-            content_based_image_prompt = f"{content_based_image_prompt}\n{enhanced_prompt}"
-        else:
-            enhanced_prompt, quality_metadata = get_enhanced_image_prompt(
-                content_theme=initial_content,
-                current_style="professional",
-                force_high_quality=True
-            )
-            content_based_image_prompt = f"{content_based_image_prompt}\n{enhanced_prompt}"
-        
-        print(f"🎨 Gerando imagem baseada no conteúdo: {initial_content[:100]}...")
-        try:
-            generated_image_url = replicate.generate_image(prompt=content_based_image_prompt)
-            print("✅ Imagem gerada com sucesso baseada no conteúdo!")
-        except Exception as e:
-            print(f"❌ Replicate falhou, usando imagem original. Erro: {e}")
-            replicate_error = str(e)
-            generated_image_url = source_image_url
+
+    # Direção visual da conta, do tema semanal ou do CLI
+    if replicate_prompt:
+        content_based_image_prompt += f"""
+        DIREÇÃO VISUAL: {replicate_prompt}
+        """
+
+    # Aplicar melhorias do sistema existente
+    if use_superior_concepts:
+        enhanced_prompt, quality_metadata = get_superior_concept_prompt(content_theme=initial_content)
+        content_based_image_prompt = f"{content_based_image_prompt}\n{enhanced_prompt}"
+    else:
+        enhanced_prompt, quality_metadata = get_enhanced_image_prompt(
+            content_theme=initial_content,
+            current_style="professional",
+            force_high_quality=True
+        )
+        content_based_image_prompt = f"{content_based_image_prompt}\n{enhanced_prompt}"
+
+    # Aplicar configurações A/B para estilo de imagem
+    image_style = (ab_config or {}).get("image_style")
+    if image_style == "minimalist":
+        content_based_image_prompt += " Estilo ultra-minimalista, composição limpa, espaços em branco, elementos geométricos simples."
+    elif image_style == "dynamic":
+        content_based_image_prompt += " Estilo dinâmico com movimento, gradientes vibrantes, elementos em perspectiva, energia visual."
+    # Se veio um estilo do CLI, incluir como instrução de estilo
+    if caption_style:
+        content_based_image_prompt += f" Estilo adicional: {caption_style}."
+    return content_based_image_prompt
+
+
+def _generate_content_image(
+    replicate: ReplicateClient,
+    prompt: str,
+    initial_content: str,
+    source_image_url: str,
+    usage: Dict[str, int],
+) -> Tuple[str, str | None]:
+    """Gera a imagem baseada no conteúdo; em caso de falha retorna a imagem original e o erro."""
+    print(f"🎨 Gerando imagem baseada no conteúdo: {initial_content[:100]}...")
+    try:
+        usage["replicate_generations"] += 1
+        image_url = replicate.generate_image(prompt=prompt)
+        print("✅ Imagem gerada com sucesso baseada no conteúdo!")
+        return image_url, None
+    except Exception as e:
+        print(f"❌ Replicate falhou, usando imagem original. Erro: {e}")
+        return source_image_url, str(e)
+
+
+def _prepare_caption_request(
+    description: str,
+    caption_prompt: str | None,
+    original_text: str | None,
+    ab_config: Dict,
+    use_weekly_themes: bool,
+    weekly_theme_metadata: Dict,
+) -> Tuple[str | None, str, list]:
+    """
+    Prepara o prompt de legenda (formato, CTA e hashtags dinâmicas).
+    Retorna (prompt_aprimorado ou None, formato escolhido, hashtags).
+    """
+    # Inicializar variáveis de tracking
+    chosen_format = "standard"
+    dynamic_hashtags = []
     
-    # 3. TERCEIRO: Gerar descrição final da imagem gerada (para validação)
-    final_description = openai.describe_image(
-        generated_image_url,
-        custom_prompt="Descreva esta imagem de forma técnica e detalhada."
+    if not caption_prompt:
+        return None, chosen_format, dynamic_hashtags
+    
+    # Suporte a placeholders {descricao} e {texto_original}
+    # Agora {descricao} se refere ao conteúdo gerado, não à descrição da imagem
+    prompt_text = caption_prompt.replace("{descricao}", description)
+    if original_text:
+        prompt_text = prompt_text.replace("{texto_original}", original_text)
+    
+    # Aplicar variações de formato de conteúdo
+    enhanced_prompt, chosen_format = get_format_enhanced_prompt(
+        prompt_text, 
+        content=original_text or description,
+        original_text=original_text
     )
     
-    # Usar o conteúdo inicial como base principal (não a descrição da imagem)
-    description = initial_content
+    # Integrar hashtags dinâmicas
+    hashtag_manager = HashtagManager()
+    context_keywords = [original_text] if original_text else []
     
-    # Inicializar variáveis de tracking
-    chosen_format = "standard"
-    dynamic_hashtags = []
+    # Adicionar hashtags temáticas do sistema semanal
+    thematic_hashtags = []
+    if use_weekly_themes and weekly_theme_metadata.get("hashtag_suggestions"):
+        thematic_hashtags = weekly_theme_metadata["hashtag_suggestions"]
     
-    if caption_prompt:
-        # Suporte a placeholders {descricao} e {texto_original}
-        # Agora {descricao} se refere ao conteúdo gerado, não à descrição da imagem
-        prompt_text = caption_prompt.replace("{descricao}", description)
-        if original_text:
-            prompt_text = prompt_text.replace("{texto_original}", original_text)
-        
-        # Aplicar variações de formato de conteúdo
-        enhanced_prompt, chosen_format = get_format_enhanced_prompt(
-            prompt_text, 
-            content=original_text or description,
-            original_text=original_text
+    # Aplicar configurações A/B para estratégia de hashtags
+    hashtag_strategy = ab_config.get("hashtag_strategy", "balanced")
+    if hashtag_strategy == "trending":
+        dynamic_hashtags = hashtag_manager.generate_trending_hashtags(
+            context=chosen_format,
+            keywords=context_keywords
+        )
+    elif hashtag_strategy == "niche":
+        dynamic_hashtags = hashtag_manager.generate_niche_hashtags(
+            context=chosen_format,
+            keywords=context_keywords
         )
-        
-        # Integrar hashtags dinâmicas
-        hashtag_manager = HashtagManager()
-        context_keywords = [original_text] if original_text else []
-        
-        # Adicionar hashtags temáticas do sistema semanal
-        thematic_hashtags = []
-        if use_weekly_themes and weekly_theme_metadata.get("hashtag_suggestions"):
-            thematic_hashtags = weekly_theme_metadata["hashtag_suggestions"]
-        
-        # Aplicar configurações A/B para estratégia de hashtags
-        hashtag_strategy = ab_config.get("hashtag_strategy", "balanced")
-        if hashtag_strategy == "trending":
-            dynamic_hashtags = hashtag_manager.generate_trending_hashtags(
-                context=chosen_format,
-                keywords=context_keywords
-            )
-        elif hashtag_strategy == "niche":
-            dynamic_hashtags = hashtag_manager.generate_niche_hashtags(
-                context=chosen_format,
-                keywords=context_keywords
-            )
-        else:
-            dynamic_hashtags = hashtag_manager.get_dynamic_hashtags(
-                context=chosen_format
-            )
-        
-        # Combinar hashtags dinâmicas com temáticas (priorizar temáticas)
-        combined_hashtags = thematic_hashtags + [tag for tag in dynamic_hashtags if tag not in thematic_hashtags]
-        dynamic_hashtags = combined_hashtags[:15]  # Limitar a 15 hashtags total
-        
-        # Adicionar informações sobre hashtags ao prompt
-        hashtag_instruction = f"\n\nUSE ESTAS HASHTAGS DINÂMICAS: {' '.join(dynamic_hashtags)}"
-        enhanced_prompt += hashtag_instruction
-        
-        caption = openai.generate_caption_with_prompt(enhanced_prompt)
     else:
-        caption = openai.generate_caption(description, caption_style)
+        dynamic_hashtags = hashtag_manager.get_dynamic_hashtags(
+            context=chosen_format
+        )
+    
+    # Combinar hashtags dinâmicas com temáticas (priorizar temáticas)
+    combined_hashtags = thematic_hashtags + [tag for tag in dynamic_hashtags if tag not in thematic_hashtags]
+    dynamic_hashtags = combined_hashtags[:15]  # Limitar a 15 hashtags total
+    
+    # Adicionar informações sobre hashtags ao prompt
+    hashtag_instruction = f"\n\nUSE ESTAS HASHTAGS DINÂMICAS: {' '.join(dynamic_hashtags)}"
+    enhanced_prompt += hashtag_instruction
+    return enhanced_prompt, chosen_format, dynamic_hashtags
+
 
+def _generate_caption(
+    openai: OpenAIClient,
+    description: str,
+    caption_style: str | None,
+    caption_request: Tuple[str | None, str, list],
+) -> str:
+    """Gera a legenda com o prompt preparado (ou a partir da descrição, sem prompt da conta)."""
+    enhanced_prompt = caption_request[0]
+    if enhanced_prompt is not None:
+        return openai.generate_caption_with_prompt(enhanced_prompt)
+    return openai.generate_caption(description, caption_style)
+
+
+def _publish(
+    instagram_business_id: str,
+    instagram_access_token: str,
+    telegram_bot_token: str,
+    telegram_chat_id: str,
+    description: str,
+    caption: str,
+    generated_image_url: str,
+    replicate_error: str | None,
+    account_name: str | None,
+    chosen_format: str,
+    dynamic_hashtags: list,
+    disable_replicate: bool,
+    use_weekly_themes: bool,
+    weekly_theme_metadata: Dict,
+    publish_to_stories: bool,
+    stories_background_type: str,
+    stories_text: str | None,
+    stories_text_position: str,
+    supa_url: str | None,
+    supa_key: str | None,
+    supa_bkt: str | None,
+    usage: Dict[str, int],
+) -> Dict:
+    """Publica no Instagram (Feed e, opcionalmente, Stories), notifica e monta o resultado."""
     # Preparar e publicar no Instagram
     instagram = InstagramClient(instagram_business_id, instagram_access_token)
     # Validação básica do token do Instagram: evitar credenciais de login equivocadas
@@ -413,6 +649,7 @@ def generate_and_publish(
             "status": "ERROR",
             "error": "INSTAGRAM_ACCESS_TOKEN inválido. Use um token da Graph API (EAA...).",
             "replicate_error": replicate_error,
+            "usage": usage,
         }
     try:
         creation_id = instagram.prepare_media(generated_image_url, caption)
@@ -465,8 +702,8 @@ def generate_and_publish(
                                 # Gerar frase curta automaticamente baseada no conteúdo
                                 text_for_stories = stories_processor.generate_short_catchphrase(description, caption)
                             
-                            # Processar imagem com texto
-                            stories_image_path = stories_processor.process_and_save_for_stories_with_text(
+                            # Processar imagem com texto (JPEG em memória, sem arquivo temporário)
+                            stories_image_bytes = stories_processor.process_for_stories_with_text_bytes(
                                 generated_image_url,
                                 text=text_for_stories,
                                 background_type=stories_background_type,
@@ -477,16 +714,16 @@ def generate_and_publish(
                             stories_image_url = generated_image_url  # Fallback
                             try:
                                 if supa_url and supa_key and supa_bkt:
-                                    stories_image_url = SupabaseUploader(supa_url, supa_key, supa_bkt).upload_from_file(
-                                        stories_image_path, force_jpeg=True
+                                    stories_image_url = SupabaseUploader(supa_url, supa_key, supa_bkt).upload_from_bytes(
+                                        stories_image_bytes, content_type="image/jpeg"
                                     )
                                 else:
-                                    stories_image_url = PublicUploader().upload_from_file(stories_image_path)
+                                    stories_image_url = PublicUploader().upload_from_bytes(
+                                        stories_image_bytes, content_type="image/jpeg", filename="stories.jpg"
+                                    )
+                                usage["uploads"] += 1
                             except Exception as upload_err:
                                 pass
-                            finally:
-                                # Limpar arquivo temporário
-                                stories_processor.cleanup_temp_file(stories_image_path)
                             
                             # 3. Publicar no Stories
                             stories_result = instagram.publish_to_stories_complete(stories_image_url)
@@ -525,6 +762,7 @@ def generate_and_publish(
                 "status": final_status,
                 "telegram_sent": telegram_sent,
                 "replicate_error": replicate_error,
+                "usage": usage,
             }
             
             # Adicionar informações do Stories se foi tentado
@@ -547,6 +785,7 @@ def generate_and_publish(
                 "creation_id": creation_id,
                 "status": status,
                 "replicate_error": replicate_error,
+                "usage": usage,
             }
     except Exception as e:
         # Erro ao preparar/publicar no Instagram
@@ -563,4 +802,5 @@ def generate_and_publish(
             "status": "ERROR",
             "error": str(e),
             "replicate_error": replicate_error,
+            "usage": usage,
         }
\ No newline at end of file
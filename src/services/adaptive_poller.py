@@ -0,0 +1,110 @@
+"""
+Polling adaptativo para operações assíncronas de APIs (ex.: containers do Instagram).
+
+Começa com intervalos curtos (um container pronto em 800ms não espera 5s),
+cresce exponencialmente com jitter até um teto e respeita um prazo total.
+Cada execução registra duração e tentativas por fase em `poll_stats`, para
+calibrar os parâmetros com dados reais.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PollStats:
+    """Duração e tentativas de cada fase de polling (ex.: 'media_status')."""
+
+    def __init__(self, max_samples: int = 500):
+        self._samples: Dict[str, List[tuple]] = {}
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, elapsed: float, attempts: int, completed: bool):
+        with self._lock:
+            samples = self._samples.setdefault(phase, [])
+            samples.append((elapsed, attempts, completed))
+            if len(samples) > self._max_samples:
+                del samples[0]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Resumo por fase: execuções, média/p50/máx em segundos, tentativas médias e timeouts."""
+        with self._lock:
+            snapshot = {phase: list(samples) for phase, samples in self._samples.items()}
+        result = {}
+        for phase, samples in snapshot.items():
+            durations = sorted(s[0] for s in samples)
+            result[phase] = {
+                "runs": len(samples),
+                "avg_s": round(sum(durations) / len(durations), 3),
+                "p50_s": round(durations[len(durations) // 2], 3),
+                "max_s": round(durations[-1], 3),
+                "avg_attempts": round(sum(s[1] for s in samples) / len(samples), 2),
+                "timeouts": sum(1 for s in samples if not s[2]),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+# Instância global para uso em todo o sistema
+poll_stats = PollStats()
+
+
+class AdaptivePoller:
+    """
+    Executa `check()` até retornar um valor diferente de None ou o prazo acabar.
+
+    O intervalo entre tentativas começa em `initial_interval`, é multiplicado
+    por `factor` a cada tentativa até `max_interval` e recebe jitter de
+    ±`jitter` (fração) para não sincronizar workers paralelos.
+    """
+
+    def __init__(
+        self,
+        initial_interval: float = 0.5,
+        factor: float = 1.6,
+        max_interval: float = 5.0,
+        jitter: float = 0.2,
+        deadline: float = 120.0,
+        stats: PollStats | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.initial_interval = initial_interval
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.deadline = deadline
+        self.stats = stats if stats is not None else poll_stats
+        self._sleep = sleep
+        self._clock = clock
+
+    def intervals(self):
+        """Sequência (infinita) de intervalos base, sem jitter."""
+        interval = self.initial_interval
+        while True:
+            yield min(interval, self.max_interval)
+            interval *= self.factor
+
+    def poll(self, check: Callable[[], Optional[Any]], phase: str = "poll") -> Optional[Any]:
+        """Retorna o primeiro resultado não-None de `check`, ou None se o prazo expirar."""
+        started = self._clock()
+        attempts = 0
+        result = None
+        try:
+            for interval in self.intervals():
+                attempts += 1
+                result = check()
+                if result is not None:
+                    return result
+                remaining = self.deadline - (self._clock() - started)
+                if remaining <= 0:
+                    return None
+                delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                self._sleep(max(0.0, min(delay, remaining)))
+        finally:
+            self.stats.record(phase, self._clock() - started, attempts, result is not None)
@@ -0,0 +1,307 @@
+"""
+Cache local de imagens endereçado por conteúdo.
+
+Cada download é guardado uma única vez em `cache/blobs/<sha256[:2]>/<sha256>`
+e um índice SQLite mapeia URL -> sha256 (com content-type e instante do
+download). Assim a mesma imagem atravessa a rede uma vez por post, mesmo
+sendo usada pelo upload, pela descrição da OpenAI e pelo processamento de
+Stories, e novas tentativas reaproveitam os bytes locais. Bytes enviados
+para uma hospedagem também podem ser registrados sob a URL pública
+resultante (`put`), evitando baixá-los de volta, e o índice guarda também o
+manifesto de uploads (destino + sha256 -> URL pública), para que o mesmo
+conteúdo não seja enviado duas vezes ao mesmo bucket.
+
+O tamanho total é limitado: acima do orçamento saem os blobs usados há mais
+tempo. O mapeamento URL -> conteúdo expira após `url_ttl` segundos.
+
+Configuração por ambiente: BLOB_CACHE_DIR, BLOB_CACHE_MB (padrão 512) e
+BLOB_CACHE_URL_TTL (segundos, padrão 86400).
+
+Downloads são gravados em blocos direto no disco (`fetch_path`), e os
+uploaders enviam a partir do arquivo aberto (`open`), sem manter a imagem
+original inteira em memória. A exceção é a conversão para JPEG do
+`SupabaseUploader`, que decodifica a imagem; ela só acontece quando a origem
+não é um JPEG dentro do orçamento do codificador.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Tuple
+
+from .http_transport import HttpTransport, get_transport
+from .single_flight import SingleFlight
+
+# Tamanho dos blocos lidos da rede/arquivo ao gravar um blob
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobCache:
+    """Blobs em disco por sha256, índice de URLs em SQLite e evicção LRU por tamanho."""
+
+    def __init__(
+        self,
+        root: str | Path,
+        max_bytes: int = 512 * 1024 * 1024,
+        url_ttl: float = 86400.0,
+        clock=time.time,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.url_ttl = url_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+        (self.root / "blobs").mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.root / "index.sqlite3", check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, "
+            "content_type TEXT, fetched_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs (last_access)")
+        # Manifesto de uploads: não sofre evicção, o objeto remoto continua existindo
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads (target TEXT NOT NULL, sha256 TEXT NOT NULL, "
+            "url TEXT NOT NULL, uploaded_at REAL NOT NULL, PRIMARY KEY (target, sha256))"
+        )
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _path(self, sha: str) -> Path:
+        return self.root / "blobs" / sha[:2] / sha
+
+    def path(self, sha: str) -> Path:
+        """Caminho do blob no disco (pode não existir mais após evicção)."""
+        return self._path(sha)
+
+    def _lookup_path(self, url: str) -> Tuple[Path, str] | None:
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT u.sha256, u.content_type, u.fetched_at, b.size FROM urls u "
+                "JOIN blobs b ON b.sha256 = u.sha256 WHERE u.url = ?",
+                (url,),
+            ).fetchone()
+            if row is None or now - row[2] > self.url_ttl:
+                return None
+            sha, content_type, _, size = row
+            path = self._path(sha)
+            if not path.exists():
+                # Blob removido por fora: esquecer o blob, seus mapeamentos e o tamanho contabilizado
+                self._db.execute("DELETE FROM urls WHERE sha256 = ?", (sha,))
+                self._db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+                self._total -= size
+                return None
+            self._db.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (now, sha))
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += size
+            return path, content_type or "application/octet-stream"
+
+    def lookup(self, url: str) -> Tuple[bytes, str] | None:
+        """Bytes e content-type já baixados desta URL, ou None."""
+        found = self._lookup_path(url)
+        if found is None:
+            return None
+        path, content_type = found
+        try:
+            return path.read_bytes(), content_type
+        except OSError:
+            return None
+
+    def put(self, data: bytes, content_type: str, url: str | None = None) -> str:
+        """Guarda os bytes (uma vez por conteúdo), opcionalmente sob uma URL; retorna o sha256."""
+        sha = hashlib.sha256(data).hexdigest()
+        tmp = None
+        if not self._path(sha).exists():
+            tmp = self._tmp_path()
+            tmp.write_bytes(data)
+        self._commit(tmp, sha, len(data), content_type, url)
+        return sha
+
+    def link(self, url: str, sha: str, content_type: str) -> bool:
+        """Registra um blob já guardado sob mais uma URL (ex.: a URL pública após o upload)."""
+        with self._lock:
+            if not self._db.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha,)).fetchone():
+                return False
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, content_type, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, sha, content_type, self._clock()),
+            )
+            return True
+
+    def _tmp_path(self) -> Path:
+        return self.root / "blobs" / f".{uuid.uuid4().hex}.tmp"
+
+    @staticmethod
+    def _write_chunks(tmp: Path, chunks) -> Tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return digest.hexdigest(), size
+
+    def _commit(self, tmp: Path | None, sha: str, size: int, content_type: str, url: str | None):
+        """Move o arquivo temporário para o endereço do conteúdo e atualiza o índice."""
+        now = self._clock()
+        path = self._path(sha)
+        with self._lock:
+            exists = self._db.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha,)).fetchone()
+            if tmp is not None:
+                if path.exists():
+                    tmp.unlink(missing_ok=True)
+                else:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp, path)
+            if not exists:
+                self._total += size
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (sha256, size, last_access) VALUES (?, ?, ?)",
+                (sha, size, now),
+            )
+            if url:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO urls (url, sha256, content_type, fetched_at) VALUES (?, ?, ?, ?)",
+                    (url, sha, content_type, now),
+                )
+            self._evict(keep=sha)
+
+    def _evict(self, keep: str):
+        """Remove os blobs menos usados até caber no orçamento (chamar com o lock)."""
+        if self._total <= self.max_bytes:
+            return
+        victims = []
+        excess = self._total - self.max_bytes
+        for sha, size in self._db.execute("SELECT sha256, size FROM blobs ORDER BY last_access"):
+            if excess <= 0:
+                break
+            if sha == keep:
+                continue
+            victims.append((sha, size))
+            excess -= size
+        for sha, size in victims:
+            try:
+                self._path(sha).unlink()
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+            self._db.execute("DELETE FROM urls WHERE sha256 = ?", (sha,))
+            self._total -= size
+            self.stats["evictions"] += 1
+
+    def fetch_path(self, url: str, http: HttpTransport | None = None, timeout: float = 30) -> Tuple[Path, str]:
+        """
+        Caminho local e content-type da URL, baixando só se não estiver no cache.
+        O download é gravado em blocos direto no disco (memória limitada ao bloco),
+        e downloads simultâneos da mesma URL são coalescidos em um só.
+        """
+        cached = self._lookup_path(url)
+        if cached is not None:
+            return cached
+
+        def download() -> Tuple[Path, str]:
+            again = self._lookup_path(url)
+            if again is not None:
+                return again
+            response = (http or get_transport()).get(url, timeout=timeout, stream=True)
+            try:
+                response.raise_for_status()
+                content_type = (response.headers.get("Content-Type") or "image/jpeg").split(";")[0].strip()
+                tmp = self._tmp_path()
+                sha, size = self._write_chunks(tmp, response.iter_content(CHUNK_SIZE))
+            finally:
+                response.close()
+            with self._lock:
+                self.stats["misses"] += 1
+                self.stats["bytes_downloaded"] += size
+            self._commit(tmp, sha, size, content_type, url)
+            return self._path(sha), content_type
+
+        return self._inflight.do(url, download)[0]
+
+    def open(self, url: str, http: HttpTransport | None = None, timeout: float = 30) -> Tuple[BinaryIO, str, str]:
+        """
+        Abre o blob da URL (baixando se preciso) e retorna (arquivo, content-type, sha256).
+
+        O arquivo aberto continua legível mesmo que outra thread faça a evicção do
+        blob em seguida; se a evicção acontecer antes da abertura, baixa de novo.
+        """
+        for attempt in range(2):
+            path, content_type = self.fetch_path(url, http=http, timeout=timeout)
+            try:
+                return open(path, "rb"), content_type, path.name
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def fetch(self, url: str, http: HttpTransport | None = None, timeout: float = 30) -> Tuple[bytes, str]:
+        """Bytes e content-type da URL (ver `fetch_path`)."""
+        f, content_type, _ = self.open(url, http=http, timeout=timeout)
+        with f:
+            return f.read(), content_type
+
+    def uploaded_url(self, target: str, sha: str) -> str | None:
+        """URL pública de um conteúdo já enviado ao destino (ex.: `<supabase>/<bucket>`), ou None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url FROM uploads WHERE target = ? AND sha256 = ?", (target, sha)
+            ).fetchone()
+            return row[0] if row else None
+
+    def record_upload(self, target: str, sha: str, url: str):
+        """Registra no manifesto que o conteúdo está publicado no destino."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads (target, sha256, url, uploaded_at) VALUES (?, ?, ?, ?)",
+                (target, sha, url, self._clock()),
+            )
+
+    def forget_upload(self, target: str, sha: str | None = None):
+        """Remove do manifesto um conteúdo (ou o destino inteiro) que deixou de existir no remoto."""
+        with self._lock:
+            if sha is None:
+                self._db.execute("DELETE FROM uploads WHERE target = ?", (target,))
+            else:
+                self._db.execute("DELETE FROM uploads WHERE target = ? AND sha256 = ?", (target, sha))
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            blobs = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            return dict(self.stats, blobs=blobs, bytes=self._total)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache: BlobCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_blob_cache() -> BlobCache:
+    """Cache global de imagens, criado sob demanda a partir do ambiente."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            project_root = Path(__file__).resolve().parents[2]  # raiz do projeto
+            _cache = BlobCache(
+                os.getenv("BLOB_CACHE_DIR") or project_root / "cache" / "blobs",
+                max_bytes=int(float(os.getenv("BLOB_CACHE_MB", "512")) * 1024 * 1024),
+                url_ttl=float(os.getenv("BLOB_CACHE_URL_TTL", "86400")),
+            )
+        return _cache
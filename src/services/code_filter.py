@@ -0,0 +1,244 @@
+"""
+Filtro de Bloom dos códigos já conhecidos (`top_trends` e arquivo).
+
+O filtro é persistido em disco entre execuções, com a marca d'água da fila:
+cada coleta (em geral um processo novo do cron) lê do Postgres só os ids
+acima dela, e a carga completa (fila e arquivo) só acontece na primeira
+execução, com o filtro saturado ou com o arquivo mais velho que o limite.
+Um código ausente do filtro é certamente novo e não custa consulta ao
+Postgres; só os acertos do filtro passam pela verificação exata, que também
+mede a taxa real de falsos positivos.
+
+Configuração por ambiente: CODE_FILTER_FP_RATE (taxa alvo, padrão 0.01),
+CODE_FILTER_DIR (diretório dos arquivos, padrão cache/) e
+CODE_FILTER_MAX_AGE_DAYS (idade máxima do arquivo antes de reconstruir,
+padrão 7).
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+class BloomFilter:
+    """Filtro de Bloom em `bytearray`, com hashing duplo (Kirsch-Mitzenmacher) sobre blake2b."""
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.size = max(64, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str) -> List[int]:
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str):
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def expected_fp_rate(self) -> float:
+        """Taxa teórica de falsos positivos com a ocupação atual."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    def to_dict(self) -> Dict[str, float]:
+        """Parâmetros do filtro (os bits são gravados à parte)."""
+        return {"capacity": self.capacity, "fp_rate": self.fp_rate, "size": self.size,
+                "hashes": self.hashes, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, float], bits: bytes) -> "BloomFilter":
+        bloom = cls(int(data["capacity"]), float(data["fp_rate"]))
+        if bloom.size != data["size"] or bloom.hashes != data["hashes"] or len(bits) != bloom.nbytes:
+            raise ValueError("parâmetros do filtro não conferem com os bits gravados")
+        bloom._bits = bytearray(bits)
+        bloom.count = int(data["count"])
+        return bloom
+
+
+class KnownCodesFilter:
+    """
+    Conjunto aproximado dos códigos conhecidos de um banco.
+
+    `candidates(codes)` devolve só os códigos que podem já existir (acertos do
+    filtro); os demais são certamente novos. `record_check` contabiliza o
+    resultado da verificação exata desses candidatos.
+    """
+
+    def __init__(
+        self,
+        fp_rate: float = 0.01,
+        path: str | Path | None = None,
+        max_age: float = 7 * 86400.0,
+        clock=time.time,
+    ):
+        self.fp_rate = fp_rate
+        self.path = Path(path) if path else None
+        self.max_age = max_age
+        self._clock = clock
+        self._bloom: BloomFilter | None = None
+        self._watermark = 0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "filter_hits": 0, "false_positives": 0, "loaded": 0, "rebuilds": 0, "restored": 0}
+
+    def refresh(self, db, page_size: int = 10000):
+        """
+        Completa o filtro com os ids da fila acima da marca d'água. Na primeira
+        chamada parte do arquivo salvo; reconstrói do banco se não houver arquivo,
+        se ele estiver velho demais ou se o filtro estiver saturado.
+        """
+        with self._lock:
+            if self._bloom is None:
+                self._load()
+            loaded = self.stats["loaded"]
+            if (
+                self._bloom is None
+                or self._bloom.count > self._bloom.capacity
+                or self._clock() - self._built_at > self.max_age
+            ):
+                self._rebuild(db, page_size)
+            else:
+                self._load_queue(db, self._bloom, page_size)
+            if self.stats["loaded"] != loaded:
+                self._save()
+
+    def _rebuild(self, db, page_size: int):
+        total = db.count_known_codes()
+        # Folga para o crescimento até a próxima reconstrução
+        bloom = BloomFilter(max(10000, 2 * total), self.fp_rate)
+        self._watermark = 0
+        after = 0
+        while True:
+            rows = db.known_code_page(after, page_size, archive=True)
+            for _, code in rows:
+                bloom.add(code)
+            self.stats["loaded"] += len(rows)
+            if len(rows) < page_size:
+                break
+            after = rows[-1][0]
+        self._load_queue(db, bloom, page_size)
+        self._bloom = bloom
+        self._built_at = self._clock()
+        self.stats["rebuilds"] += 1
+
+    def _load_queue(self, db, bloom: BloomFilter, page_size: int):
+        while True:
+            rows = db.known_code_page(self._watermark, page_size)
+            for _, code in rows:
+                bloom.add(code)
+            self.stats["loaded"] += len(rows)
+            if rows:
+                self._watermark = rows[-1][0]
+            if len(rows) < page_size:
+                break
+
+    def _load(self):
+        """Restaura o filtro salvo: uma linha JSON com os parâmetros, seguida dos bits."""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, "rb") as f:
+                header = json.loads(f.readline())
+                bloom = BloomFilter.from_dict(header["bloom"], f.read())
+            if bloom.fp_rate != self.fp_rate:
+                return
+            self._bloom = bloom
+            self._watermark = int(header["watermark"])
+            self._built_at = float(header["built_at"])
+            self.stats["restored"] += 1
+        except Exception:
+            self._bloom = None
+
+    def _save(self):
+        """Grava o filtro (escrita atômica via arquivo temporário)."""
+        if self.path is None or self._bloom is None:
+            return
+        header = {"bloom": self._bloom.to_dict(), "watermark": self._watermark, "built_at": self._built_at}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                f.write(self._bloom.to_bytes())
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    def candidates(self, codes: Iterable[str]) -> List[str]:
+        codes = list(codes)
+        with self._lock:
+            if self._bloom is None:
+                hits = codes
+            else:
+                hits = [c for c in codes if c in self._bloom]
+            self.stats["lookups"] += len(codes)
+            self.stats["filter_hits"] += len(hits)
+        return hits
+
+    def record_check(self, candidates: List[str], known: Iterable[str]):
+        """Registra quantos candidatos a verificação exata mostrou serem novos (falsos positivos)."""
+        with self._lock:
+            if self._bloom is not None:
+                self.stats["false_positives"] += len(set(candidates) - set(known))
+
+    def add_many(self, codes: Iterable[str]):
+        with self._lock:
+            if self._bloom is not None:
+                for code in codes:
+                    if code:
+                        self._bloom.add(code)
+
+    def summary(self) -> Dict[str, float]:
+        """Contadores, memória e taxas de falso positivo (medida e teórica)."""
+        with self._lock:
+            stats = dict(self.stats)
+            negatives = stats["lookups"] - stats["filter_hits"] + stats["false_positives"]
+            stats["measured_fp_rate"] = round(stats["false_positives"] / negatives, 4) if negatives else 0.0
+            stats["expected_fp_rate"] = round(self._bloom.expected_fp_rate(), 4) if self._bloom else 0.0
+            stats["codes"] = self._bloom.count if self._bloom else 0
+            stats["bytes"] = self._bloom.nbytes if self._bloom else 0
+            return stats
+
+
+_filters: Dict[str, KnownCodesFilter] = {}
+_filters_lock = threading.Lock()
+
+
+def get_known_codes_filter(dsn: str) -> KnownCodesFilter:
+    """Filtro do processo para o banco do DSN (restaurado ou carregado no primeiro `refresh`)."""
+    with _filters_lock:
+        known = _filters.get(dsn)
+        if known is None:
+            project_root = Path(__file__).resolve().parents[2]  # raiz do projeto
+            directory = Path(os.getenv("CODE_FILTER_DIR") or project_root / "cache")
+            # Um arquivo por banco, sem expor o DSN (que leva a senha) no nome
+            name = hashlib.sha256(dsn.encode("utf-8")).hexdigest()[:16]
+            known = _filters[dsn] = KnownCodesFilter(
+                float(os.getenv("CODE_FILTER_FP_RATE", "0.01")),
+                path=directory / f"known_codes_{name}.bloom",
+                max_age=float(os.getenv("CODE_FILTER_MAX_AGE_DAYS", "7")) * 86400,
+            )
+        return known
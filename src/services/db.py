@@ -1,34 +1,42 @@
-import psycopg
-from typing import Dict
+import os
+import socket
+from typing import Dict, List, Tuple
 
+from .db_migrations import apply_migrations
+from .db_pool import get_pool
 
-SCHEMA_SQL = """
-CREATE TABLE IF NOT EXISTS top_trends (
-    id SERIAL PRIMARY KEY,
-    prompt TEXT,
-    thumbnail_url TEXT,
-    code TEXT UNIQUE,
-    tag TEXT,
-    isposted BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP DEFAULT NOW()
-);
-"""
+
+# Índices parciais da fila de não postados (migração 3)
+UNPOSTED_INDEXES = ("idx_top_trends_unposted_tag_created", "idx_top_trends_unposted_created")
+
+
+def default_worker_id() -> str:
+    """Identificador do worker (host:pid) usado nas leases da fila."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _ensure_schema(conn):
+    applied = apply_migrations(conn)
+    if applied:
+        print(f"🗄️ Migrações aplicadas: {applied}")
 
 
 class Database:
     def __init__(self, dsn: str):
         self.dsn = dsn
-        self.conn = psycopg.connect(dsn, autocommit=True)
-        with self.conn.cursor() as cur:
-            cur.execute(SCHEMA_SQL)
+        # Pool compartilhado pelo processo; as migrações rodam uma vez por pool
+        self.pool = get_pool(dsn, configure=_ensure_schema)
+
+    def close(self):
+        """Mantido por compatibilidade: as conexões pertencem ao pool do processo."""
 
     def exists_code(self, code: str) -> bool:
-        with self.conn.cursor() as cur:
+        with self.pool.connection() as conn, conn.cursor() as cur:
             cur.execute("SELECT 1 FROM top_trends WHERE code = %s", (code,))
             return cur.fetchone() is not None
 
     def insert_trend(self, item: Dict):
-        with self.conn.cursor() as cur:
+        with self.pool.connection() as conn, conn.cursor() as cur:
             cur.execute(
                 """
                 INSERT INTO top_trends (prompt, thumbnail_url, code, tag, isposted)
@@ -44,12 +52,118 @@ class Database:
                 ),
             )
 
+    def insert_trends(self, items: List[Dict], batch_size: int = 500) -> int:
+        """
+        Insere vários itens em um único INSERT multi-linha por lote.
+        Códigos já existentes (ou repetidos no lote) são ignorados via ON CONFLICT,
+        e códigos já arquivados não são reinseridos.
+        Retorna a quantidade exata de linhas novas (via RETURNING).
+        """
+        rows = []
+        seen = set()
+        for item in items:
+            code = item.get("content_code")
+            if code in seen:
+                continue
+            seen.add(code)
+            rows.append((item.get("prompt"), item.get("thumbnail_url"), code, item.get("tag"), False))
+        inserted = 0
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ",".join(["(%s, %s, %s, %s, %s)"] * len(batch))
+            params = [value for row in batch for value in row]
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    INSERT INTO top_trends (prompt, thumbnail_url, code, tag, isposted)
+                    SELECT v.prompt, v.thumbnail_url, v.code, v.tag, v.isposted
+                    FROM (VALUES {placeholders}) AS v(prompt, thumbnail_url, code, tag, isposted)
+                    WHERE NOT EXISTS (SELECT 1 FROM top_trends_archive a WHERE a.code = v.code)
+                    ON CONFLICT (code) DO NOTHING
+                    RETURNING code
+                    """,
+                    params,
+                )
+                inserted += len(cur.fetchall())
+        return inserted
+
+    def known_codes(self, codes: List[str]) -> set:
+        """Códigos já conhecidos (fila ou arquivo) entre os informados, em uma única consulta."""
+        if not codes:
+            return set()
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT code FROM top_trends WHERE code = ANY(%s)
+                UNION
+                SELECT code FROM top_trends_archive WHERE code = ANY(%s)
+                """,
+                (list(codes), list(codes)),
+            )
+            return {row[0] for row in cur.fetchall()}
+
+    def count_known_codes(self) -> int:
+        """Total de códigos na fila e no arquivo (dimensiona o filtro de Bloom)."""
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT (SELECT COUNT(*) FROM top_trends) + (SELECT COUNT(*) FROM top_trends_archive)")
+            return int(cur.fetchone()[0])
+
+    def known_code_page(self, after_id: int, limit: int = 10000, archive: bool = False) -> List[Tuple[int, str]]:
+        """Página (id, code) em ordem de id a partir de `after_id` (paginação por chave)."""
+        table = "top_trends_archive" if archive else "top_trends"
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"SELECT id, code FROM {table} WHERE id > %s AND code IS NOT NULL ORDER BY id LIMIT %s",
+                (after_id, limit),
+            )
+            return [(row[0], row[1]) for row in cur.fetchall()]
+
+    def load_collect_state(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Estado da coleta incremental para os pares (tipo, chave) informados."""
+        if not keys:
+            return {}
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT s.kind, s.key, s.last_codes, s.cursor, s.cursor_host
+                FROM collect_state s
+                JOIN unnest(%s::text[], %s::text[]) AS k(kind, key) ON k.kind = s.kind AND k.key = s.key
+                """,
+                ([k[0] for k in keys], [k[1] for k in keys]),
+            )
+            return {
+                (kind, key): {"last_codes": list(codes or []), "cursor": cursor, "cursor_host": cursor_host}
+                for kind, key, codes, cursor, cursor_host in cur.fetchall()
+            }
+
+    def save_collect_state(self, states: Dict[Tuple[str, str], Dict]) -> None:
+        """Grava (upsert) o estado da coleta incremental em um único comando."""
+        if not states:
+            return
+        placeholders = ",".join(["(%s, %s, %s, %s, %s)"] * len(states))
+        params = []
+        for (kind, key), state in states.items():
+            params.extend([kind, key, list(state.get("last_codes") or []), state.get("cursor"), state.get("cursor_host")])
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                INSERT INTO collect_state (kind, key, last_codes, cursor, cursor_host)
+                VALUES {placeholders}
+                ON CONFLICT (kind, key) DO UPDATE SET
+                    last_codes = EXCLUDED.last_codes,
+                    cursor = EXCLUDED.cursor,
+                    cursor_host = EXCLUDED.cursor_host,
+                    updated_at = NOW()
+                """,
+                params,
+            )
+
     def mark_posted(self, code: str):
-        with self.conn.cursor() as cur:
+        with self.pool.connection() as conn, conn.cursor() as cur:
             cur.execute("UPDATE top_trends SET isposted = TRUE WHERE code = %s", (code,))
 
     def list_unposted(self, limit: int = 10):
-        with self.conn.cursor() as cur:
+        with self.pool.connection() as conn, conn.cursor() as cur:
             cur.execute(
                 "SELECT prompt, thumbnail_url, code, tag FROM top_trends WHERE isposted = FALSE ORDER BY created_at DESC LIMIT %s",
                 (limit,),
@@ -62,10 +176,86 @@ class Database:
                 for row in rows
             ]
 
+    @staticmethod
+    def _claim_candidates(tags: list[str] | None, limit: int) -> Tuple[str, list]:
+        """SELECT dos candidatos de `claim_unposted` (também usado no EXPLAIN) e seus parâmetros."""
+        tag_filter = "AND tag = ANY(%s)" if tags else ""
+        sql = f"""
+                    SELECT id FROM top_trends
+                    WHERE isposted = FALSE
+                      AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+                      {tag_filter}
+                    ORDER BY created_at DESC
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """
+        params = [list(tags)] if tags else []
+        return sql, params + [limit]
+
+    def claim_unposted(
+        self,
+        limit: int = 1,
+        tags: list[str] | None = None,
+        worker_id: str | None = None,
+        lease_seconds: int = 900,
+    ):
+        """
+        Reserva atomicamente até `limit` itens não postados para este worker.
+
+        Itens com lease ativa de outro worker são pulados (FOR UPDATE SKIP LOCKED
+        + lease com expiração), então processos/réplicas concorrentes nunca
+        recebem o mesmo código. Leases expiradas (worker que caiu) voltam à fila.
+        Concluir com `complete_claim` ou devolver com `release_claim`.
+        """
+        if tags is not None and not tags:
+            return []
+        candidates_sql, params = self._claim_candidates(tags, limit)
+        params += [worker_id or default_worker_id(), lease_seconds]
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH candidates AS ({candidates_sql}),
+                claimed AS (
+                    UPDATE top_trends t
+                    SET claimed_by = %s, lease_expires_at = NOW() + make_interval(secs => %s)
+                    FROM candidates c
+                    WHERE t.id = c.id
+                    RETURNING t.prompt, t.thumbnail_url, t.code, t.tag, t.created_at
+                )
+                SELECT prompt, thumbnail_url, code, tag FROM claimed ORDER BY created_at DESC
+                """,
+                params,
+            )
+            rows = cur.fetchall()
+            colnames = [desc.name for desc in cur.description]
+            return [
+                {colnames[i]: row[i] for i in range(len(colnames))}
+                for row in rows
+            ]
+
+    def complete_claim(self, code: str) -> bool:
+        """Marca o item como postado e encerra a lease."""
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "UPDATE top_trends SET isposted = TRUE, claimed_by = NULL, lease_expires_at = NULL WHERE code = %s",
+                (code,),
+            )
+            return cur.rowcount > 0
+
+    def release_claim(self, code: str, worker_id: str | None = None) -> bool:
+        """Devolve à fila um item reservado por este worker (ex.: publicação falhou)."""
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "UPDATE top_trends SET claimed_by = NULL, lease_expires_at = NULL "
+                "WHERE code = %s AND claimed_by = %s AND isposted = FALSE",
+                (code, worker_id or default_worker_id()),
+            )
+            return cur.rowcount > 0
+
     def list_unposted_by_tags(self, tags: list[str], limit: int = 10):
         if not tags:
             return []
-        with self.conn.cursor() as cur:
+        with self.pool.connection() as conn, conn.cursor() as cur:
             placeholders = ",".join(["%s"] * len(tags))
             sql = (
                 f"SELECT prompt, thumbnail_url, code, tag FROM top_trends "
@@ -78,4 +268,72 @@ class Database:
             return [
                 {colnames[i]: row[i] for i in range(len(colnames))}
                 for row in rows
-            ]
\ No newline at end of file
+            ]
+
+    def archive_posted(self, older_than_days: int = 30, batch_size: int = 1000) -> int:
+        """
+        Move itens postados há mais de `older_than_days` dias para top_trends_archive,
+        em lotes (transações curtas). Só são removidos de top_trends os itens que
+        entraram no arquivo; um conflito (id ou código já arquivado) mantém a linha
+        na fila em vez de perdê-la. Retorna quantos itens foram arquivados.
+        """
+        archived = 0
+        after_id = 0
+        while True:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute(
+                    """
+                    WITH moved AS (
+                        SELECT id, prompt, thumbnail_url, code, tag, isposted, created_at FROM top_trends
+                        WHERE isposted AND created_at < NOW() - make_interval(days => %s) AND id > %s
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    ),
+                    archived AS (
+                        INSERT INTO top_trends_archive (id, prompt, thumbnail_url, code, tag, isposted, created_at)
+                        SELECT id, prompt, thumbnail_url, code, tag, isposted, created_at FROM moved
+                        ON CONFLICT DO NOTHING
+                        RETURNING id
+                    ),
+                    removed AS (
+                        DELETE FROM top_trends t USING archived a WHERE t.id = a.id RETURNING t.id
+                    )
+                    SELECT (SELECT count(*) FROM moved), (SELECT max(id) FROM moved), (SELECT count(*) FROM removed)
+                    """,
+                    (older_than_days, after_id, batch_size),
+                )
+                selected, last_id, removed = cur.fetchone()
+            archived += removed
+            # Avança pelo id: linhas em conflito ficam para trás sem travar o laço
+            if selected < batch_size:
+                return archived
+            after_id = last_id
+
+    def explain_claim_candidates(self, tags: list[str], limit: int = 10, force_index: bool = False) -> list[str]:
+        """
+        Plano (EXPLAIN) da seleção de candidatos de `claim_unposted`. Com `force_index`,
+        desliga seq scans na transação para verificar se o índice é aplicável
+        mesmo quando a tabela ainda é pequena demais para o planner preferi-lo.
+        """
+        sql, params = self._claim_candidates(tags, limit)
+        with self.pool.connection() as conn:
+            with conn.transaction(), conn.cursor() as cur:
+                if force_index:
+                    cur.execute("SET LOCAL enable_seqscan = off")
+                cur.execute(f"EXPLAIN {sql}", params)
+                return [row[0] for row in cur.fetchall()]
+
+    def check_unposted_plan(self, tags: list[str], limit: int = 10) -> Dict:
+        """
+        Verifica se a reserva da fila (`claim_unposted`) usa os índices parciais.
+        Retorna {"uses_index", "index_usable", "plan"}: `uses_index` reflete o plano
+        real; `index_usable` indica se o índice atende a consulta (plano forçado).
+        """
+        plan = self.explain_claim_candidates(tags, limit)
+        uses_index = any(name in line for line in plan for name in UNPOSTED_INDEXES)
+        index_usable = uses_index
+        if not uses_index:
+            forced = self.explain_claim_candidates(tags, limit, force_index=True)
+            index_usable = any(name in line for line in forced for name in UNPOSTED_INDEXES)
+        return {"uses_index": uses_index, "index_usable": index_usable, "plan": plan}
@@ -0,0 +1,124 @@
+"""
+Migrações versionadas do schema Postgres.
+
+Cada migração roda uma única vez, em ordem, dentro de uma transação, e fica
+registrada em `schema_migrations`. Um advisory lock serializa processos e
+réplicas que sobem ao mesmo tempo. Para mudar o schema, acrescente uma nova
+entrada ao final de MIGRATIONS (nunca edite uma migração já aplicada).
+"""
+
+from typing import List, Tuple
+
+# Chave arbitrária do advisory lock das migrações
+MIGRATIONS_LOCK_KEY = 7_301_114
+
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (
+        1,
+        "create_top_trends",
+        """
+        CREATE TABLE IF NOT EXISTS top_trends (
+            id SERIAL PRIMARY KEY,
+            prompt TEXT,
+            thumbnail_url TEXT,
+            code TEXT UNIQUE,
+            tag TEXT,
+            isposted BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """,
+    ),
+    (
+        2,
+        "top_trends_claim_lease",
+        """
+        ALTER TABLE top_trends ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+        ALTER TABLE top_trends ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+        """,
+    ),
+    (
+        3,
+        "top_trends_unposted_indexes",
+        # Índices parciais: só cobrem a fila (itens não postados), então ficam
+        # pequenos mesmo com o histórico crescendo a cada preseed
+        """
+        CREATE INDEX IF NOT EXISTS idx_top_trends_unposted_tag_created
+            ON top_trends (tag, created_at DESC) WHERE NOT isposted;
+        CREATE INDEX IF NOT EXISTS idx_top_trends_unposted_created
+            ON top_trends (created_at DESC) WHERE NOT isposted;
+        """,
+    ),
+    (
+        4,
+        "top_trends_archive",
+        """
+        CREATE TABLE IF NOT EXISTS top_trends_archive (
+            id INTEGER PRIMARY KEY,
+            prompt TEXT,
+            thumbnail_url TEXT,
+            code TEXT UNIQUE,
+            tag TEXT,
+            isposted BOOLEAN,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT NOW()
+        );
+        """,
+    ),
+    (
+        5,
+        "collect_state",
+        # Estado da coleta incremental por hashtag/usuário: códigos do topo da
+        # última coleta e cursor para retomar uma lacuna não coberta
+        """
+        CREATE TABLE IF NOT EXISTS collect_state (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            last_codes TEXT[] NOT NULL DEFAULT '{}',
+            cursor TEXT,
+            cursor_host TEXT,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (kind, key)
+        );
+        """,
+    ),
+]
+
+
+def applied_versions(conn) -> List[int]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+        return [row[0] for row in cur.fetchall()]
+
+
+def apply_migrations(conn) -> List[int]:
+    """Aplica as migrações pendentes e retorna as versões aplicadas agora."""
+    applied_now: List[int] = []
+    # Lock antes de qualquer DDL: réplicas iniciando juntas não disputam o CREATE TABLE
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                )
+                """
+            )
+        done = set(applied_versions(conn))
+        for version, name, sql in MIGRATIONS:
+            if version in done:
+                continue
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+            applied_now.append(version)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+    return applied_now
@@ -0,0 +1,214 @@
+"""
+Pool de conexões Postgres compartilhado pelo processo.
+
+Cada `Database(dsn)` usa o pool do seu DSN em vez de abrir uma conexão nova
+(e um handshake TLS novo com o Postgres do Railway) a cada construção. O
+pool mantém entre `min_size` e `max_size` conexões, descarta conexões ociosas
+além do mínimo após `max_idle` segundos e valida (`SELECT 1`) conexões que
+ficaram paradas mais de `check_after` segundos antes de entregá-las.
+
+Configuração por ambiente: DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+DB_POOL_MAX_IDLE e DB_POOL_TIMEOUT.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import psycopg
+
+
+class PoolTimeout(RuntimeError):
+    """Nenhuma conexão ficou disponível dentro do tempo limite."""
+
+
+class ConnectionPool:
+    """Pool thread-safe de conexões psycopg (autocommit) no estilo do psycopg_pool."""
+
+    def __init__(
+        self,
+        conninfo: str,
+        min_size: int = 1,
+        max_size: int = 5,
+        max_idle: float = 300.0,
+        timeout: float = 30.0,
+        check_after: float = 30.0,
+        configure: Callable[[Any], None] | None = None,
+        connect: Callable[[str], Any] | None = None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Tamanhos de pool inválidos: min={min_size}, max={max_size}")
+        self.conninfo = conninfo
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.check_after = check_after
+        self._configure = configure
+        self._connect_func = connect or (lambda dsn: psycopg.connect(dsn, autocommit=True))
+        # Conexões livres com o instante em que voltaram ao pool
+        self._idle: List[Tuple[Any, float]] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {"connections_created": 0, "connections_discarded": 0, "requests": 0, "waits": 0}
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        """Abre uma conexão para um espaço já reservado em `_size`."""
+        try:
+            conn = self._connect_func(self.conninfo)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["connections_created"] += 1
+        if self._configure is not None:
+            try:
+                self._configure(conn)
+            except Exception:
+                self._discard(conn)
+                raise
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.stats["connections_discarded"] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if getattr(conn, "closed", False):
+            return False
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _prune_idle(self):
+        """Fecha conexões ociosas além do mínimo (chamar com o lock adquirido)."""
+        now = time.monotonic()
+        expired = []
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle:
+            expired.append(self._idle.pop(0)[0])
+        return expired
+
+    def getconn(self, timeout: float | None = None):
+        """Retira uma conexão saudável do pool, abrindo uma nova se houver espaço."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            self.stats["requests"] += 1
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Pool de conexões fechado")
+                expired = self._prune_idle()
+                candidate = None
+                create = False
+                if self._idle:
+                    # LIFO: a conexão mais recente tem menor chance de ter caído
+                    candidate = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1  # reserva o espaço antes de conectar fora do lock
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"Nenhuma conexão disponível em {self.timeout}s (max_size={self.max_size})")
+                    self.stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+            for conn in expired:
+                self._discard(conn)
+            if create:
+                return self._new_connection()
+            conn, idle_since = candidate
+            if self._is_healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn):
+        """Devolve a conexão ao pool; conexões quebradas ou em transação são descartadas."""
+        broken = getattr(conn, "closed", False)
+        if not broken:
+            status = getattr(getattr(conn, "info", None), "transaction_status", None)
+            broken = status is not None and status != psycopg.pq.TransactionStatus.IDLE
+        with self._cond:
+            if not broken and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator[Any]:
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self.stats, pool_size=self._size, pool_available=len(self._idle))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str, configure: Callable[[Any], None] | None = None) -> ConnectionPool:
+    """
+    Pool do processo para o DSN, criado na primeira chamada.
+
+    `configure` roda uma única vez, na primeira conexão do pool (ex.: DDL do schema).
+    """
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            setup_done = threading.Event()
+
+            def configure_once(conn):
+                if configure is not None and not setup_done.is_set():
+                    configure(conn)
+                    setup_done.set()
+
+            pool = ConnectionPool(
+                dsn,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "5")),
+                max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                configure=configure_once,
+            )
+            _pools[dsn] = pool
+        return pool
+
+
+def close_pools():
+    """Fecha todos os pools do processo (fim do agente)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,220 @@
+"""
+Placar de saúde dos hosts da RapidAPI.
+
+Para cada host guarda as últimas chamadas (sucesso e latência), o instante do
+último 429 e um circuit breaker: após `failure_threshold` falhas seguidas o
+host fica fora da rotação por `open_seconds`; depois disso volta em prova
+(half-open): o primeiro sucesso fecha o circuito e a primeira falha o reabre.
+
+`order(hosts)` devolve os hosts disponíveis do mais saudável para o menos
+saudável, e o placar é persistido em JSON entre execuções.
+
+Configuração por ambiente: HOST_HEALTH_PATH, HOST_CIRCUIT_FAILURES (padrão 5)
+e HOST_CIRCUIT_OPEN_SECONDS (padrão 900).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Penalidade no score de um host que devolveu 429 recentemente
+RATE_LIMIT_PENALTY = 0.5
+RATE_LIMIT_WINDOW = 300.0
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class HostHealth:
+    """Amostras recentes e estado do circuito de um host."""
+
+    def __init__(self, window: int = 50):
+        self.samples: deque = deque(maxlen=window)  # (sucesso, latência em s)
+        self.last_429: float | None = None
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at: float | None = None
+
+    @property
+    def success_rate(self) -> float:
+        if not self.samples:
+            return 1.0
+        return sum(1 for ok, _ in self.samples if ok) / len(self.samples)
+
+    def latency(self, fraction: float) -> float:
+        latencies = [lat for ok, lat in self.samples if ok]
+        return _percentile(latencies, fraction) if latencies else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": [list(s) for s in self.samples],
+            "last_429": self.last_429,
+            "consecutive_failures": self.consecutive_failures,
+            "state": self.state,
+            "opened_at": self.opened_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], window: int) -> "HostHealth":
+        health = cls(window)
+        health.samples.extend((bool(ok), float(lat)) for ok, lat in data.get("samples", []))
+        health.last_429 = data.get("last_429")
+        health.consecutive_failures = int(data.get("consecutive_failures", 0))
+        # Half-open volta a aberto; o prazo continua contando de opened_at
+        health.state = OPEN if data.get("state") in (OPEN, HALF_OPEN) else CLOSED
+        health.opened_at = data.get("opened_at")
+        return health
+
+
+class HostScoreboard:
+    """Placar thread-safe de saúde por host, com circuit breaker e persistência em JSON."""
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        window: int = 50,
+        failure_threshold: int = 5,
+        open_seconds: float = 900.0,
+        clock=time.time,
+    ):
+        self.path = Path(path) if path else None
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._hosts: Dict[str, HostHealth] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _health(self, host: str) -> HostHealth:
+        health = self._hosts.get(host)
+        if health is None:
+            health = self._hosts[host] = HostHealth(self.window)
+        return health
+
+    def record(self, host: str, ok: bool, latency: float, status: int | None = None):
+        """Registra o resultado de uma chamada ao host."""
+        now = self._clock()
+        with self._lock:
+            health = self._health(host)
+            health.samples.append((ok, latency))
+            if status == 429:
+                health.last_429 = now
+            if ok:
+                health.consecutive_failures = 0
+                health.state = CLOSED
+                health.opened_at = None
+            else:
+                health.consecutive_failures += 1
+                if health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                    health.state = OPEN
+                    health.opened_at = now
+
+    def is_available(self, host: str) -> bool:
+        """True se o host pode receber chamadas agora (circuito fechado ou em prova)."""
+        with self._lock:
+            return self._available(self._health(host), self._clock())
+
+    def _available(self, health: HostHealth, now: float) -> bool:
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and now - (health.opened_at or 0) >= self.open_seconds:
+            health.state = HALF_OPEN
+        return health.state == HALF_OPEN
+
+    def _score(self, health: HostHealth, now: float) -> float:
+        score = health.success_rate
+        if health.last_429 and now - health.last_429 < RATE_LIMIT_WINDOW:
+            score -= RATE_LIMIT_PENALTY
+        return score
+
+    def order(self, hosts: List[str]) -> List[str]:
+        """
+        Hosts com circuito disponível, do mais saudável ao menos saudável
+        (taxa de sucesso, 429 recente e latência p50; empate mantém a ordem
+        configurada). Se todos estiverem abertos, devolve o aberto há mais
+        tempo, para não deixar a coleta sem nenhuma tentativa.
+        """
+        now = self._clock()
+        with self._lock:
+            available = []
+            for idx, host in enumerate(hosts):
+                health = self._health(host)
+                if self._available(health, now):
+                    # Sem amostras de sucesso a latência é desconhecida: não passa na frente
+                    # de um host já medido; diferenças abaixo de 100ms não mudam a ordem
+                    p50 = round(health.latency(0.5), 1) if health.success_rate and health.samples else float("inf")
+                    available.append((-round(self._score(health, now), 2), p50, idx, host))
+            if available:
+                return [host for *_, host in sorted(available)]
+            if not hosts:
+                return []
+            return [min(hosts, key=lambda h: self._health(h).opened_at or 0)]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Taxa de sucesso, latências p50/p95 (ms), último 429 e estado do circuito por host."""
+        with self._lock:
+            return {
+                host: {
+                    "calls": len(h.samples),
+                    "success_rate": round(h.success_rate, 3),
+                    "p50_ms": round(1000 * h.latency(0.5), 1),
+                    "p95_ms": round(1000 * h.latency(0.95), 1),
+                    "last_429": h.last_429,
+                    "circuit": h.state,
+                }
+                for host, h in self._hosts.items()
+            }
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._hosts = {host: HostHealth.from_dict(h, self.window) for host, h in data.items()}
+        except Exception:
+            self._hosts = {}
+
+    def save(self):
+        """Grava o placar (escrita atômica via arquivo temporário)."""
+        if self.path is None:
+            return
+        with self._lock:
+            data = {host: h.to_dict() for host, h in self._hosts.items()}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+
+_scoreboard: HostScoreboard | None = None
+_scoreboard_lock = threading.Lock()
+
+
+def get_host_scoreboard() -> HostScoreboard:
+    """Placar global, carregado sob demanda a partir do ambiente."""
+    global _scoreboard
+    with _scoreboard_lock:
+        if _scoreboard is None:
+            project_root = Path(__file__).resolve().parents[2]  # raiz do projeto
+            _scoreboard = HostScoreboard(
+                os.getenv("HOST_HEALTH_PATH") or project_root / "cache" / "host_health.json",
+                failure_threshold=int(os.getenv("HOST_CIRCUIT_FAILURES", "5")),
+                open_seconds=float(os.getenv("HOST_CIRCUIT_OPEN_SECONDS", "900")),
+            )
+        return _scoreboard
@@ -0,0 +1,259 @@
+"""
+Camada de transporte HTTP compartilhada pelos clientes de API.
+
+Todos os clientes (Graph API, Replicate, Supabase, RapidAPI, Telegram e
+hospedagens públicas) fazem suas chamadas por um `HttpTransport`, que mantém
+pools de conexões keep-alive por host (evitando um handshake TLS a cada
+chamada), aplica timeouts/retries padrão e registra métricas por host.
+
+Com `http2=True` e o pacote `h2` instalado, as chamadas usam o httpx com
+HTTP/2; caso contrário, `requests.Session` com HTTP/1.1 keep-alive. Em ambos
+os casos o retorno expõe a interface de `requests.Response` usada pelos
+clientes (`ok`, `status_code`, `headers`, `content`, `text`, `json()`,
+`raise_for_status()`, `iter_content()`).
+
+Configuração por ambiente (transporte global):
+- HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT: timeouts padrão em segundos
+- HTTP_MAX_RETRIES: novas tentativas em falhas de conexão (métodos idempotentes)
+- HTTP_POOL_SIZE: conexões mantidas por host
+- HTTP2: "1" para habilitar HTTP/2 quando disponível
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    import h2  # noqa: F401 - HTTP/2 no httpx depende do pacote h2
+except ImportError:
+    httpx = None
+
+HTTP2_AVAILABLE = httpx is not None
+
+Timeout = float | Tuple[float, float]
+
+
+class HostMetrics:
+    """Contadores de chamadas de um host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.statuses: Dict[int, int] = {}
+
+    def record(self, elapsed: float, status: int | None):
+        self.requests += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        if status is None:
+            self.errors += 1
+        else:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status >= 500:
+                self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(1000 * self.total_seconds / self.requests, 1) if self.requests else 0.0,
+            "max_ms": round(1000 * self.max_seconds, 1),
+            "statuses": dict(self.statuses),
+        }
+
+
+class _HttpxResponse:
+    """Adapta `httpx.Response` à interface de `requests.Response` usada pelos clientes."""
+
+    def __init__(self, response: "httpx.Response"):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        # Respostas com stream=True só são lidas quando o corpo é pedido, como no requests
+        return self._response.read()
+
+    @property
+    def text(self) -> str:
+        self._response.read()
+        return self._response.text
+
+    def json(self, **kwargs) -> Any:
+        self._response.read()
+        return self._response.json(**kwargs)
+
+    def iter_content(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        """Corpo em blocos: lido da rede aos poucos se a chamada usou stream=True."""
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} {self.reason} for url: {self.url}", response=self)
+
+    def close(self):
+        self._response.close()
+
+
+class HttpTransport:
+    """Sessão HTTP com pools keep-alive por host, timeouts/retries padrão e métricas."""
+
+    def __init__(
+        self,
+        timeout: Timeout = (5.0, 30.0),
+        max_retries: int = 2,
+        backoff_factor: float = 0.3,
+        retry_statuses: Iterable[int] = (),
+        pool_size: int = 10,
+        http2: bool = False,
+    ):
+        self.timeout = timeout
+        self.http2 = bool(http2 and HTTP2_AVAILABLE)
+        # Retries automáticos só em métodos idempotentes: um POST repetido pode
+        # duplicar mídia/predições. Status HTTP não são re-tentados por padrão,
+        # pois os clientes já têm seu próprio backoff (ex.: RapidAPI).
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries if retry_statuses else 0,
+            status_forcelist=tuple(retry_statuses),
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._httpx_client = None
+        if self.http2:
+            limits = httpx.Limits(max_connections=pool_size * 4, max_keepalive_connections=pool_size)
+            self._httpx_client = httpx.Client(
+                transport=httpx.HTTPTransport(http2=True, limits=limits, retries=max_retries),
+            )
+        self._metrics: Dict[str, HostMetrics] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "HttpTransport":
+        return cls(
+            timeout=(float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")), float(os.getenv("HTTP_READ_TIMEOUT", "30"))),
+            max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2")),
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+            http2=os.getenv("HTTP2", "").lower() in ("1", "true", "yes"),
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Executa a chamada pelo pool do host; `timeout` padrão quando omitido."""
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        started = time.perf_counter()
+        status = None
+        try:
+            if self._httpx_client is not None:
+                response = self._httpx_request(method, url, **kwargs)
+            else:
+                response = self._session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self._record(host, time.perf_counter() - started, status)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def _httpx_request(self, method: str, url: str, **kwargs) -> _HttpxResponse:
+        timeout = kwargs.pop("timeout")
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        data = kwargs.pop("data", None)
+        if isinstance(data, (bytes, str)):
+            kwargs["content"] = data
+        elif data is not None:
+            kwargs["data"] = data
+        stream = kwargs.pop("stream", False)
+        follow_redirects = kwargs.pop("allow_redirects", True)
+        try:
+            request = self._httpx_client.build_request(method, url, timeout=timeout, **kwargs)
+            # Com stream=True o corpo fica na conexão até ser consumido (iter_content) ou fechado
+            response = self._httpx_client.send(request, stream=stream, follow_redirects=follow_redirects)
+            return _HttpxResponse(response)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def _record(self, host: str, elapsed: float, status: int | None):
+        with self._lock:
+            metrics = self._metrics.get(host)
+            if metrics is None:
+                metrics = self._metrics[host] = HostMetrics()
+            metrics.record(elapsed, status)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot das métricas por host."""
+        with self._lock:
+            return {host: m.to_dict() for host, m in self._metrics.items()}
+
+    def reset_metrics(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def close(self):
+        self._session.close()
+        if self._httpx_client is not None:
+            self._httpx_client.close()
+
+
+_transport: HttpTransport | None = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Transporte global, criado sob demanda a partir do ambiente."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport.from_env()
+        return _transport
+
+
+def configure_transport(**kwargs) -> HttpTransport:
+    """Substitui o transporte global (fecha o anterior). Aceita os argumentos de `HttpTransport`."""
+    global _transport
+    with _transport_lock:
+        previous, _transport = _transport, HttpTransport(**kwargs)
+    if previous is not None:
+        previous.close()
+    return _transport
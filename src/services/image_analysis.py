@@ -0,0 +1,142 @@
+"""
+Análise compartilhada de imagens para o processamento de Stories.
+
+Calcula uma única vez, por conteúdo de imagem, os dados usados nas decisões de
+posicionamento de texto e de fundo (array reduzido, tons de cinza, estatísticas
+por faixa, máscara de pele e paleta dominante) e os reaproveita entre chamadas,
+tentativas e variantes de fundo da mesma imagem.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+import numpy as np
+from PIL import Image
+
+
+# Resolução usada nas análises de posicionamento de texto (1/4 do Stories)
+ANALYSIS_SIZE = (270, 480)
+
+
+def image_content_hash(image: Image.Image) -> str:
+    """Gera a chave de conteúdo (sha1 dos pixels, modo e dimensões) de uma imagem."""
+    digest = hashlib.sha1()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}|".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def skin_tone_mask(rgb_array: np.ndarray) -> np.ndarray:
+    """Retorna a máscara booleana de pixels com tons de pele típicos."""
+    channels = rgb_array[..., :3].astype(np.int16)
+    r, g, b = channels[..., 0], channels[..., 1], channels[..., 2]
+    return (
+        (r > 95) & (g > 40) & (b > 20) &
+        (channels.max(axis=2) - channels.min(axis=2) > 15) &
+        (np.abs(r - g) > 15) & (r > g) & (r > b)
+    )
+
+
+class ImageAnalysis:
+    """
+    Resultado da análise de uma imagem, com valores derivados calculados
+    sob demanda e memorizados.
+    """
+
+    def __init__(self, image: Image.Image, key: str | None = None):
+        self.key = key or image_content_hash(image)
+        self.image = image if image.mode == 'RGB' else image.convert('RGB')
+        self.array = np.array(self.image.resize(ANALYSIS_SIZE))
+        self.gray = np.mean(self.array, axis=2)
+        self._memo: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, name: Hashable, compute: Callable[[], Any]) -> Any:
+        """Retorna o valor memorizado para `name`, calculando-o na primeira vez."""
+        with self._lock:
+            if name in self._memo:
+                return self._memo[name]
+        value = compute()
+        with self._lock:
+            return self._memo.setdefault(name, value)
+
+    @property
+    def skin_per_row(self) -> np.ndarray:
+        """Quantidade de pixels com tom de pele em cada linha do array reduzido."""
+        return self.cached('skin_per_row', lambda: skin_tone_mask(self.array).sum(axis=1))
+
+    def band_stats(self, start: int, end: int) -> Dict[str, float]:
+        """
+        Estatísticas de uma faixa horizontal [start, end) do array reduzido:
+        variância RGB, variância/média de cinza e densidade de bordas (gradiente).
+        """
+        def compute():
+            section = self.array[start:end]
+            gray_section = self.gray[start:end]
+            edges = np.abs(np.gradient(gray_section)).sum()
+            return {
+                'variance': float(np.var(section)),
+                'gray_variance': float(np.var(gray_section)),
+                'gray_mean': float(np.mean(gray_section)),
+                'edge_density': float(edges / gray_section.size),
+            }
+        return self.cached(('band', start, end), compute)
+
+    def band_unique_colors(self, start: int, end: int) -> int:
+        """Quantidade de cores distintas na faixa [start, end)."""
+        def compute():
+            section_flat = np.ascontiguousarray(self.array[start:end]).reshape(-1, 3)
+            return len(np.unique(section_flat.view(np.dtype((np.void, section_flat.dtype.itemsize * 3)))))
+        return self.cached(('unique_colors', start, end), compute)
+
+    def dominant_colors(self, num_colors: int, extractor: Callable[[Image.Image, int], list]) -> list:
+        """Paleta dominante com `num_colors` cores, extraída uma única vez."""
+        return self.cached(('palette', num_colors), lambda: list(extractor(self.image, num_colors)))
+
+
+class ImageAnalysisCache:
+    """
+    Cache LRU de análises em memória, compartilhado pelo processo e
+    indexado pelo hash de conteúdo da imagem.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ImageAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image: Image.Image) -> ImageAnalysis:
+        key = image_content_hash(image)
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return analysis
+            self.misses += 1
+        analysis = ImageAnalysis(image, key=key)
+        with self._lock:
+            self._entries[key] = analysis
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return analysis
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Instância global para uso em todo o sistema
+image_analysis_cache = ImageAnalysisCache()
+
+
+def get_image_analysis(image: Image.Image) -> ImageAnalysis:
+    """Retorna a análise compartilhada para a imagem (calculada uma única vez)."""
+    return image_analysis_cache.get(image)
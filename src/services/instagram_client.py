@@ -1,58 +1,106 @@
-import time
 import requests
-from typing import Optional
+
+from .adaptive_poller import AdaptivePoller
+from .http_transport import HttpTransport, get_transport
+from .provider_limits import GRAPH_API, provider_slot
 
 
 class InstagramClient:
     # Publicação via Instagram Graph API é feita no domínio do Facebook Graph
     BASE = "https://graph.facebook.com/v20.0"
 
-    def __init__(self, business_account_id: str, access_token: str):
+    def __init__(self, business_account_id: str, access_token: str, transport: HttpTransport | None = None):
         self.business_account_id = business_account_id
         self.access_token = access_token
+        self.http = transport or get_transport()
 
-    def prepare_media(self, image_url: str, caption: str) -> str:
-        url = f"{self.BASE}/{self.business_account_id}/media"
-        params = {"image_url": image_url, "caption": caption, "access_token": self.access_token}
-        resp = requests.post(url, params=params, timeout=30)
-        if not resp.ok:
-            try:
-                err = resp.json()
-            except Exception:
-                err = resp.text
-            raise RuntimeError(f"prepare_media failed: HTTP {resp.status_code} -> {err}")
-        data = resp.json()
-        if "id" not in data:
-            raise RuntimeError(f"Failed to prepare media: {data}")
-        return data["id"]
+    def _request(self, method: str, url: str, params: dict) -> requests.Response:
+        """Chamada à Graph API respeitando o limite de concorrência do provedor."""
+        with provider_slot(GRAPH_API):
+            return self.http.request(method, url, params=params, timeout=30)
 
-    def poll_media_status(self, media_id: str, interval_sec: int = 5, max_checks: int = 24) -> str:
+    def _poller(self, interval_sec: float, max_checks: int) -> AdaptivePoller:
+        """Poller adaptativo: `interval_sec` vira o intervalo máximo e o prazo total
+        é o mesmo do polling fixo (`interval_sec * max_checks`)."""
+        return AdaptivePoller(max_interval=interval_sec, deadline=interval_sec * max_checks)
+
+    def _poll_container_status(self, media_id: str, interval_sec: float, max_checks: int, phase: str) -> str:
         url = f"{self.BASE}/{media_id}"
         params = {"fields": "status_code,status", "access_token": self.access_token}
         status = ""
-        for _ in range(max_checks):
-            resp = requests.get(url, params=params, timeout=30)
+
+        def check():
+            nonlocal status
+            resp = self._request("GET", url, params)
             if not resp.ok:
                 try:
                     err = resp.json()
                 except Exception:
                     err = resp.text
-                raise RuntimeError(f"poll_media_status failed: HTTP {resp.status_code} -> {err}")
+                raise RuntimeError(f"{phase} failed: HTTP {resp.status_code} -> {err}")
             data = resp.json()
             status = data.get("status_code", "")
             if status == "ERROR":
                 # Retornar erro com mais contexto se disponível
                 status_text = data.get("status", "ERROR")
                 return f"ERROR:{status_text}"
-            if status in ("FINISHED", "ERROR"):
-                break
-            time.sleep(interval_sec)
-        return status
+            if status == "FINISHED":
+                return status
+            return None
+
+        result = self._poller(interval_sec, max_checks).poll(check, phase=phase)
+        return result if result is not None else status
+
+    def _poll_published(self, media_id: str, fields: str, published_field: str,
+                        interval_sec: float, max_checks: int, phase: str) -> str:
+        url = f"{self.BASE}/{media_id}"
+        params = {"fields": fields, "access_token": self.access_token}
+        last_err = None
+
+        def check():
+            nonlocal last_err
+            resp = self._request("GET", url, params)
+            if resp.ok:
+                data = resp.json()
+                if data.get(published_field):
+                    return "PUBLISHED"
+                # Se ainda não estiver disponível, aguardar
+            else:
+                try:
+                    err = resp.json()
+                except Exception:
+                    err = resp.text
+                last_err = f"{phase} failed: HTTP {resp.status_code} -> {err}"
+            return None
+
+        if self._poller(interval_sec, max_checks).poll(check, phase=phase):
+            return "PUBLISHED"
+        if last_err:
+            raise RuntimeError(last_err)
+        return "PENDING"
+
+    def prepare_media(self, image_url: str, caption: str) -> str:
+        url = f"{self.BASE}/{self.business_account_id}/media"
+        params = {"image_url": image_url, "caption": caption, "access_token": self.access_token}
+        resp = self._request("POST", url, params)
+        if not resp.ok:
+            try:
+                err = resp.json()
+            except Exception:
+                err = resp.text
+            raise RuntimeError(f"prepare_media failed: HTTP {resp.status_code} -> {err}")
+        data = resp.json()
+        if "id" not in data:
+            raise RuntimeError(f"Failed to prepare media: {data}")
+        return data["id"]
+
+    def poll_media_status(self, media_id: str, interval_sec: int = 5, max_checks: int = 24) -> str:
+        return self._poll_container_status(media_id, interval_sec, max_checks, "poll_media_status")
 
     def publish_media(self, creation_id: str) -> str:
         url = f"{self.BASE}/{self.business_account_id}/media_publish"
         params = {"creation_id": creation_id, "access_token": self.access_token}
-        resp = requests.post(url, params=params, timeout=30)
+        resp = self._request("POST", url, params)
         if not resp.ok:
             try:
                 err = resp.json()
@@ -65,27 +113,10 @@ class InstagramClient:
         return data["id"]
 
     def poll_published_status(self, media_id: str, interval_sec: int = 5, max_checks: int = 24) -> str:
-        url = f"{self.BASE}/{media_id}"
         # Em mídia publicada, o campo status_code não existe; verificar permalink
-        params = {"fields": "id,permalink", "access_token": self.access_token}
-        last_err = None
-        for _ in range(max_checks):
-            resp = requests.get(url, params=params, timeout=30)
-            if resp.ok:
-                data = resp.json()
-                if data.get("permalink"):
-                    return "PUBLISHED"
-                # Se ainda não houver permalink, aguardar
-            else:
-                try:
-                    err = resp.json()
-                except Exception:
-                    err = resp.text
-                last_err = f"poll_published_status failed: HTTP {resp.status_code} -> {err}"
-            time.sleep(interval_sec)
-        if last_err:
-            raise RuntimeError(last_err)
-        return "PENDING"
+        return self._poll_published(
+            media_id, "id,permalink", "permalink", interval_sec, max_checks, "poll_published_status"
+        )
     
     # Métodos específicos para Stories
     def prepare_stories_media(self, image_url: str) -> str:
@@ -98,7 +129,7 @@ class InstagramClient:
             "media_type": "STORIES",  # Especifica que é para Stories
             "access_token": self.access_token
         }
-        resp = requests.post(url, params=params, timeout=30)
+        resp = self._request("POST", url, params)
         if not resp.ok:
             try:
                 err = resp.json()
@@ -114,27 +145,7 @@ class InstagramClient:
         """
         Verifica o status da mídia do Stories (similar ao feed, mas específico para Stories)
         """
-        url = f"{self.BASE}/{media_id}"
-        params = {"fields": "status_code,status", "access_token": self.access_token}
-        status = ""
-        for _ in range(max_checks):
-            resp = requests.get(url, params=params, timeout=30)
-            if not resp.ok:
-                try:
-                    err = resp.json()
-                except Exception:
-                    err = resp.text
-                raise RuntimeError(f"poll_stories_media_status failed: HTTP {resp.status_code} -> {err}")
-            data = resp.json()
-            status = data.get("status_code", "")
-            if status == "ERROR":
-                # Retornar erro com mais contexto se disponível
-                status_text = data.get("status", "ERROR")
-                return f"ERROR:{status_text}"
-            if status in ("FINISHED", "ERROR"):
-                break
-            time.sleep(interval_sec)
-        return status
+        return self._poll_container_status(media_id, interval_sec, max_checks, "poll_stories_media_status")
     
     def publish_stories_media(self, creation_id: str) -> str:
         """
@@ -142,7 +153,7 @@ class InstagramClient:
         """
         url = f"{self.BASE}/{self.business_account_id}/media_publish"
         params = {"creation_id": creation_id, "access_token": self.access_token}
-        resp = requests.post(url, params=params, timeout=30)
+        resp = self._request("POST", url, params)
         if not resp.ok:
             try:
                 err = resp.json()
@@ -158,27 +169,10 @@ class InstagramClient:
         """
         Verifica o status da publicação do Stories
         """
-        url = f"{self.BASE}/{media_id}"
         # Para Stories, verificar se o ID existe e está acessível
-        params = {"fields": "id", "access_token": self.access_token}
-        last_err = None
-        for _ in range(max_checks):
-            resp = requests.get(url, params=params, timeout=30)
-            if resp.ok:
-                data = resp.json()
-                if data.get("id"):
-                    return "PUBLISHED"
-                # Se ainda não houver ID, aguardar
-            else:
-                try:
-                    err = resp.json()
-                except Exception:
-                    err = resp.text
-                last_err = f"poll_stories_published_status failed: HTTP {resp.status_code} -> {err}"
-            time.sleep(interval_sec)
-        if last_err:
-            raise RuntimeError(last_err)
-        return "PENDING"
+        return self._poll_published(
+            media_id, "id", "id", interval_sec, max_checks, "poll_stories_published_status"
+        )
     
     def publish_to_stories_complete(self, image_url: str) -> dict:
         """
@@ -0,0 +1,173 @@
+"""
+Codificação JPEG com orçamento de bytes para os uploads do Instagram.
+
+Em vez de uma qualidade fixa, `JpegEncoder.encode` procura (busca binária) a
+maior qualidade cujo resultado cabe no orçamento, com JPEG progressivo e
+subamostragem de croma configuráveis. A qualidade escolhida fica memorizada
+por classe de imagem ("feed", "stories"...) e é o primeiro palpite da próxima
+codificação da mesma classe, que em geral termina em uma ou duas tentativas.
+Cada resultado informa tempo de codificação e tamanho.
+
+Configuração por ambiente: JPEG_TARGET_KB (padrão 900), JPEG_MIN_QUALITY
+(padrão 60), JPEG_MAX_QUALITY (padrão 92), JPEG_PROGRESSIVE (padrão ligado)
+e JPEG_SUBSAMPLING ("4:2:0", "4:2:2" ou "4:4:4"; padrão "4:2:0").
+"""
+
+import io
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from PIL import Image
+
+# Um resultado acima desta fração do orçamento é aceito sem tentar qualidades maiores
+GOOD_ENOUGH = 0.9
+
+
+class EncodeResult:
+    """JPEG gerado e os parâmetros, tamanho e tempo da codificação."""
+
+    def __init__(self, data: bytes, quality: int, progressive: bool, subsampling: str,
+                 target_bytes: int, encode_ms: float, probes: int):
+        self.data = data
+        self.quality = quality
+        self.progressive = progressive
+        self.subsampling = subsampling
+        self.target_bytes = target_bytes
+        self.encode_ms = encode_ms
+        self.probes = probes
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def over_budget(self) -> bool:
+        """True se nem a qualidade mínima coube no orçamento."""
+        return self.size > self.target_bytes
+
+
+class JpegEncoder:
+    """Codificador JPEG com busca de qualidade por orçamento e parâmetros memorizados por classe."""
+
+    def __init__(
+        self,
+        target_bytes: int = 900 * 1024,
+        min_quality: int = 60,
+        max_quality: int = 92,
+        progressive: bool = True,
+        subsampling: str = "4:2:0",
+        clock=time.perf_counter,
+    ):
+        self.target_bytes = target_bytes
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.progressive = progressive
+        self.subsampling = subsampling
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._quality: Dict[str, int] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _encode_once(self, image: Image.Image, quality: int, progressive: bool, subsampling: str) -> bytes:
+        buffer = io.BytesIO()
+        try:
+            image.save(buffer, "JPEG", quality=quality, optimize=True,
+                       progressive=progressive, subsampling=subsampling)
+        except OSError:
+            # Com `optimize` o Pillow reserva ~1 byte por pixel; saídas maiores que isso
+            # (ruído em qualidade alta, 4:4:4) falham e saem com as tabelas de Huffman padrão
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality, progressive=progressive, subsampling=subsampling)
+        return buffer.getvalue()
+
+    def encode(
+        self,
+        image: Image.Image,
+        image_class: str = "default",
+        target_bytes: int | None = None,
+        progressive: bool | None = None,
+        subsampling: str | None = None,
+    ) -> EncodeResult:
+        """
+        Codifica com a maior qualidade (entre os limites) que cabe em `target_bytes`.
+        Se nem a qualidade mínima couber, devolve a codificação na qualidade mínima.
+        """
+        target = target_bytes or self.target_bytes
+        progressive = self.progressive if progressive is None else progressive
+        subsampling = subsampling or self.subsampling
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        started = self._clock()
+        with self._lock:
+            guess = self._quality.get(image_class, self.max_quality)
+        lo, hi = self.min_quality, self.max_quality
+        quality = min(max(guess, lo), hi)
+        best: tuple[int, bytes] | None = None
+        smallest: tuple[int, bytes] | None = None
+        probes = 0
+        while lo <= hi:
+            data = self._encode_once(image, quality, progressive, subsampling)
+            probes += 1
+            if len(data) <= target:
+                best = (quality, data)
+                if len(data) >= GOOD_ENOUGH * target:
+                    break
+                lo = quality + 1
+            else:
+                smallest = (quality, data)
+                hi = quality - 1
+            quality = (lo + hi) // 2
+        if best is None:
+            if smallest is None or smallest[0] != self.min_quality:
+                smallest = (self.min_quality, self._encode_once(image, self.min_quality, progressive, subsampling))
+                probes += 1
+            best = smallest
+        elapsed_ms = 1000 * (self._clock() - started)
+
+        result = EncodeResult(best[1], best[0], progressive, subsampling, target, elapsed_ms, probes)
+        with self._lock:
+            self._quality[image_class] = result.quality
+            st = self._stats.setdefault(image_class, {"images": 0, "encode_ms": 0.0, "bytes": 0, "probes": 0, "over_budget": 0})
+            st["images"] += 1
+            st["encode_ms"] += elapsed_ms
+            st["bytes"] += result.size
+            st["probes"] += probes
+            st["over_budget"] += int(result.over_budget)
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Por classe: imagens, qualidade atual, tamanho e tempo médios e tentativas por imagem."""
+        with self._lock:
+            return {
+                image_class: {
+                    "images": int(st["images"]),
+                    "quality": self._quality.get(image_class),
+                    "avg_kb": round(st["bytes"] / st["images"] / 1024, 1),
+                    "avg_ms": round(st["encode_ms"] / st["images"], 1),
+                    "probes_per_image": round(st["probes"] / st["images"], 2),
+                    "over_budget": int(st["over_budget"]),
+                }
+                for image_class, st in self._stats.items()
+            }
+
+
+_encoder: JpegEncoder | None = None
+_encoder_lock = threading.Lock()
+
+
+def get_jpeg_encoder() -> JpegEncoder:
+    """Codificador global, configurado sob demanda a partir do ambiente."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = JpegEncoder(
+                target_bytes=int(float(os.getenv("JPEG_TARGET_KB", "900")) * 1024),
+                min_quality=int(os.getenv("JPEG_MIN_QUALITY", "60")),
+                max_quality=int(os.getenv("JPEG_MAX_QUALITY", "92")),
+                progressive=os.getenv("JPEG_PROGRESSIVE", "1").lower() not in ("0", "false", "no"),
+                subsampling=os.getenv("JPEG_SUBSAMPLING", "4:2:0"),
+            )
+        return _encoder
@@ -6,7 +6,6 @@ Envia notificações via Telegram e email sobre métricas importantes
 
 import json
 import smtplib
-import requests
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -14,6 +13,7 @@ from typing import Dict, List, Optional, Any
 from pathlib import Path
 
 from .engagement_monitor import EngagementMonitor
+from .http_transport import HttpTransport, get_transport
 from .performance_tracker import PerformanceTracker
 
 class NotificationManager:
@@ -21,8 +21,9 @@ class NotificationManager:
     Gerencia notificações automáticas sobre performance dos posts
     """
     
-    def __init__(self, config_path: str = "config/notification_config.json"):
+    def __init__(self, config_path: str = "config/notification_config.json", transport: HttpTransport | None = None):
         self.config_path = config_path
+        self.http = transport or get_transport()
         self.config = self._load_config()
         self.engagement_monitor = EngagementMonitor()
         self.performance_tracker = PerformanceTracker()
@@ -106,7 +107,7 @@ class NotificationManager:
                 "parse_mode": "Markdown"
             }
             
-            response = requests.post(url, data=data, timeout=10)
+            response = self.http.post(url, data=data, timeout=10)
             response.raise_for_status()
             
             return True
@@ -2,10 +2,12 @@ from typing import Optional
 import base64
 import os
 import logging
-import requests
 
 from openai import OpenAI
 
+from .blob_cache import get_blob_cache
+from .provider_limits import OPENAI, provider_slot
+
 
 logger = logging.getLogger(__name__)
 
@@ -31,15 +33,22 @@ class OpenAIClient:
             self.client = OpenAI(api_key=key)
             self._disabled_reason = None
 
+    def _chat(self, content) -> str:
+        """Executa uma chamada de chat respeitando o limite de concorrência da OpenAI."""
+        with provider_slot(OPENAI):
+            resp = self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": content}],
+            )
+        return resp.choices[0].message.content
+
     def describe_image(self, image_url: str, custom_prompt: Optional[str] = None) -> str:
         # Tentar enviar a imagem como data URL base64 para evitar bloqueios do CDN
         def to_data_url(url: str) -> str:
             if url.startswith("data:"):
                 return url
-            r = requests.get(url, timeout=30)
-            r.raise_for_status()
-            mime = (r.headers.get("content-type") or "image/jpeg").split(";")[0]
-            b64 = base64.b64encode(r.content).decode("ascii")
+            data, mime = get_blob_cache().fetch(url, timeout=30)
+            b64 = base64.b64encode(data).decode("ascii")
             return f"data:{mime};base64,{b64}"
 
         base_text = (
@@ -76,11 +85,7 @@ class OpenAIClient:
             )
             return f"[OpenAI desativado] {base_fallback}"
 
-        resp = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": content}],
-        )
-        return resp.choices[0].message.content
+        return self._chat(content)
 
     def generate_caption(self, description: str, style: Optional[str] = None) -> str:
         prompt = (
@@ -95,21 +100,13 @@ class OpenAIClient:
                 f"[OpenAI desativado] Legenda baseada na descrição: {description[:120]}..."
                 f"{hashtags_hint}"
             )
-        resp = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return resp.choices[0].message.content
+        return self._chat(prompt)
 
     def generate_caption_with_prompt(self, caption_prompt: str) -> str:
         # Usa o prompt fornecido literalmente (já com placeholders processados upstream)
         if self.client is None:
             return f"[OpenAI desativado] {caption_prompt[:200]}"
-        resp = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": caption_prompt}],
-        )
-        return resp.choices[0].message.content
+        return self._chat(caption_prompt)
 
     def generate_content_from_prompt(self, content_prompt: str) -> str:
         """
@@ -118,8 +115,4 @@ class OpenAIClient:
         """
         if self.client is None:
             return f"[OpenAI desativado] {content_prompt[:200]}"
-        resp = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": content_prompt}],
-        )
-        return resp.choices[0].message.content
\ No newline at end of file
+        return self._chat(content_prompt)
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Limites de concorrência por provedor externo (OpenAI, Replicate, Graph API).
+
+Quando várias contas são processadas em paralelo (multirun --workers), cada
+cliente reserva um slot do seu provedor antes de cada chamada, evitando
+estourar rate limits mesmo com muitos workers ativos. Sem limite configurado
+o slot é um no-op.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Nomes de provedores usados pelos clientes
+OPENAI = "openai"
+REPLICATE = "replicate"
+GRAPH_API = "graph_api"
+
+
+class ProviderLimiter:
+    """Semáforos nomeados, um por provedor, configuráveis em tempo de execução."""
+
+    def __init__(self):
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._limits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, provider: str, max_concurrency: int | None):
+        """Define o máximo de chamadas simultâneas do provedor (None/0 remove o limite)."""
+        with self._lock:
+            if not max_concurrency or max_concurrency <= 0:
+                self._semaphores.pop(provider, None)
+                self._limits.pop(provider, None)
+                return
+            self._semaphores[provider] = threading.BoundedSemaphore(max_concurrency)
+            self._limits[provider] = max_concurrency
+
+    def limits(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._limits)
+
+    @contextmanager
+    def slot(self, provider: str) -> Iterator[None]:
+        """Reserva um slot do provedor durante o bloco."""
+        with self._lock:
+            semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+
+# Instância global para uso em todo o sistema
+provider_limiter = ProviderLimiter()
+
+
+def provider_slot(provider: str):
+    """Atalho para `provider_limiter.slot(provider)`."""
+    return provider_limiter.slot(provider)
@@ -1,4 +1,5 @@
-import requests
+from .blob_cache import BlobCache, get_blob_cache
+from .http_transport import HttpTransport, get_transport
 
 
 class PublicUploader:
@@ -11,6 +12,17 @@ class PublicUploader:
 
     HOST_URL = "https://0x0.st"
 
+    def __init__(self, transport: HttpTransport | None = None, blob_cache: BlobCache | None = None):
+        self.http = transport or get_transport()
+        self._blobs = blob_cache
+
+    @property
+    def blobs(self) -> BlobCache:
+        """Local image cache, resolved on first use."""
+        if self._blobs is None:
+            self._blobs = get_blob_cache()
+        return self._blobs
+
     def _guess_extension(self, content_type: str) -> str:
         ct = (content_type or "").lower()
         if "jpeg" in ct or "jpg" in ct:
@@ -22,58 +34,23 @@ class PublicUploader:
         return "bin"
 
     def upload_from_url(self, source_image_url: str, timeout: int = 30) -> str:
-        # Download image bytes
-        r = requests.get(source_image_url, timeout=timeout)
-        r.raise_for_status()
-        content_type = r.headers.get("Content-Type", "image/jpeg")
-        ext = self._guess_extension(content_type)
-        filename = f"image.{ext}"
-        data = r.content
-
-        # Try 0x0.st first (multipart/form-data)
-        try:
-            files = {"file": (filename, data, content_type)}
-            up = requests.post(self.HOST_URL, files=files, timeout=timeout)
-            up.raise_for_status()
-            url = up.text.strip()
-            if url.startswith("http"):
-                return url
-            raise RuntimeError(f"Unexpected upload response: {url}")
-        except Exception:
-            pass
+        # Download to the local blob cache in chunks (or reuse it), then upload from the open file
+        f, content_type, _ = self.blobs.open(source_image_url, http=self.http, timeout=timeout)
 
-        # Fallback: transfer.sh via PUT
-        try:
-            headers = {"Content-Type": content_type}
-            put = requests.put(f"https://transfer.sh/{filename}", data=data, headers=headers, timeout=timeout)
-            put.raise_for_status()
-            url = put.text.strip()
-            if url.startswith("http"):
-                return url
-            raise RuntimeError(f"Unexpected transfer.sh response: {url}")
-        except Exception:
-            pass
+        def body():
+            f.seek(0)
+            return f
 
-        # Fallback: catbox.moe via fileupload
-        try:
-            files = {"fileToUpload": (filename, data, content_type)}
-            resp = requests.post(
-                "https://catbox.moe/user/api.php",
-                data={"reqtype": "fileupload"},
-                files=files,
-                timeout=timeout,
-            )
-            resp.raise_for_status()
-            url = resp.text.strip()
-            if url.startswith("http"):
-                return url
-            raise RuntimeError(f"Unexpected catbox fileupload response: {url}")
-        except Exception:
-            pass
+        ext = self._guess_extension(content_type)
+        with f:
+            try:
+                return self._upload(body, content_type, f"image.{ext}", timeout)
+            except Exception:
+                pass
 
         # Fallback: catbox.moe via urlupload
         try:
-            resp = requests.post(
+            resp = self.http.post(
                 "https://catbox.moe/user/api.php",
                 data={"reqtype": "urlupload", "url": source_image_url},
                 timeout=timeout,
@@ -102,10 +79,6 @@ class PublicUploader:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
             
-        # Read file content
-        with open(file_path, 'rb') as f:
-            data = f.read()
-            
         # Guess content type from file extension
         ext = os.path.splitext(file_path)[1].lower()
         if ext in ['.jpg', '.jpeg']:
@@ -118,11 +91,52 @@ class PublicUploader:
             content_type = 'application/octet-stream'
             
         filename = os.path.basename(file_path)
+        # The body is read from disk by each attempt instead of being loaded up front
+        return self._upload(lambda: open(file_path, "rb"), content_type, filename, timeout)
 
+    def upload_from_bytes(self, data: bytes, content_type: str = "image/jpeg",
+                          filename: str | None = None, timeout: int = 30) -> str:
+        """
+        Upload in-memory bytes to public hosting (no temporary file).
+        
+        Args:
+            data: File content
+            content_type: MIME type of the content
+            filename: Name sent to the host (defaults to image.<ext>)
+            timeout: Request timeout in seconds
+            
+        Returns:
+            Public HTTPS URL of the uploaded file
+        """
+        if not filename:
+            filename = f"image.{self._guess_extension(content_type)}"
+        return self._upload(lambda: data, content_type, filename, timeout)
+
+    def _upload(self, open_body, content_type: str, filename: str, timeout: int) -> str:
+        """
+        Try each host in turn. `open_body()` returns the body for one attempt
+        (bytes or a binary file, closed afterwards); the transfer.sh PUT streams
+        file bodies from disk, multipart hosts read them whole.
+        """
+        opened = []
+
+        def body():
+            b = open_body()
+            if hasattr(b, "close"):
+                opened.append(b)
+            return b
+
+        try:
+            return self._upload_attempts(body, content_type, filename, timeout)
+        finally:
+            for f in opened:
+                f.close()
+
+    def _upload_attempts(self, body, content_type: str, filename: str, timeout: int) -> str:
         # Try 0x0.st first (multipart/form-data)
         try:
-            files = {"file": (filename, data, content_type)}
-            up = requests.post(self.HOST_URL, files=files, timeout=timeout)
+            files = {"file": (filename, body(), content_type)}
+            up = self.http.post(self.HOST_URL, files=files, timeout=timeout)
             up.raise_for_status()
             url = up.text.strip()
             if url.startswith("http"):
@@ -134,7 +148,7 @@ class PublicUploader:
         # Fallback: transfer.sh via PUT
         try:
             headers = {"Content-Type": content_type}
-            put = requests.put(f"https://transfer.sh/{filename}", data=data, headers=headers, timeout=timeout)
+            put = self.http.put(f"https://transfer.sh/{filename}", data=body(), headers=headers, timeout=timeout)
             put.raise_for_status()
             url = put.text.strip()
             if url.startswith("http"):
@@ -145,8 +159,8 @@ class PublicUploader:
 
         # Fallback: catbox.moe via fileupload
         try:
-            files = {"fileToUpload": (filename, data, content_type)}
-            resp = requests.post(
+            files = {"fileToUpload": (filename, body(), content_type)}
+            resp = self.http.post(
                 "https://catbox.moe/user/api.php",
                 data={"reqtype": "fileupload"},
                 files=files,
@@ -158,4 +172,4 @@ class PublicUploader:
                 return url
             raise RuntimeError(f"Unexpected catbox fileupload response: {url}")
         except Exception as e:
-            raise RuntimeError(f"All upload fallbacks failed: {e}")
\ No newline at end of file
+            raise RuntimeError(f"All upload fallbacks failed: {e}")
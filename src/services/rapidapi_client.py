@@ -1,106 +1,105 @@
-import requests
 import time
 import random
-import os
-import json
-import hashlib
-from pathlib import Path
 from typing import Dict, Any, List, Tuple
 
+from .http_transport import HttpTransport, get_transport
+from .response_cache import ResponseCache, cache_key, get_response_cache
+from .single_flight import SingleFlight
+
+# Chamadas idênticas em voo (mesma URL e parâmetros) viram uma só no processo
+_inflight = SingleFlight()
+
+
+class RapidAPIError(RuntimeError):
+    """Resposta HTTP de erro de um host da RapidAPI, com o status devolvido."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
 
 class RapidAPIClient:
-    def __init__(self, api_key: str, host: str):
+    def __init__(
+        self,
+        api_key: str,
+        host: str,
+        transport: HttpTransport | None = None,
+        cache: ResponseCache | None = None,
+    ):
         self.host = host
+        self.http = transport or get_transport()
         self.headers = {
             "x-rapidapi-host": host,
             "x-rapidapi-key": api_key,
         }
-        self._cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
         self._ttl_seconds = 1800
-        # Cache em disco sob ./cache/rapidapi na raiz do projeto
-        project_root = Path(__file__).resolve().parents[2]  # raiz do projeto
-        self._cache_dir = project_root / "cache" / "rapidapi"
-        try:
-            self._cache_dir.mkdir(parents=True, exist_ok=True)
-        except Exception:
-            pass
-        # Índice persistente para facilitar limpeza e inspeção
-        self._index_path = self._cache_dir / "index.json"
-        self._index: Dict[str, Dict[str, Any]] = {}
-        try:
-            if self._index_path.exists():
-                with open(self._index_path, "r", encoding="utf-8") as f:
-                    self._index = json.load(f)
-        except Exception:
-            self._index = {}
-
-    def _cache_path(self, url: str, params: Dict[str, Any]) -> Path:
-        key_str = url + "|" + ",".join([f"{k}={params[k]}" for k in sorted(params.keys())])
-        digest = hashlib.sha1(key_str.encode("utf-8")).hexdigest()
-        return self._cache_dir / f"{digest}.json"
+        # Cache de respostas compartilhado pelo processo (memória + disco)
+        self.cache = cache or get_response_cache()
+        # False quando a última resposta veio do cache ou de uma chamada coalescida
+        self.from_network = False
+        # Chamadas que este cliente fez de fato à rede (não conta cache nem espera coalescida)
+        self.network_calls = 0
 
     def _get_with_backoff(self, url: str, params: Dict[str, Any], ttl_seconds: int | None = None) -> Dict[str, Any]:
-        key = (url, str(params))
-        now = time.time()
+        key = cache_key(url, params)
         ttl = ttl_seconds or self._ttl_seconds
-        if key in self._cache:
-            ts, data = self._cache[key]
-            if now - ts < ttl:
-                print(f"RapidAPI cache-hit (mem): {url}")
-                return data
-        # Cache em disco
-        disk_path = self._cache_path(url, params)
-        try:
-            if disk_path.exists():
-                ts = disk_path.stat().st_mtime
-                if now - ts < ttl:
-                    print(f"RapidAPI cache-hit (disk): {disk_path.name}")
-                    with open(disk_path, "r", encoding="utf-8") as f:
-                        return json.load(f)
-        except Exception:
-            pass
+        # A consulta ao cache fica dentro do single-flight: quem chega logo após
+        # a chamada em voo terminar encontra a resposta já gravada
+        (data, from_cache), shared = _inflight.do(key, lambda: self._cached_or_fetch(url, params, key, ttl))
+        if shared:
+            print(f"RapidAPI coalescido com chamada em andamento: {url}")
+        self.from_network = not (from_cache or shared)
+        return data
+
+    def _cached_or_fetch(self, url: str, params: Dict[str, Any], key: str, ttl: int) -> Tuple[Dict[str, Any], bool]:
+        """Resposta do cache ou da rede, e se ela veio do cache."""
+        cached = self.cache.get(key)
+        if cached is not None:
+            print(f"RapidAPI cache-hit: {url}")
+            return cached, True
+        # Só quem lidera o single-flight chega aqui
+        self.network_calls += 1
         delay = 0.5
         for attempt in range(3):  # Reduzido de 6 para 3 tentativas
             try:
-                resp = requests.get(url, headers=self.headers, params=params, timeout=2)  # Reduzido de 3 para 2 segundos
-                if resp.status_code in (429, 500, 502, 503, 504):
-                    raise RuntimeError(f"HTTP {resp.status_code}")
-                resp.raise_for_status()
+                resp = self.http.get(url, headers=self.headers, params=params, timeout=2)  # Reduzido de 3 para 2 segundos
+                if resp.status_code >= 400:
+                    raise RapidAPIError(resp.status_code)
                 data = resp.json()
-                self._cache[key] = (time.time(), data)
                 try:
-                    with open(disk_path, "w", encoding="utf-8") as f:
-                        json.dump(data, f, ensure_ascii=False)
-                    # Atualizar índice
-                    entry = {
-                        "url": url,
-                        "params": params,
-                        "path": disk_path.name,
-                        "ts": time.time(),
-                    }
-                    self._index[disk_path.name] = entry
-                    try:
-                        with open(self._index_path, "w", encoding="utf-8") as idxf:
-                            json.dump(self._index, idxf, ensure_ascii=False, indent=2)
-                    except Exception:
-                        pass
+                    self.cache.put(key, url, data, ttl)
                 except Exception:
                     pass
-                return data
+                return data, False
             except Exception as e:
                 if attempt >= 2:  # Ajustado para 3 tentativas (0,1,2)
                     raise e
                 time.sleep(delay + random.uniform(0.1, 0.3))  # Delay muito menor
                 delay = min(delay * 1.5, 3.0)  # Delay máximo de 3 segundos
 
-    def get_top_by_hashtag(self, hashtag: str) -> Dict[str, Any]:
+    @staticmethod
+    def _page_params(params: Dict[str, Any], pagination_token: str | None) -> Dict[str, Any]:
+        return dict(params, pagination_token=pagination_token) if pagination_token else params
+
+    @staticmethod
+    def next_cursor(data: Dict[str, Any]) -> str | None:
+        """Cursor da próxima página (formatos conhecidos dos hosts), ou None na última."""
+        nested = data.get("data") if isinstance(data.get("data"), dict) else {}
+        for source in (data, nested):
+            for name in ("pagination_token", "next_cursor", "end_cursor", "next_max_id"):
+                value = source.get(name)
+                if value:
+                    return str(value)
+        return None
+
+    def get_top_by_hashtag(self, hashtag: str, pagination_token: str | None = None) -> Dict[str, Any]:
         # Suportar diferentes APIs/hosts
         if "api2" in self.host:
             base_url = "https://instagram-scraper-api2.p.rapidapi.com/v1/hashtag"
             # Tentar em ordem: 'top' e depois 'recent' se falhar (403/erro)
             attempts = [
-                {"hashtag": hashtag, "feed_type": "top"},
-                {"hashtag": hashtag, "feed_type": "recent"},
+                self._page_params({"hashtag": hashtag, "feed_type": "top"}, pagination_token),
+                self._page_params({"hashtag": hashtag, "feed_type": "recent"}, pagination_token),
             ]
             last_err = None
             for params in attempts:
@@ -127,6 +126,7 @@ class RapidAPIClient:
                 (f"https://{self.host}/hashtagposts/{hashtag}", {}),
                 (f"https://{self.host}/hashtag/{hashtag}", {}),
             ]
+            candidates = [(url, self._page_params(params, pagination_token)) for url, params in candidates]
             last_err = None
             for url, params in candidates:
                 try:
@@ -178,19 +178,19 @@ class RapidAPIClient:
                 })
         return result
 
-    def get_user_posts(self, username_or_id: str) -> Dict[str, Any]:
+    def get_user_posts(self, username_or_id: str, pagination_token: str | None = None) -> Dict[str, Any]:
         # Suportar hosts alternativos com endpoint userposts
         if "api2" in self.host:
             # api2 não documenta userposts; manter compatibilidade futura se necessário
             base_url = "https://instagram-scraper-api2.p.rapidapi.com/v1/userposts"
-            params = {"username_or_id": username_or_id}
+            params = self._page_params({"username_or_id": username_or_id}, pagination_token)
             # TTL menor para userposts (2h)
             data = self._get_with_backoff(base_url, params, ttl_seconds=7200)
             return data
         else:
             candidates = [
-                (f"https://{self.host}/userposts/", {"username_or_id": username_or_id}),
-                (f"https://{self.host}/userposts", {"username_or_id": username_or_id}),
+                (f"https://{self.host}/userposts/", self._page_params({"username_or_id": username_or_id}, pagination_token)),
+                (f"https://{self.host}/userposts", self._page_params({"username_or_id": username_or_id}, pagination_token)),
             ]
             last_err = None
             for url, params in candidates:
@@ -211,45 +211,19 @@ class RapidAPIClient:
 
     def clear_cache(self, predicate: Dict[str, Any] | None = None) -> int:
         """
-        Limpa arquivos de cache em disco que correspondam ao predicate.
-        predicate pode conter chaves como 'url_contains', 'path', 'older_than_seconds'.
-        Retorna quantidade de arquivos removidos.
+        Limpa entradas do cache que correspondam ao predicate.
+        predicate pode conter chaves como 'url_contains', 'path' (chave da entrada)
+        e 'older_than_seconds'. Retorna quantidade de entradas removidas.
         """
-        removed = 0
+        predicate = predicate or {}
+        path = predicate.get("path")
+        if path and path.endswith(".json"):
+            path = path[:-len(".json")]  # nome de arquivo do cache antigo
         try:
-            index = self._index
-            # Recarregar índice se vazio
-            if not index and self._index_path.exists():
-                with open(self._index_path, "r", encoding="utf-8") as f:
-                    index = json.load(f)
-            for fname, meta in list(index.items()):
-                ok = True
-                if predicate:
-                    url_contains = predicate.get("url_contains")
-                    if url_contains and url_contains not in (meta.get("url") or ""):
-                        ok = False
-                    path_eq = predicate.get("path")
-                    if path_eq and path_eq != fname:
-                        ok = False
-                    older = predicate.get("older_than_seconds")
-                    if older and (time.time() - float(meta.get("ts", 0)) < float(older)):
-                        ok = False
-                if not ok:
-                    continue
-                try:
-                    p = self._cache_dir / fname
-                    if p.exists():
-                        p.unlink()
-                        removed += 1
-                        self._index.pop(fname, None)
-                except Exception:
-                    pass
-            # Persistir índice atualizado
-            try:
-                with open(self._index_path, "w", encoding="utf-8") as idxf:
-                    json.dump(self._index, idxf, ensure_ascii=False, indent=2)
-            except Exception:
-                pass
+            return self.cache.clear(
+                url_contains=predicate.get("url_contains"),
+                key=path,
+                older_than_seconds=predicate.get("older_than_seconds"),
+            )
         except Exception:
-            pass
-        return removed
\ No newline at end of file
+            return 0
@@ -1,8 +1,10 @@
 import os
 import logging
-import requests
 from typing import Dict, Any
 
+from .http_transport import HttpTransport, get_transport
+from .provider_limits import REPLICATE, provider_slot
+
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +14,7 @@ class ReplicateClient:
         "https://api.replicate.com/v1/models/black-forest-labs/flux-schnell/predictions"
     )
 
-    def __init__(self, token: str):
+    def __init__(self, token: str, transport: HttpTransport | None = None):
         """Inicializa cliente Replicate com validação de token.
 
         - Tenta usar `token` fornecido; se vazio, tenta `REPLICATE_TOKEN` do ambiente.
@@ -28,10 +30,16 @@ class ReplicateClient:
             logger.warning(msg)
             raise ValueError(msg)
         self.headers = {"Authorization": f"Bearer {tok}"}
+        self.http = transport or get_transport()
 
     def generate_image(self, prompt: str) -> str:
+        # Uma predição ocupa o slot do Replicate até a URL final estar disponível
+        with provider_slot(REPLICATE):
+            return self._generate_image(prompt)
+
+    def _generate_image(self, prompt: str) -> str:
         payload: Dict[str, Any] = {"input": {"prompt": prompt}}
-        resp = requests.post(self.PREDICT_URL, headers=self.headers, json=payload, timeout=60)
+        resp = self.http.post(self.PREDICT_URL, headers=self.headers, json=payload, timeout=60)
         resp.raise_for_status()
         data = resp.json()
         # Some Replicate models are async; handle both immediate and polling cases
@@ -42,7 +50,7 @@ class ReplicateClient:
         prediction_url = data.get("urls", {}).get("get")
         if prediction_url:
             for _ in range(30):
-                r = requests.get(prediction_url, headers=self.headers, timeout=30)
+                r = self.http.get(prediction_url, headers=self.headers, timeout=30)
                 r.raise_for_status()
                 d = r.json()
                 o = d.get("output")
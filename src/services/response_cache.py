@@ -0,0 +1,299 @@
+"""
+Cache de respostas da RapidAPI compartilhado pelo processo.
+
+Duas camadas:
+- memória: LRU limitado em bytes (JSON serializado), consultado primeiro;
+- disco: SQLite em `cache/rapidapi/responses.sqlite3`, também limitado em
+  bytes, que sobrevive entre execuções e promove entradas para a memória.
+
+Cada entrada expira após seu TTL. Ao gravar, as duas camadas removem
+primeiro entradas expiradas e depois as menos usadas até caberem no
+orçamento. Contadores de acertos/faltas/evicções ficam em `stats()` e são
+acumulados no próprio SQLite (`flush_stats`) para o comando `cache_stats`.
+
+Os arquivos JSON por chave (e o `index.json`) do cache antigo são removidos
+do diretório na criação do cache global (`purge_legacy_files`).
+
+Configuração por ambiente: RAPIDAPI_CACHE_DIR, RAPIDAPI_CACHE_MEMORY_MB
+(padrão 32) e RAPIDAPI_CACHE_DISK_MB (padrão 256).
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+# Arquivos do cache antigo: um JSON por chave (sha1) e o índice
+LEGACY_FILE = re.compile(r"^(?:[0-9a-f]{40}|index)\.json$")
+
+COUNTERS = ("memory_hits", "disk_hits", "misses", "memory_evictions", "disk_evictions", "expired")
+
+
+def cache_key(url: str, params: Dict[str, Any]) -> str:
+    """Chave estável para uma chamada (URL + parâmetros ordenados)."""
+    key_str = url + "|" + ",".join([f"{k}={params[k]}" for k in sorted(params.keys())])
+    return hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache LRU em memória + SQLite em disco, com orçamento em bytes e TTL por entrada."""
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        memory_budget_bytes: int = 32 * 1024 * 1024,
+        disk_budget_bytes: int = 256 * 1024 * 1024,
+        clock=time.time,
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self._clock = clock
+        # chave -> (expira_em, tamanho, dados)
+        self._memory: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._counters = {name: 0 for name in COUNTERS}
+        self._flushed = dict(self._counters)
+        self._lock = threading.Lock()
+        self._closed = False
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = cache_dir / "responses.sqlite3"
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Ocupação do disco mantida em memória: a evicção não soma a tabela a cada gravação
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    # --- leitura/escrita ---
+
+    def get(self, key: str) -> Any | None:
+        """Dados em cache para a chave, ou None (ausente ou expirado)."""
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[2]
+                self._drop_memory(key)
+                self._counters["expired"] += 1
+            row = self._db.execute("SELECT body, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            body, expires_at = row
+            if expires_at <= now:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._disk_bytes -= len(body)
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            data = json.loads(body)
+            self._counters["disk_hits"] += 1
+            self._put_memory(key, data, len(body), expires_at, now)
+            return data
+
+    def put(self, key: str, url: str, data: Any, ttl_seconds: float):
+        """Grava a resposta nas duas camadas com validade de `ttl_seconds`."""
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        now = self._clock()
+        expires_at = now + ttl_seconds
+        with self._lock:
+            self._put_memory(key, data, len(body), expires_at, now)
+            if len(body) > self.disk_budget_bytes:
+                return
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self._disk_bytes -= previous[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, url, body, size, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, len(body), now, expires_at, now),
+            )
+            self._disk_bytes += len(body)
+            self._evict_disk(now)
+
+    # --- evicção ---
+
+    def _drop_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    def _put_memory(self, key: str, data: Any, size: int, expires_at: float, now: float):
+        self._drop_memory(key)
+        if size > self.memory_budget_bytes:
+            return
+        self._memory[key] = (expires_at, size, data)
+        self._memory_bytes += size
+        if self._memory_bytes <= self.memory_budget_bytes:
+            return
+        # Primeiro o que já expirou, depois as menos usadas
+        for k in [k for k, e in self._memory.items() if e[0] <= now]:
+            self._drop_memory(k)
+            self._counters["expired"] += 1
+        while self._memory_bytes > self.memory_budget_bytes:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._counters["memory_evictions"] += 1
+
+    def _evict_disk(self, now: float):
+        if self._disk_bytes <= self.disk_budget_bytes:
+            return
+        expired_count, expired_bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires_at <= ?", (now,)
+        ).fetchone()
+        if expired_count:
+            self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            self._counters["expired"] += expired_count
+            self._disk_bytes -= expired_bytes
+        if self._disk_bytes <= self.disk_budget_bytes:
+            return
+        victims = []
+        excess = self._disk_bytes - self.disk_budget_bytes
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+            self._disk_bytes -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._counters["disk_evictions"] += len(victims)
+
+    # --- manutenção ---
+
+    def clear(
+        self,
+        url_contains: str | None = None,
+        key: str | None = None,
+        older_than_seconds: float | None = None,
+    ) -> int:
+        """Remove entradas que atendem a todos os filtros informados; retorna quantas saíram do disco."""
+        clauses, params = [], []
+        if url_contains:
+            clauses.append("instr(url, ?) > 0")
+            params.append(url_contains)
+        if key:
+            clauses.append("key = ?")
+            params.append(key)
+        if older_than_seconds:
+            clauses.append("created_at < ?")
+            params.append(self._clock() - float(older_than_seconds))
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self._lock:
+            rows = self._db.execute(f"SELECT key, size FROM entries{where}", params).fetchall()
+            keys = [row[0] for row in rows]
+            self._db.execute(f"DELETE FROM entries{where}", params)
+            self._disk_bytes -= sum(row[1] for row in rows)
+            for k in keys:
+                self._drop_memory(k)
+            if not clauses:
+                self._memory.clear()
+                self._memory_bytes = 0
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores desta execução e ocupação atual das duas camadas."""
+        with self._lock:
+            disk_entries, disk_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            return dict(
+                self._counters,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+                disk_entries=disk_entries,
+                disk_bytes=disk_bytes,
+            )
+
+    def flush_stats(self):
+        """Acumula no SQLite os contadores ainda não persistidos desta execução."""
+        with self._lock:
+            if self._closed:
+                return
+            for name in COUNTERS:
+                delta = self._counters[name] - self._flushed[name]
+                if delta:
+                    self._db.execute(
+                        "INSERT INTO counters (name, value) VALUES (?, ?) "
+                        "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                        (name, delta),
+                    )
+            self._flushed = dict(self._counters)
+
+    def lifetime_stats(self) -> Dict[str, int]:
+        """Contadores acumulados de todas as execuções (inclui a atual)."""
+        self.flush_stats()
+        with self._lock:
+            stored = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+        return {name: int(stored.get(name, 0)) for name in COUNTERS}
+
+    def close(self):
+        self.flush_stats()
+        with self._lock:
+            self._closed = True
+            self._db.close()
+
+
+def purge_legacy_files(cache_dir: str | Path) -> int:
+    """Remove os arquivos do cache antigo (um JSON por chave). Retorna quantos foram apagados."""
+    removed = 0
+    try:
+        entries = list(os.scandir(cache_dir))
+    except OSError:
+        return 0
+    for entry in entries:
+        if entry.is_file() and LEGACY_FILE.match(entry.name):
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Cache global, criado sob demanda a partir do ambiente."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            project_root = Path(__file__).resolve().parents[2]  # raiz do projeto
+            cache_dir = os.getenv("RAPIDAPI_CACHE_DIR") or str(project_root / "cache" / "rapidapi")
+            # Uma vez por processo; depois da primeira execução não resta nada a apagar
+            purged = purge_legacy_files(cache_dir)
+            if purged:
+                print(f"🧹 Cache RapidAPI: {purged} arquivos do formato antigo removidos")
+            _cache = ResponseCache(
+                cache_dir,
+                memory_budget_bytes=int(float(os.getenv("RAPIDAPI_CACHE_MEMORY_MB", "32")) * 1024 * 1024),
+                disk_budget_bytes=int(float(os.getenv("RAPIDAPI_CACHE_DISK_MB", "256")) * 1024 * 1024),
+            )
+            atexit.register(_cache.flush_stats)
+        return _cache
@@ -0,0 +1,53 @@
+"""
+Coalescência de chamadas idênticas em voo ("single-flight").
+
+Se várias threads pedem a mesma chave ao mesmo tempo, só a primeira executa
+a função; as demais esperam e recebem o mesmo resultado (ou a mesma
+exceção). Terminada a chamada, a chave é liberada: o reaproveitamento
+posterior fica por conta do cache.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Executa no máximo uma chamada por chave de cada vez."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Retorna `(resultado, compartilhado)`; `compartilhado` é True para quem só esperou."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
@@ -1,5 +1,4 @@
 import io
-import requests
 from PIL import Image, ImageFilter, ImageEnhance, ImageDraw, ImageFont
 import numpy as np
 from typing import Tuple, Optional
@@ -7,6 +6,16 @@ import tempfile
 import os
 import random
 
+from .blob_cache import BlobCache, get_blob_cache
+from .http_transport import HttpTransport, get_transport
+from .image_analysis import get_image_analysis, skin_tone_mask
+from .jpeg_encoder import get_jpeg_encoder
+
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
 
 class StoriesImageProcessor:
     """
@@ -18,23 +27,40 @@ class StoriesImageProcessor:
     STORIES_HEIGHT = 1920
     STORIES_RATIO = STORIES_HEIGHT / STORIES_WIDTH  # 16:9 = 1.777...
     
-    def __init__(self):
-        pass
+    def __init__(self, transport: HttpTransport | None = None, blob_cache: BlobCache | None = None):
+        self.http = transport or get_transport()
+        self._blobs = blob_cache
+
+    @property
+    def blobs(self) -> BlobCache:
+        """Cache de imagens, resolvido só no primeiro uso."""
+        if self._blobs is None:
+            self._blobs = get_blob_cache()
+        return self._blobs
     
     def download_image(self, image_url: str) -> Image.Image:
         """
         Baixa uma imagem de uma URL e retorna um objeto PIL Image
+        (bytes reaproveitados do cache local quando a URL já foi baixada)
         """
         try:
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            return Image.open(io.BytesIO(response.content)).convert('RGB')
+            data, _ = self.blobs.fetch(image_url, http=self.http, timeout=30)
+            return Image.open(io.BytesIO(data)).convert('RGB')
         except Exception as e:
             raise RuntimeError(f"Erro ao baixar imagem: {e}")
     
     def get_dominant_colors(self, image: Image.Image, num_colors: int = 3) -> list:
         """
         Extrai as cores dominantes da imagem para criar o gradiente de fundo
+        
+        A paleta fica memorizada na análise compartilhada da imagem, então
+        tentativas e variantes de fundo da mesma origem não a recalculam.
+        """
+        return get_image_analysis(image).dominant_colors(num_colors, self._extract_dominant_colors)
+    
+    def _extract_dominant_colors(self, image: Image.Image, num_colors: int = 3) -> list:
+        """
+        Calcula as cores dominantes (k-means com sklearn ou quantização do Pillow)
         """
         # Redimensionar para acelerar o processamento
         small_image = image.resize((150, 150))
@@ -75,10 +101,10 @@ class StoriesImageProcessor:
     def create_gradient_background(self, width: int, height: int, colors: list) -> Image.Image:
         """
         Cria um fundo com gradiente baseado nas cores dominantes
+
+        Aceita qualquer quantidade de cores; cada cor vira uma parada
+        igualmente espaçada no gradiente vertical.
         """
-        # Criar imagem base
-        background = Image.new('RGB', (width, height))
-        
         if len(colors) < 2:
             # Se só temos uma cor, usar um gradiente suave dela
             base_color = colors[0] if colors else (128, 128, 128)
@@ -88,32 +114,44 @@ class StoriesImageProcessor:
                 base_color,
                 tuple(max(0, min(255, c - 30)) for c in base_color)
             ]
-        
-        # Criar gradiente vertical
-        for y in range(height):
-            # Calcular posição no gradiente (0.0 a 1.0)
-            position = y / height
-            
-            # Interpolar entre as cores
-            if position <= 0.5:
-                # Primeira metade: cor 0 para cor 1
-                t = position * 2
-                color = self._interpolate_color(colors[0], colors[1], t)
-            else:
-                # Segunda metade: cor 1 para cor 2 (se existir)
-                t = (position - 0.5) * 2
-                end_color = colors[2] if len(colors) > 2 else colors[1]
-                color = self._interpolate_color(colors[1], end_color, t)
-            
-            # Desenhar linha horizontal
-            for x in range(width):
-                background.putpixel((x, y), color)
-        
+        elif len(colors) == 2:
+            # Duas cores: segunda metade permanece na cor final (comportamento original)
+            colors = [colors[0], colors[1], colors[1]]
+
+        # Criar gradiente vertical com N paradas em poucas operações de array
+        gradient = self._build_vertical_gradient(width, height, colors)
+        background = Image.fromarray(gradient, 'RGB')
+
         # Aplicar blur suave para suavizar o gradiente
         background = background.filter(ImageFilter.GaussianBlur(radius=2))
-        
+
         return background
-    
+
+    def _build_vertical_gradient(self, width: int, height: int, colors: list) -> np.ndarray:
+        """
+        Monta um gradiente vertical (height x width x 3, uint8) com paradas
+        igualmente espaçadas entre as cores fornecidas.
+
+        Calcula apenas uma coluna de cores (uma por linha) e a replica na
+        horizontal, evitando o preenchimento pixel a pixel.
+        """
+        stops = np.asarray(colors, dtype=np.float64)[:, :3]
+        segments = len(stops) - 1
+
+        # Posição de cada linha no gradiente (0.0 a 1.0) e segmento correspondente
+        position = np.arange(height, dtype=np.float64) / height
+        scaled = position * segments
+        # Fronteiras pertencem ao segmento anterior (position <= 0.5 -> segmento 0)
+        index = np.clip(np.ceil(scaled).astype(np.int64) - 1, 0, segments - 1)
+        t = (scaled - index)[:, None]
+
+        start = stops[index]
+        end = stops[index + 1]
+        column = np.trunc(start + (end - start) * t)
+        column = np.clip(column, 0, 255).astype(np.uint8)
+
+        return np.ascontiguousarray(np.broadcast_to(column[:, None, :], (height, width, 3)))
+
     def _interpolate_color(self, color1: tuple, color2: tuple, t: float) -> tuple:
         """
         Interpola entre duas cores RGB
@@ -215,19 +253,27 @@ class StoriesImageProcessor:
         
         return background
     
-    def save_processed_image(self, processed_image: Image.Image, quality: int = 95) -> str:
+    def encode_processed_image(self, processed_image: Image.Image, quality: int | None = None) -> bytes:
+        """
+        Codifica a imagem processada como JPEG em memória (sem arquivo temporário)
+        
+        Sem `quality`, usa o codificador com orçamento de bytes (classe "stories",
+        croma sem subamostragem para preservar as bordas do texto).
+        """
+        if quality is not None:
+            buffer = io.BytesIO()
+            processed_image.save(buffer, 'JPEG', quality=quality, optimize=True)
+            return buffer.getvalue()
+        return get_jpeg_encoder().encode(processed_image, "stories", subsampling="4:4:4").data
+    
+    def save_processed_image(self, processed_image: Image.Image, quality: int | None = None) -> str:
         """
         Salva a imagem processada em um arquivo temporário e retorna o caminho
         """
-        # Criar arquivo temporário
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-        temp_path = temp_file.name
-        temp_file.close()
-        
-        # Salvar imagem
-        processed_image.save(temp_path, 'JPEG', quality=quality, optimize=True)
-        
-        return temp_path
+        data = self.encode_processed_image(processed_image, quality)
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
+            temp_file.write(data)
+        return temp_file.name
     
     def process_and_save_for_stories(self, image_url: str, background_type: str = "gradient") -> str:
         """
@@ -487,50 +533,57 @@ class StoriesImageProcessor:
         )
         return self.save_processed_image(processed_image)
     
+    def process_for_stories_with_text_bytes(self, image_url: str, text: str = None,
+                                            background_type: str = "gradient",
+                                            text_position: str = "auto") -> bytes:
+        """
+        Processa uma imagem para Stories com texto e retorna o JPEG em memória,
+        pronto para `SupabaseUploader.upload_from_bytes`/`PublicUploader.upload_from_bytes`
+        
+        Returns:
+            bytes: Imagem processada codificada como JPEG
+        """
+        processed_image = self.process_image_for_stories_with_text(
+            image_url, text, background_type, text_position
+        )
+        return self.encode_processed_image(processed_image)
+    
     def detect_best_text_area(self, image: Image.Image, text_height: int) -> str:
         """
         Detecta a melhor área da imagem para posicionar o texto
         baseado na análise de complexidade visual e detecção de pessoas
         """
-        # Converter para RGB se necessário
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Redimensionar para análise mais rápida
-        analysis_img = image.resize((270, 480))  # 1/4 do tamanho original
-        img_array = np.array(analysis_img)
+        # Análise compartilhada (redimensionada/convertida uma única vez por conteúdo)
+        analysis = get_image_analysis(image)
         
         # Dividir imagem em 3 seções: topo, centro, fundo
-        height = img_array.shape[0]
+        height = analysis.array.shape[0]
         section_height = height // 3
         
-        sections = {
-            'top': img_array[0:section_height],
-            'center': img_array[section_height:2*section_height], 
-            'bottom': img_array[2*section_height:]
+        bounds = {
+            'top': (0, section_height),
+            'center': (section_height, 2 * section_height),
+            'bottom': (2 * section_height, height)
         }
         
+        # Detectar possível presença de pessoas/rostos em todas as seções de uma vez
+        person_scores = self._analysis_person_scores(analysis, bounds)
+        
         section_scores = {}
         
-        for section_name, section_data in sections.items():
-            # Calcular variância de cores (complexidade visual)
-            variance = np.var(section_data)
+        for section_name, (start, end) in bounds.items():
+            stats = analysis.band_stats(start, end)
             
-            # Calcular uniformidade de cores
-            section_flat = section_data.reshape(-1, 3)
-            unique_colors = len(np.unique(section_flat.view(np.dtype((np.void, section_flat.dtype.itemsize * 3)))))
-            uniformity = 1.0 / (unique_colors + 1)  # Mais uniforme = melhor para texto
+            # Variância de cores (complexidade visual)
+            variance = stats['variance']
             
-            # Calcular brilho médio
-            brightness = np.mean(section_data)
+            # Uniformidade de cores
+            uniformity = 1.0 / (analysis.band_unique_colors(start, end) + 1)  # Mais uniforme = melhor para texto
             
-            # Detectar bordas (complexidade estrutural)
-            gray_section = np.mean(section_data, axis=2)
-            edges = np.abs(np.gradient(gray_section)).sum()
-            edge_density = edges / gray_section.size
+            # Bordas (complexidade estrutural)
+            edge_density = stats['edge_density']
             
-            # Detectar possível presença de pessoas/rostos
-            person_penalty = self._detect_person_like_features(section_data)
+            person_penalty = person_scores[section_name]
             
             # Penalizar seções com pessoas detectadas
             position_penalty = 1.0
@@ -556,11 +609,8 @@ class StoriesImageProcessor:
         if text_height > available_height:
             return 'bottom'  # Sempre forçar bottom para textos longos
         
-        # Lógica conservadora para evitar pessoas
-        top_person_penalty = self._detect_person_like_features(
-            np.array(image.resize((270, 480)))[:160]  # Seção top
-        )
-        if best_section == 'top' and top_person_penalty > 0.15:
+        # Lógica conservadora para evitar pessoas (seção top)
+        if best_section == 'top' and person_scores['top'] > 0.15:
             return 'bottom'
         
         # Se o melhor score for 'top' mas com baixo score, usar 'bottom'
@@ -568,12 +618,8 @@ class StoriesImageProcessor:
             return 'bottom'
         
         # Se o melhor score for 'center' mas detectar pessoa, usar 'bottom'
-        if best_section == 'center':
-            center_person_penalty = self._detect_person_like_features(
-                np.array(image.resize((270, 480)))[160:320]  # Seção center
-            )
-            if center_person_penalty > 0.25:
-                return 'bottom'
+        if best_section == 'center' and person_scores['center'] > 0.25:
+            return 'bottom'
         
         return best_section
     
@@ -582,28 +628,29 @@ class StoriesImageProcessor:
         Detecta a melhor área para posicionar frases curtas de efeito
         Prioriza posições que maximizem o impacto visual sem interferir com pessoas
         """
-        # Redimensionar para análise mais rápida
-        analysis_image = image.resize((270, 480))
-        img_array = np.array(analysis_image)
+        # Análise compartilhada (redimensionada/convertida uma única vez por conteúdo)
+        analysis = get_image_analysis(image)
         
         # Definir seções específicas para frases curtas (mais focadas)
-        sections = {
-            'top': img_array[:120],      # Seção superior menor
-            'bottom': img_array[360:]    # Seção inferior menor
+        bounds = {
+            'top': (0, 120),                          # Seção superior menor
+            'bottom': (360, analysis.array.shape[0])  # Seção inferior menor
         }
         
+        # Detectar pessoas em todas as seções de uma vez
+        person_scores = self._analysis_person_scores(analysis, bounds)
+        
         section_scores = {}
         
-        for section_name, section_data in sections.items():
-            # Detectar pessoas na seção
-            person_penalty = self._detect_person_like_features(section_data)
+        for section_name, (start, end) in bounds.items():
+            person_penalty = person_scores[section_name]
+            stats = analysis.band_stats(start, end)
             
             # Analisar uniformidade da área (melhor para legibilidade)
-            gray_section = np.mean(section_data, axis=2)
-            variance = np.var(gray_section)
+            variance = stats['gray_variance']
             
             # Analisar contraste (importante para frases de impacto)
-            brightness = np.mean(gray_section)
+            brightness = stats['gray_mean']
             contrast_score = 1.0 if brightness < 128 else 0.8  # Preferir fundos escuros
             
             # Penalidades específicas para frases curtas
@@ -624,10 +671,8 @@ class StoriesImageProcessor:
         best_position = max(section_scores, key=section_scores.get)
         
         # Lógica de segurança: se detectar pessoa no topo, forçar bottom
-        if best_position == 'top':
-            top_person_penalty = self._detect_person_like_features(sections['top'])
-            if top_person_penalty > 0.1:  # Muito sensível para frases curtas
-                return 'bottom'
+        if best_position == 'top' and person_scores['top'] > 0.1:  # Muito sensível para frases curtas
+            return 'bottom'
         
         return best_position
     
@@ -636,43 +681,72 @@ class StoriesImageProcessor:
         Detecta características que podem indicar presença de pessoas
         Retorna um valor entre 0.0 (sem pessoa) e 1.0 (muito provável pessoa)
         """
-        # Converter para tons de cinza para análise
-        gray = np.mean(section_data, axis=2)
-        
-        # Detectar tons de pele (faixas de cor típicas)
-        skin_pixels = 0
-        total_pixels = section_data.shape[0] * section_data.shape[1]
-        
-        for i in range(section_data.shape[0]):
-            for j in range(section_data.shape[1]):
-                r, g, b = section_data[i, j]
-                # Faixas típicas de tons de pele
-                if (r > 95 and g > 40 and b > 20 and 
-                    max(r, g, b) - min(r, g, b) > 15 and
-                    abs(r - g) > 15 and r > g and r > b):
-                    skin_pixels += 1
+        return self._person_score_map(section_data, {'section': (0, section_data.shape[0])})['section']
+    
+    def _person_score_map(self, img_array: np.ndarray, bounds: dict) -> dict:
+        """
+        Calcula o score de presença de pessoas para várias faixas horizontais
+        da imagem em uma única passada vetorizada.
         
-        skin_ratio = skin_pixels / total_pixels
+        Args:
+            img_array: Array RGB (altura x largura x canais) já redimensionado
+            bounds: Mapa nome -> (linha_inicial, linha_final) de cada seção
+            
+        Returns:
+            dict: Mapa nome -> score entre 0.0 (sem pessoa) e 1.0 (muito provável pessoa)
+        """
+        rgb = img_array[..., :3]
         
-        # Detectar padrões circulares/ovais (possíveis rostos)
-        try:
-            from scipy import ndimage
-            # Aplicar filtro para detectar formas circulares
-            laplacian = ndimage.laplace(gray)
-            circular_features = np.sum(np.abs(laplacian)) / gray.size
-            circular_score = min(circular_features / 100.0, 1.0)  # Normalizar
-        except ImportError:
-            # Fallback se scipy não estiver disponível
-            circular_score = 0.0
+        # Converter para tons de cinza para análise
+        gray = np.mean(rgb, axis=2)
         
-        # Detectar variação de brilho típica de rostos
-        brightness_var = np.var(gray)
-        brightness_score = min(brightness_var / 1000.0, 1.0)  # Normalizar
+        # Máscara de tons de pele (faixas de cor típicas), calculada uma única vez
+        skin_per_row = skin_tone_mask(rgb).sum(axis=1)
         
-        # Score final combinado
-        person_score = (skin_ratio * 0.6 + circular_score * 0.2 + brightness_score * 0.2)
+        return self._score_person_bands(gray, skin_per_row, bounds)
+    
+    def _analysis_person_scores(self, analysis, bounds: dict) -> dict:
+        """
+        Score de pessoas por seção reaproveitando a máscara de pele e os tons de
+        cinza da análise compartilhada da imagem
+        """
+        key = ('person_scores', tuple(sorted(bounds.items())))
+        return analysis.cached(
+            key, lambda: self._score_person_bands(analysis.gray, analysis.skin_per_row, bounds)
+        )
+    
+    def _score_person_bands(self, gray: np.ndarray, skin_per_row: np.ndarray, bounds: dict) -> dict:
+        """
+        Combina pele, padrões circulares e variação de brilho em um score por seção
+        """
+        scores = {}
+        for name, (start, end) in bounds.items():
+            section_gray = gray[start:end]
+            if section_gray.size == 0:
+                scores[name] = 0.0
+                continue
+            
+            skin_ratio = skin_per_row[start:end].sum() / section_gray.size
+            
+            # Detectar padrões circulares/ovais (possíveis rostos)
+            if ndimage is not None:
+                # Aplicar filtro para detectar formas circulares
+                laplacian = ndimage.laplace(section_gray)
+                circular_features = np.sum(np.abs(laplacian)) / section_gray.size
+                circular_score = min(circular_features / 100.0, 1.0)  # Normalizar
+            else:
+                # Fallback se scipy não estiver disponível
+                circular_score = 0.0
+            
+            # Detectar variação de brilho típica de rostos
+            brightness_var = np.var(section_gray)
+            brightness_score = min(brightness_var / 1000.0, 1.0)  # Normalizar
+            
+            # Score final combinado
+            person_score = (skin_ratio * 0.6 + circular_score * 0.2 + brightness_score * 0.2)
+            scores[name] = float(min(person_score, 1.0))
         
-        return min(person_score, 1.0)
+        return scores
 
     def cleanup_temp_file(self, file_path: str):
         """
@@ -1,8 +1,67 @@
+import hashlib
 import os
-import uuid
-import requests
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Tuple
 from urllib.parse import quote
-from io import BytesIO
+
+from .blob_cache import CHUNK_SIZE, BlobCache, get_blob_cache
+from .http_transport import HttpTransport, get_transport
+from .single_flight import SingleFlight
+
+
+class BucketRegistry:
+    """
+    Buckets já verificados no processo, por (url do projeto, bucket), com validade.
+
+    Compartilhado entre instâncias de `SupabaseUploader`: a listagem de buckets
+    acontece uma vez por processo (ou por `ttl` segundos), e verificações
+    simultâneas do mesmo bucket são coalescidas. `invalidate` força nova
+    verificação, por exemplo quando um upload devolve 404.
+    """
+
+    def __init__(self, ttl: float = 21600.0, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._verified: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+
+    def is_verified(self, url: str, bucket: str) -> bool:
+        with self._lock:
+            at = self._verified.get((url, bucket))
+            return at is not None and self._clock() - at < self.ttl
+
+    def ensure(self, url: str, bucket: str, verify):
+        """Executa `verify()` se o bucket não estiver verificado (uma vez entre chamadas simultâneas)."""
+        if self.is_verified(url, bucket):
+            return
+
+        def run():
+            if not self.is_verified(url, bucket):
+                verify()
+                with self._lock:
+                    self._verified[(url, bucket)] = self._clock()
+
+        self._inflight.do(f"{url}|{bucket}", run)
+
+    def invalidate(self, url: str, bucket: str):
+        with self._lock:
+            self._verified.pop((url, bucket), None)
+
+
+_buckets: BucketRegistry | None = None
+_buckets_lock = threading.Lock()
+
+
+def get_bucket_registry() -> BucketRegistry:
+    """Registro global de buckets verificados (validade em SUPABASE_BUCKET_TTL, padrão 6h)."""
+    global _buckets
+    with _buckets_lock:
+        if _buckets is None:
+            _buckets = BucketRegistry(float(os.getenv("SUPABASE_BUCKET_TTL", "21600")))
+        return _buckets
 
 
 class SupabaseUploader:
@@ -16,15 +75,37 @@ class SupabaseUploader:
 
     Retorna URL pública do objeto se o bucket estiver configurado como público
     ou se houver CDN habilitado. Caso contrário, retorna a rota de objeto.
+
+    Sem `filename`, o objeto é nomeado pelo sha256 do conteúdo: bytes idênticos
+    (republicação, novas tentativas, fallback de Stories) são enviados uma única
+    vez. O manifesto local de uploads responde sem rede; na falta dele, um HEAD
+    na URL pública confirma se o objeto já existe.
     """
 
-    def __init__(self, url: str, service_key: str, bucket: str):
+    def __init__(
+        self,
+        url: str,
+        service_key: str,
+        bucket: str,
+        transport: HttpTransport | None = None,
+        blob_cache: BlobCache | None = None,
+        buckets: BucketRegistry | None = None,
+    ):
         if not url or not service_key or not bucket:
             raise ValueError("SupabaseUploader requer url, service_key e bucket")
         self.base = url.rstrip("/")
         self.token = service_key
         self.bucket = bucket
-        self._bucket_checked = False
+        self.http = transport or get_transport()
+        self._blobs = blob_cache
+        self.buckets = buckets or get_bucket_registry()
+
+    @property
+    def blobs(self) -> BlobCache:
+        """Cache de imagens, resolvido só no primeiro uso."""
+        if self._blobs is None:
+            self._blobs = get_blob_cache()
+        return self._blobs
 
     def _headers(self, content_type: str | None = None) -> dict:
         headers = {
@@ -38,11 +119,12 @@ class SupabaseUploader:
 
     def ensure_bucket_exists(self, public: bool = True):
         """Garante que o bucket exista; cria se necessário com visibilidade pública."""
-        if self._bucket_checked:
-            return
+        self.buckets.ensure(self.base, self.bucket, lambda: self._verify_bucket(public))
+
+    def _verify_bucket(self, public: bool):
         # Listar buckets e checar por nome
         url_list = f"{self.base}/storage/v1/bucket"
-        resp_list = requests.get(url_list, headers=self._headers(), timeout=30)
+        resp_list = self.http.get(url_list, headers=self._headers(), timeout=30)
         if not (200 <= resp_list.status_code < 300):
             resp_list.raise_for_status()
         try:
@@ -54,9 +136,8 @@ class SupabaseUploader:
             # Criar bucket
             url_create = f"{self.base}/storage/v1/bucket"
             payload = {"name": self.bucket, "public": public}
-            resp_create = requests.post(url_create, headers=self._headers("application/json"), json=payload, timeout=30)
+            resp_create = self.http.post(url_create, headers=self._headers("application/json"), json=payload, timeout=30)
             resp_create.raise_for_status()
-        self._bucket_checked = True
 
     def _guess_extension(self, content_type: str) -> str:
         ct = (content_type or "").lower()
@@ -68,51 +149,134 @@ class SupabaseUploader:
             return "webp"
         return "bin"
 
-    def upload_from_bytes(self, data: bytes, content_type: str = "image/jpeg", filename: str | None = None) -> str:
-        if not filename:
-            ext = self._guess_extension(content_type)
-            filename = f"auto-{uuid.uuid4().hex}.{ext}"
+    def _exists_remotely(self, public_url: str) -> bool:
+        """HEAD na URL pública; qualquer falha conta como inexistente (o upload segue)."""
+        try:
+            resp = self.http.head(public_url, headers=self._headers(), timeout=15)
+            return resp.status_code == 200
+        except Exception:
+            return False
+
+    def upload_from_bytes(
+        self,
+        data: bytes,
+        content_type: str = "image/jpeg",
+        filename: str | None = None,
+        cache: bool = False,
+    ) -> str:
+        """
+        Envia bytes em memória. Com `cache`, os bytes também ficam no cache local sob
+        a URL pública, para quem a ler depois (ex.: descrição da imagem do feed).
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        public_url = self._upload(lambda: data, sha, content_type, filename)
+        if cache:
+            self.blobs.put(data, content_type, url=public_url)
+        return public_url
+
+    def upload_from_file(self, path: str | Path, content_type: str = "image/jpeg", filename: str | None = None) -> str:
+        """Envia um arquivo local em streaming (o corpo é lido do disco em blocos, não carregado inteiro)."""
+        with open(path, "rb") as f:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+            return self._upload_fileobj(f, digest.hexdigest(), content_type, filename)
+
+    def _upload_fileobj(self, f: BinaryIO, sha: str, content_type: str, filename: str | None = None) -> str:
+        """Envia um arquivo já aberto (relido do início a cada tentativa) e associa a URL pública ao blob."""
+        def open_body():
+            f.seek(0)
+            return f
+
+        public_url = self._upload(open_body, sha, content_type, filename)
+        self.blobs.link(public_url, sha, content_type)
+        return public_url
+
+    def _upload(self, open_body, sha: str, content_type: str, filename: str | None) -> str:
+        """
+        Envia o corpo devolvido por `open_body()` (bytes ou arquivo binário; chamado de novo
+        se o envio precisar ser repetido) e retorna a URL pública.
+        """
+        # Nome por conteúdo só quando o chamador não escolheu um nome
+        dedupe = not filename
+        if dedupe:
+            filename = f"{sha}.{self._guess_extension(content_type)}"
+        bucket_enc = quote(self.bucket.strip(), safe="")
+        file_enc = quote(filename.strip(), safe="")
+        public_url = f"{self.base}/storage/v1/object/public/{bucket_enc}/{file_enc}"
+        target = f"{self.base}/{self.bucket}"
+        if dedupe:
+            known = self.blobs.uploaded_url(target, sha)
+            if known is None and self._exists_remotely(public_url):
+                known = public_url
+                self.blobs.record_upload(target, sha, known)
+            if known:
+                return known
         # Garante que o bucket exista e seja público
         self.ensure_bucket_exists(public=True)
         # POST para criar novo objeto
-        bucket_enc = quote(self.bucket.strip(), safe="")
-        file_enc = quote(filename.strip(), safe="")
         url = f"{self.base}/storage/v1/object/{bucket_enc}/{file_enc}"
         headers = self._headers(content_type)
         # Permite sobrescrever caso o nome já exista
         headers["x-upsert"] = "true"
-        resp = requests.post(url, headers=headers, data=data, timeout=60)
+        resp = self.http.post(url, headers=headers, data=open_body(), timeout=60)
+        if resp.status_code == 404:
+            # Bucket removido desde a verificação: esquecer o registro e os uploads dele, recriar e tentar de novo
+            self.buckets.invalidate(self.base, self.bucket)
+            self.blobs.forget_upload(target)
+            self.ensure_bucket_exists(public=True)
+            resp = self.http.post(url, headers=headers, data=open_body(), timeout=60)
         resp.raise_for_status()
-        # Construir URL pública provável
-        public_url = f"{self.base}/storage/v1/object/public/{bucket_enc}/{file_enc}"
+        if dedupe:
+            self.blobs.record_upload(target, sha, public_url)
         return public_url
 
-    def _to_jpeg_bytes(self, data: bytes) -> bytes:
-        """Converte bytes de imagem para JPEG. Se falhar, retorna os bytes originais."""
+    def _to_jpeg_bytes(self, f: BinaryIO) -> bytes | None:
+        """
+        Converte a imagem do arquivo para JPEG dentro do orçamento de bytes do
+        codificador (classe "feed"). Retorna None se a conversão falhar.
+        """
         try:
             from PIL import Image  # Pillow
-            img = Image.open(BytesIO(data))
-            # Converter para RGB para garantir compatibilidade com JPEG
-            if img.mode not in ("RGB", "L"):
-                img = img.convert("RGB")
-            buf = BytesIO()
-            img.save(buf, format="JPEG", quality=90, optimize=True)
-            return buf.getvalue()
+            from .jpeg_encoder import get_jpeg_encoder
+            with Image.open(f) as img:
+                return get_jpeg_encoder().encode(img, "feed").data
         except Exception:
             # Falha na conversão (ex.: Pillow não instalado), usar original
-            return data
+            return None
+
+    def _fits_as_jpeg(self, f: BinaryIO) -> bool:
+        """
+        True se o arquivo já é um JPEG RGB/tons de cinza dentro do orçamento de bytes
+        da classe "feed" (só o cabeçalho é lido, a imagem não é decodificada).
+        """
+        try:
+            from PIL import Image  # Pillow
+            from .jpeg_encoder import get_jpeg_encoder
+            size = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            with Image.open(f) as img:
+                ok = img.format == "JPEG" and img.mode in ("RGB", "L")
+            return ok and size <= get_jpeg_encoder().target_bytes
+        except Exception:
+            return False
+        finally:
+            f.seek(0)
 
     def upload_from_url(self, source_image_url: str, timeout: int = 60, force_jpeg: bool = True) -> str:
-        r = requests.get(source_image_url, timeout=timeout)
-        r.raise_for_status()
-        content_type = r.headers.get("Content-Type", "image/jpeg")
-        data = r.content
-        if force_jpeg:
-            converted = self._to_jpeg_bytes(data)
-            if converted != data:
-                data = converted
-                content_type = "image/jpeg"
-            else:
-                # Mesmo se não converter, preferimos marcar como JPEG apenas quando de fato converteu
-                pass
-        return self.upload_from_bytes(data, content_type=content_type)
\ No newline at end of file
+        """
+        Re-hospeda a imagem da URL. O download vai em blocos para o cache local e o
+        upload é enviado em streaming a partir desse arquivo, inclusive com
+        `force_jpeg` quando a origem já é um JPEG dentro do orçamento. Só a
+        conversão decodifica a imagem em memória; o JPEG resultante (limitado pelo
+        orçamento do codificador) é enviado como bytes.
+        """
+        f, content_type, sha = self.blobs.open(source_image_url, http=self.http, timeout=timeout)
+        with f:
+            if force_jpeg and self._fits_as_jpeg(f):
+                return self._upload_fileobj(f, sha, "image/jpeg")
+            if force_jpeg:
+                converted = self._to_jpeg_bytes(f)
+                if converted is not None:
+                    return self.upload_from_bytes(converted, content_type="image/jpeg", cache=True)
+            return self._upload_fileobj(f, sha, content_type)
@@ -1,10 +1,11 @@
-import requests
+from .http_transport import HttpTransport, get_transport
 
 
 class TelegramClient:
-    def __init__(self, bot_token: str, chat_id: str):
+    def __init__(self, bot_token: str, chat_id: str, transport: HttpTransport | None = None):
         self.bot_token = bot_token
         self.chat_id = chat_id
+        self.http = transport or get_transport()
 
     def send_message(self, text: str) -> bool:
         """
@@ -13,7 +14,7 @@ class TelegramClient:
         try:
             url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
             payload = {"chat_id": self.chat_id, "text": text}
-            response = requests.post(url, data=payload, timeout=30)
+            response = self.http.post(url, data=payload, timeout=30)
             return response.status_code == 200
         except Exception as e:
             print(f"Erro ao enviar mensagem Telegram: {e}")
@@ -55,7 +55,7 @@ def test_railway_scheduling():
             print("  ✅ Conexão com PostgreSQL: OK")
             
             # Contar registros
-            with db.conn.cursor() as cur:
+            with db.pool.connection() as conn, conn.cursor() as cur:
                 cur.execute("SELECT COUNT(*) FROM top_trends")
                 count = cur.fetchone()[0]
             print(f"  📊 Registros na tabela: {count}")
@@ -0,0 +1,105 @@
+"""
+Testes para o polling adaptativo
+Valida crescimento dos intervalos, prazo total e uso pelo InstagramClient.
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.adaptive_poller import AdaptivePoller, PollStats
+from services.instagram_client import InstagramClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestAdaptivePoller(unittest.TestCase):
+    """Testa a classe AdaptivePoller."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.stats = PollStats()
+
+    def _poller(self, **kwargs):
+        return AdaptivePoller(stats=self.stats, sleep=self.clock.sleep, clock=self.clock, **kwargs)
+
+    def test_early_exit_with_short_initial_interval(self):
+        """Resultado pronto cedo não espera o intervalo máximo."""
+        answers = iter([None, "FINISHED"])
+        result = self._poller(jitter=0).poll(lambda: next(answers), phase="media")
+        self.assertEqual(result, "FINISHED")
+        self.assertEqual(self.clock.sleeps, [0.5])
+        summary = self.stats.summary()["media"]
+        self.assertEqual(summary["runs"], 1)
+        self.assertEqual(summary["avg_attempts"], 2)
+        self.assertEqual(summary["timeouts"], 0)
+
+    def test_intervals_grow_up_to_max(self):
+        """Intervalos crescem exponencialmente até o teto."""
+        poller = self._poller(initial_interval=1, factor=2, max_interval=5)
+        intervals = poller.intervals()
+        self.assertEqual([next(intervals) for _ in range(5)], [1, 2, 4, 5, 5])
+
+    def test_deadline_stops_polling(self):
+        """Sem resultado, para no prazo total e registra timeout."""
+        result = self._poller(deadline=10).poll(lambda: None, phase="media")
+        self.assertIsNone(result)
+        self.assertAlmostEqual(self.clock.now, 10)
+        self.assertEqual(self.stats.summary()["media"]["timeouts"], 1)
+
+    def test_jitter_stays_within_bounds(self):
+        """Jitter varia o intervalo dentro da fração configurada."""
+        answers = iter([None] * 20 + ["ok"])
+        self._poller(initial_interval=1, factor=1, jitter=0.2).poll(lambda: next(answers))
+        self.assertTrue(all(0.8 <= s <= 1.2 for s in self.clock.sleeps))
+
+
+class TestInstagramPolling(unittest.TestCase):
+    """Testa os métodos de polling do InstagramClient."""
+
+    def _client(self, payloads):
+        transport = MagicMock()
+        responses = []
+        for payload in payloads:
+            resp = MagicMock(ok=True)
+            resp.json.return_value = payload
+            responses.append(resp)
+        transport.request.side_effect = responses
+        return InstagramClient("123", "token", transport=transport)
+
+    def test_media_status_finishes_quickly(self):
+        """Container pronto na segunda consulta retorna sem esperar 5s."""
+        client = self._client([{"status_code": "IN_PROGRESS"}, {"status_code": "FINISHED"}])
+        client._poller = lambda interval_sec, max_checks: AdaptivePoller(
+            max_interval=interval_sec, deadline=interval_sec * max_checks, jitter=0, sleep=lambda s: None
+        )
+        self.assertEqual(client.poll_media_status("c1"), "FINISHED")
+
+    def test_media_status_error_has_context(self):
+        """Status ERROR retorna o detalhe da Graph API."""
+        client = self._client([{"status_code": "ERROR", "status": "Invalid image"}])
+        self.assertEqual(client.poll_stories_media_status("c1"), "ERROR:Invalid image")
+
+    def test_published_status(self):
+        """Mídia publicada é detectada pelo permalink."""
+        client = self._client([{"id": "m1", "permalink": "https://instagram.com/p/x"}])
+        self.assertEqual(client.poll_published_status("m1"), "PUBLISHED")
+
+
+if __name__ == '__main__':
+    unittest.main()
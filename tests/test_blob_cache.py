@@ -0,0 +1,383 @@
+"""
+Testes para o cache local de imagens endereçado por conteúdo
+Valida reaproveitamento por URL, deduplicação, TTL, evicção LRU e integração com o uploader
+(incluindo o manifesto de uploads por conteúdo).
+"""
+
+import unittest
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock, PropertyMock
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.blob_cache import BlobCache
+from services.public_uploader import PublicUploader
+from services.supabase_uploader import BucketRegistry, SupabaseUploader
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeHttp:
+    """Transporte que serve bytes fixos por URL e conta os downloads."""
+
+    def __init__(self, bodies, delay=0.0):
+        self.bodies = bodies
+        self.delay = delay
+        self.calls = []
+        self.streamed = []
+        self.posts = []
+        self.heads = []
+        self.remote = set()  # URLs públicas que o HEAD encontra
+        self.bucket_lists = 0
+        self.post_statuses = []  # status das próximas respostas de POST (padrão 200)
+
+    def get(self, url, **kwargs):
+        response = MagicMock()
+        response.status_code = 200
+        response.raise_for_status.return_value = None
+        if url.endswith("/storage/v1/bucket"):
+            self.bucket_lists += 1
+            response.json.return_value = [{"name": "bucket"}]
+            return response
+        self.calls.append(url)
+        self.streamed.append(kwargs.get("stream", False))
+        time.sleep(self.delay)
+        body = self.bodies[url]
+        # Corpo só disponível em blocos: o cache nunca deve ler `content`
+        type(response).content = PropertyMock(side_effect=AssertionError("content lido inteiro"))
+        response.iter_content.side_effect = lambda size: (body[i:i + size] for i in range(0, len(body), size))
+        response.headers = {"Content-Type": "image/png; charset=binary"}
+        return response
+
+    def head(self, url, **kwargs):
+        self.heads.append(url)
+        response = MagicMock()
+        response.status_code = 200 if url in self.remote else 404
+        return response
+
+    def post(self, url, **kwargs):
+        data = kwargs.get("data")
+        if hasattr(data, "read"):
+            # Corpo em arquivo: registrar o que seria enviado sem perder o tipo
+            kwargs = dict(kwargs, body=data.read(), streamed=True)
+        self.posts.append((url, kwargs))
+        response = MagicMock()
+        response.status_code = self.post_statuses.pop(0) if self.post_statuses else 200
+        response.raise_for_status.return_value = None
+        return response
+
+
+class TestBlobCache(unittest.TestCase):
+    """Testa `BlobCache`."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = FakeClock()
+
+    def make(self, max_bytes=10_000, url_ttl=3600):
+        cache = BlobCache(self.tmp.name, max_bytes=max_bytes, url_ttl=url_ttl, clock=self.clock)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_second_fetch_reuses_local_bytes(self):
+        """A mesma URL é baixada uma vez; um processo novo também encontra os bytes no disco."""
+        http = FakeHttp({"https://cdn/a.png": b"png-bytes"})
+        cache = self.make()
+        self.assertEqual(cache.fetch("https://cdn/a.png", http=http), (b"png-bytes", "image/png"))
+        self.assertEqual(cache.fetch("https://cdn/a.png", http=http), (b"png-bytes", "image/png"))
+        self.assertEqual(http.calls, ["https://cdn/a.png"])
+        self.assertEqual(cache.summary()["hits"], 1)
+        self.assertEqual(cache.summary()["misses"], 1)
+
+        reopened = self.make()
+        self.assertEqual(reopened.fetch("https://cdn/a.png", http=http)[0], b"png-bytes")
+        self.assertEqual(len(http.calls), 1)
+
+    def test_same_content_stored_once(self):
+        """URLs diferentes com o mesmo conteúdo ocupam um único blob."""
+        cache = self.make()
+        sha1 = cache.put(b"same", "image/jpeg", url="https://a/1.jpg")
+        sha2 = cache.put(b"same", "image/jpeg", url="https://b/2.jpg")
+        self.assertEqual(sha1, sha2)
+        summary = cache.summary()
+        self.assertEqual(summary["blobs"], 1)
+        self.assertEqual(summary["bytes"], 4)
+        self.assertEqual(cache.lookup("https://b/2.jpg"), (b"same", "image/jpeg"))
+
+    def test_url_mapping_expires(self):
+        """Após o TTL a URL é baixada de novo."""
+        http = FakeHttp({"https://cdn/a.png": b"v1"})
+        cache = self.make(url_ttl=60)
+        cache.fetch("https://cdn/a.png", http=http)
+        self.clock.now += 61
+        http.bodies["https://cdn/a.png"] = b"v2"
+        self.assertEqual(cache.fetch("https://cdn/a.png", http=http)[0], b"v2")
+        self.assertEqual(len(http.calls), 2)
+
+    def test_evicts_least_recently_used(self):
+        """Acima do limite sai o blob acessado há mais tempo."""
+        cache = self.make(max_bytes=10)
+        cache.put(b"aaaa", "image/jpeg", url="u-a")
+        self.clock.now += 1
+        cache.put(b"bbbb", "image/jpeg", url="u-b")
+        self.clock.now += 1
+        self.assertIsNotNone(cache.lookup("u-a"))  # "a" passa a ser o mais recente
+        self.clock.now += 1
+        cache.put(b"cccc", "image/jpeg", url="u-c")
+        self.assertIsNone(cache.lookup("u-b"))
+        self.assertIsNotNone(cache.lookup("u-a"))
+        self.assertIsNotNone(cache.lookup("u-c"))
+        summary = cache.summary()
+        self.assertEqual(summary["evictions"], 1)
+        self.assertEqual(summary["bytes"], 8)
+
+    def test_missing_file_drops_blob_accounting(self):
+        """Um blob apagado por fora deixa de contar no total usado pela evicção."""
+        cache = self.make()
+        sha = cache.put(b"aaaa", "image/jpeg", url="u-a")
+        cache.path(sha).unlink()
+        self.assertIsNone(cache.lookup("u-a"))
+        summary = cache.summary()
+        self.assertEqual(summary["blobs"], 0)
+        self.assertEqual(summary["bytes"], 0)
+
+    def test_concurrent_fetches_download_once(self):
+        """Chamadas simultâneas para a mesma URL compartilham um único download."""
+        http = FakeHttp({"https://cdn/a.png": b"x" * 100}, delay=0.05)
+        cache = self.make()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.fetch("https://cdn/a.png", http=http)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(http.calls, ["https://cdn/a.png"])
+
+    def test_uploader_registers_public_url(self):
+        """Depois do upload, ler a URL pública não baixa nada."""
+        http = FakeHttp({"https://cdn/src.png": b"not-an-image"})
+        cache = self.make()
+        uploader = SupabaseUploader("https://ref.supabase.co", "key", "bucket", transport=http, blob_cache=cache)
+        public_url = uploader.upload_from_url("https://cdn/src.png", force_jpeg=False)
+        uploader.upload_from_url("https://cdn/src.png", force_jpeg=False)
+        self.assertEqual(http.calls, ["https://cdn/src.png"])
+        self.assertEqual(cache.fetch(public_url, http=http), (b"not-an-image", "image/png"))
+        self.assertEqual(len(http.calls), 1)
+
+
+class TestUploadDeduplication(unittest.TestCase):
+    """Testa o nome por conteúdo e o manifesto de uploads do `SupabaseUploader`."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = BlobCache(tmp.name)
+        self.addCleanup(self.cache.close)
+        self.http = FakeHttp({})
+        self.buckets = BucketRegistry()
+        self.uploader = self.make("bucket")
+
+    def make(self, bucket):
+        return SupabaseUploader("https://ref.supabase.co", "key", bucket,
+                                transport=self.http, blob_cache=self.cache, buckets=self.buckets)
+
+    def test_identical_bytes_uploaded_once(self):
+        """O segundo envio do mesmo conteúdo devolve a URL do manifesto sem rede."""
+        first = self.uploader.upload_from_bytes(b"jpeg-data", content_type="image/jpeg")
+        self.assertIn("/storage/v1/object/public/bucket/", first)
+        self.assertTrue(first.endswith(".jpg"))
+        heads = len(self.http.heads)
+        second = self.uploader.upload_from_bytes(b"jpeg-data", content_type="image/jpeg")
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.http.posts), 1)
+        self.assertEqual(len(self.http.heads), heads)
+
+    def test_manifest_survives_new_instances(self):
+        """Outro uploader (ou outra execução) com o mesmo índice também não reenvia."""
+        url = self.uploader.upload_from_bytes(b"jpeg-data")
+        other = self.make("bucket")
+        self.assertEqual(other.upload_from_bytes(b"jpeg-data"), url)
+        self.assertEqual(len(self.http.posts), 1)
+
+    def test_head_fallback_skips_upload(self):
+        """Sem registro no manifesto, um HEAD 200 na URL por conteúdo evita o upload."""
+        sha = hashlib.sha256(b"already-there").hexdigest()
+        public = f"https://ref.supabase.co/storage/v1/object/public/bucket/{sha}.jpg"
+        self.http.remote.add(public)
+        self.assertEqual(self.uploader.upload_from_bytes(b"already-there"), public)
+        self.assertEqual(self.http.posts, [])
+        self.assertEqual(self.cache.uploaded_url("https://ref.supabase.co/bucket", sha), public)
+
+    def test_other_bucket_uploads_again(self):
+        """O manifesto é por destino: o mesmo conteúdo em outro bucket é enviado."""
+        self.uploader.upload_from_bytes(b"jpeg-data")
+        other = self.make("other")
+        other.upload_from_bytes(b"jpeg-data")
+        objects = [url for url, _ in self.http.posts if "/storage/v1/object/" in url]
+        self.assertEqual(len(objects), 2)
+
+    def test_bytes_upload_stays_out_of_cache(self):
+        """Bytes enviados diretamente (ex.: Stories) não ocupam o cache local."""
+        url = self.uploader.upload_from_bytes(b"stories-jpeg")
+        self.assertIsNone(self.cache.lookup(url))
+        self.assertEqual(self.cache.summary()["bytes"], 0)
+
+    def test_explicit_filename_is_kept(self):
+        """Com nome explícito o objeto não é deduplicado nem renomeado."""
+        url = self.uploader.upload_from_bytes(b"jpeg-data", filename="capa.jpg")
+        self.uploader.upload_from_bytes(b"jpeg-data", filename="capa.jpg")
+        self.assertTrue(url.endswith("/bucket/capa.jpg"))
+        self.assertEqual(len(self.http.posts), 2)
+
+
+class TestBucketRegistry(unittest.TestCase):
+    """Testa a verificação de buckets compartilhada entre instâncias."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = BlobCache(tmp.name)
+        self.addCleanup(self.cache.close)
+        self.http = FakeHttp({})
+        self.clock = FakeClock()
+        self.buckets = BucketRegistry(ttl=60, clock=self.clock)
+
+    def make(self):
+        return SupabaseUploader("https://ref.supabase.co", "key", "bucket",
+                                transport=self.http, blob_cache=self.cache, buckets=self.buckets)
+
+    def test_verified_once_across_instances(self):
+        """Instâncias novas (feed e Stories) não listam os buckets de novo."""
+        self.make().upload_from_bytes(b"feed")
+        self.make().upload_from_bytes(b"stories")
+        self.assertEqual(self.http.bucket_lists, 1)
+
+    def test_verification_expires(self):
+        """Após o TTL o bucket é verificado de novo."""
+        self.make().ensure_bucket_exists()
+        self.clock.now += 61
+        self.make().ensure_bucket_exists()
+        self.assertEqual(self.http.bucket_lists, 2)
+
+    def test_upload_404_invalidates_and_retries(self):
+        """Um 404 no upload reverifica o bucket, limpa o manifesto dele e reenvia."""
+        uploader = self.make()
+        uploader.upload_from_bytes(b"old")
+        self.http.post_statuses = [404, 200]
+        url = uploader.upload_from_bytes(b"new")
+        self.assertEqual(self.http.bucket_lists, 2)
+        self.assertEqual(len(self.http.posts), 3)
+        sha_old = hashlib.sha256(b"old").hexdigest()
+        sha_new = hashlib.sha256(b"new").hexdigest()
+        self.assertIsNone(self.cache.uploaded_url("https://ref.supabase.co/bucket", sha_old))
+        self.assertEqual(self.cache.uploaded_url("https://ref.supabase.co/bucket", sha_new), url)
+
+
+class TestStreamingTransfer(unittest.TestCase):
+    """Testa o download em blocos e o upload a partir de arquivo."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = BlobCache(tmp.name)
+        self.addCleanup(self.cache.close)
+        self.body = os.urandom(200_000)  # maior que um bloco
+        self.http = FakeHttp({"https://cdn/big.png": self.body})
+
+    def make(self):
+        return SupabaseUploader("https://ref.supabase.co", "key", "bucket",
+                                transport=self.http, blob_cache=self.cache, buckets=BucketRegistry())
+
+    def test_download_streams_to_disk(self):
+        """O download pede stream e grava os blocos no blob do conteúdo."""
+        path, content_type = self.cache.fetch_path("https://cdn/big.png", http=self.http)
+        self.assertEqual(self.http.streamed, [True])
+        self.assertEqual(path.name, hashlib.sha256(self.body).hexdigest())
+        self.assertEqual(path.read_bytes(), self.body)
+        self.assertEqual(self.cache.summary()["bytes_downloaded"], len(self.body))
+
+    def test_upload_without_reencoding_sends_file(self):
+        """Sem conversão, o upload envia o arquivo do cache (não bytes em memória)."""
+        url = self.make().upload_from_url("https://cdn/big.png", force_jpeg=False)
+        (post_url, kwargs), = [p for p in self.http.posts if "/storage/v1/object/" in p[0]]
+        self.assertTrue(kwargs["streamed"])
+        self.assertEqual(kwargs["body"], self.body)
+        self.assertIn(hashlib.sha256(self.body).hexdigest(), post_url)
+        self.assertEqual(self.cache.lookup(url)[0], self.body)
+
+    def test_reencode_uploads_encoded_bytes(self):
+        """Com conversão, o JPEG do codificador é enviado como bytes e fica no cache sob a URL pública."""
+        from PIL import Image
+        import io
+        buf = io.BytesIO()
+        Image.new("RGBA", (64, 64), (200, 10, 10, 255)).save(buf, format="PNG")
+        self.http.bodies["https://cdn/img.png"] = buf.getvalue()
+        url = self.make().upload_from_url("https://cdn/img.png", force_jpeg=True)
+        (_, kwargs), = [p for p in self.http.posts if "/storage/v1/object/" in p[0]]
+        self.assertIsInstance(kwargs["data"], bytes)
+        self.assertTrue(kwargs["data"].startswith(b"\xff\xd8"))  # JPEG
+        self.assertTrue(url.endswith(".jpg"))
+        self.assertEqual(self.cache.lookup(url), (kwargs["data"], "image/jpeg"))
+
+    def test_jpeg_within_budget_streams_without_reencoding(self):
+        """Com conversão pedida, um JPEG de origem dentro do orçamento é enviado do arquivo."""
+        from PIL import Image
+        import io
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64), (10, 200, 10)).save(buf, format="JPEG")
+        self.http.bodies["https://cdn/img.jpg"] = buf.getvalue()
+        url = self.make().upload_from_url("https://cdn/img.jpg", force_jpeg=True)
+        (_, kwargs), = [p for p in self.http.posts if "/storage/v1/object/" in p[0]]
+        self.assertTrue(kwargs["streamed"])
+        self.assertEqual(kwargs["body"], buf.getvalue())
+        self.assertTrue(url.endswith(hashlib.sha256(buf.getvalue()).hexdigest() + ".jpg"))
+
+    def test_open_survives_eviction(self):
+        """O arquivo aberto segue legível após a evicção; um blob já removido é baixado de novo."""
+        f, _, sha = self.cache.open("https://cdn/big.png", http=self.http)
+        with f:
+            self.cache.path(sha).unlink()
+            self.assertEqual(f.read(), self.body)
+        f, _, _ = self.cache.open("https://cdn/big.png", http=self.http)
+        with f:
+            self.assertEqual(f.read(), self.body)
+        self.assertEqual(len(self.http.calls), 2)
+
+    def test_public_uploader_streams_from_cache(self):
+        """O `PublicUploader` envia o arquivo do cache e o fecha ao final."""
+        response = MagicMock()
+        response.text = "https://0x0.st/abc.png"
+        response.raise_for_status.return_value = None
+        sent = []
+
+        def post(url, files=None, **kwargs):
+            name, fileobj, content_type = files["file"]
+            sent.append((fileobj, fileobj.read(), content_type))
+            return response
+
+        self.http.post = post
+        uploader = PublicUploader(transport=self.http, blob_cache=self.cache)
+        self.assertEqual(uploader.upload_from_url("https://cdn/big.png"), "https://0x0.st/abc.png")
+        (fileobj, body, content_type), = sent
+        self.assertEqual(body, self.body)
+        self.assertEqual(content_type, "image/png")
+        self.assertTrue(fileobj.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
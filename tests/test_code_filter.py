@@ -0,0 +1,124 @@
+"""
+Testes para o filtro de Bloom de códigos conhecidos
+Valida ausência de falsos negativos, taxa de falsos positivos e carga incremental.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.code_filter import BloomFilter, KnownCodesFilter
+
+
+class FakeDatabase:
+    def __init__(self, queue, archive=()):
+        self.queue = list(queue)
+        self.archive = list(archive)
+        self.pages = []
+
+    def count_known_codes(self):
+        return len(self.queue) + len(self.archive)
+
+    def known_code_page(self, after_id, limit=10000, archive=False):
+        self.pages.append((after_id, archive))
+        rows = list(enumerate(self.archive if archive else self.queue, 1))
+        return [r for r in rows if r[0] > after_id][:limit]
+
+    def known_codes(self, codes):
+        return set(codes) & set(self.queue + self.archive)
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Testa `BloomFilter`."""
+
+    def test_no_false_negatives_and_bounded_fp_rate(self):
+        bloom = BloomFilter(5000, fp_rate=0.01)
+        for i in range(5000):
+            bloom.add(f"code{i}")
+        self.assertTrue(all(f"code{i}" in bloom for i in range(5000)))
+        false_positives = sum(1 for i in range(20000) if f"other{i}" in bloom)
+        self.assertLess(false_positives / 20000, 0.02)
+        self.assertAlmostEqual(bloom.expected_fp_rate(), 0.01, delta=0.005)
+
+
+class TestKnownCodesFilter(unittest.TestCase):
+    """Testa `KnownCodesFilter`."""
+
+    def test_loads_queue_and_archive_then_refreshes_incrementally(self):
+        db = FakeDatabase([f"q{i}" for i in range(25)], archive=["a1", "a2"])
+        known = KnownCodesFilter()
+        known.refresh(db, page_size=10)
+        self.assertEqual(known.candidates(["q0", "q24", "a2"]), ["q0", "q24", "a2"])
+        db.queue.append("q25")
+        db.pages = []
+        known.refresh(db, page_size=10)
+        self.assertEqual(db.pages, [(25, False)])
+        self.assertEqual(known.candidates(["q25"]), ["q25"])
+
+    def test_measures_false_positive_rate(self):
+        db = FakeDatabase([f"q{i}" for i in range(200)])
+        known = KnownCodesFilter(fp_rate=0.05)
+        known.refresh(db)
+        probe = [f"new{i}" for i in range(2000)] + ["q1"]
+        hits = known.candidates(probe)
+        known.record_check(hits, db.known_codes(hits))
+        summary = known.summary()
+        self.assertEqual(summary["lookups"], 2001)
+        self.assertEqual(summary["false_positives"], len(hits) - 1)
+        self.assertAlmostEqual(summary["measured_fp_rate"], (len(hits) - 1) / 2000, places=3)
+
+    def test_persisted_filter_skips_full_reload(self):
+        """Uma execução nova parte do arquivo salvo e só lê a fila acima da marca d'água."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "known.bloom")
+        db = FakeDatabase([f"q{i}" for i in range(25)], archive=["a1"])
+        KnownCodesFilter(path=path).refresh(db, page_size=10)
+
+        db.queue.append("q25")
+        db.pages = []
+        known = KnownCodesFilter(path=path)
+        known.refresh(db, page_size=10)
+        self.assertEqual(db.pages, [(25, False)])
+        self.assertEqual(known.candidates(["q0", "a1", "q25"]), ["q0", "a1", "q25"])
+        self.assertEqual(known.summary()["restored"], 1)
+        self.assertEqual(known.summary()["rebuilds"], 0)
+
+        # A marca d'água avançada também foi salva
+        db.pages = []
+        KnownCodesFilter(path=path).refresh(db, page_size=10)
+        self.assertEqual(db.pages, [(26, False)])
+
+    def test_stale_or_corrupt_file_rebuilds(self):
+        """Arquivo mais velho que `max_age` ou ilegível leva à carga completa."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "known.bloom")
+        now = [1000.0]
+        db = FakeDatabase(["q1"], archive=["a1"])
+        KnownCodesFilter(path=path, max_age=60, clock=lambda: now[0]).refresh(db)
+
+        now[0] += 61
+        db.pages = []
+        KnownCodesFilter(path=path, max_age=60, clock=lambda: now[0]).refresh(db)
+        self.assertIn((0, True), db.pages)
+
+        with open(path, "wb") as f:
+            f.write(b"garbage")
+        db.pages = []
+        known = KnownCodesFilter(path=path, max_age=60, clock=lambda: now[0])
+        known.refresh(db)
+        self.assertIn((0, True), db.pages)
+        self.assertEqual(known.candidates(["a1"]), ["a1"])
+
+    def test_without_load_every_code_is_a_candidate(self):
+        known = KnownCodesFilter()
+        self.assertEqual(known.candidates(["a", "b"]), ["a", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,338 @@
+"""
+Testes para a coleta de hashtags/usuários
+Valida a coleta paralela, o hedging entre hosts e a gravação em lotes.
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pipeline.collect as collect
+from services.host_health import HostScoreboard
+from services.rapidapi_client import RapidAPIError
+from services.code_filter import KnownCodesFilter
+
+
+def page(tag, count=2):
+    return {"items": [{"code": f"{tag}-{i}", "thumbnail_url": f"https://img/{tag}/{i}.jpg"} for i in range(count)]}
+
+
+def feed(codes, per_page=3):
+    """Feed paginado (mais recentes primeiro) no formato com pagination_token."""
+    def fetch(key, token=None):
+        start = int(token or 0)
+        chunk = codes[start:start + per_page]
+        data = {"items": [{"code": c, "thumbnail_url": f"https://img/{c}.jpg"} for c in chunk]}
+        if start + per_page < len(codes):
+            data["pagination_token"] = str(start + per_page)
+        return data
+    return fetch
+
+
+class FakeRapidAPI:
+    """Cliente falso: `behaviors[host]` decide a resposta de cada host."""
+
+    behaviors = {}
+    calls = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    cached_hosts = set()  # hosts cujas respostas (ou falhas) simulam vir do cache/coalescidas
+
+    def __init__(self, api_key, host):
+        self.host = host
+        self.from_network = host not in FakeRapidAPI.cached_hosts
+        self.network_calls = 0
+
+    def _run(self, key, token):
+        with FakeRapidAPI.lock:
+            FakeRapidAPI.calls.append((self.host, key))
+            FakeRapidAPI.tokens.append(token)
+            FakeRapidAPI.active += 1
+            FakeRapidAPI.max_active = max(FakeRapidAPI.max_active, FakeRapidAPI.active)
+        if self.from_network:
+            self.network_calls += 1
+        try:
+            behavior = FakeRapidAPI.behaviors[self.host]
+            return behavior(key, token) if token else behavior(key)
+        finally:
+            with FakeRapidAPI.lock:
+                FakeRapidAPI.active -= 1
+
+    def get_top_by_hashtag(self, tag, pagination_token=None):
+        return self._run(tag, pagination_token)
+
+    def get_user_posts(self, user, pagination_token=None):
+        return self._run(user, pagination_token)
+
+    @staticmethod
+    def next_cursor(data):
+        return data.get("pagination_token")
+
+    @staticmethod
+    def filter_images(data):
+        return [
+            {"prompt": "", "content_code": it["code"], "thumbnail_url": it["thumbnail_url"], "tag": ""}
+            for it in data.get("items", [])
+        ]
+
+
+class FakeDatabase:
+    batches = []
+    codes = set()
+    states = {}
+
+    def __init__(self, dsn):
+        pass
+
+    exact_checks = []
+
+    def insert_trends(self, items):
+        FakeDatabase.batches.append(list(items))
+        new = {i["content_code"] for i in items} - FakeDatabase.codes
+        FakeDatabase.codes |= new
+        return len(new)
+
+    def known_codes(self, codes):
+        FakeDatabase.exact_checks.append(list(codes))
+        return set(codes) & FakeDatabase.codes
+
+    def count_known_codes(self):
+        return len(FakeDatabase.codes)
+
+    def known_code_page(self, after_id, limit=10000, archive=False):
+        if archive:
+            return []
+        rows = list(enumerate(sorted(FakeDatabase.codes), 1))
+        return [r for r in rows if r[0] > after_id][:limit]
+
+    def load_collect_state(self, keys):
+        return {k: dict(FakeDatabase.states[k]) for k in keys if k in FakeDatabase.states}
+
+    def save_collect_state(self, states):
+        FakeDatabase.states.update(states)
+
+
+class TestCollect(unittest.TestCase):
+    """Testa `collect_hashtags` e `collect_userposts`."""
+
+    def setUp(self):
+        FakeRapidAPI.behaviors = {}
+        FakeRapidAPI.calls = []
+        FakeRapidAPI.tokens = []
+        FakeRapidAPI.active = 0
+        FakeRapidAPI.max_active = 0
+        FakeRapidAPI.cached_hosts = set()
+        FakeDatabase.batches = []
+        FakeDatabase.codes = set()
+        FakeDatabase.states = {}
+        FakeDatabase.exact_checks = []
+        self.scoreboard = HostScoreboard(failure_threshold=2)
+        self.known_filter = KnownCodesFilter()
+        for p in (
+            patch.object(collect, "get_known_codes_filter", lambda dsn: self.known_filter),
+            patch.object(collect, "get_host_scoreboard", lambda: self.scoreboard),
+            patch.object(collect, "RapidAPIClient", FakeRapidAPI),
+            patch.object(collect, "Database", FakeDatabase),
+            patch.dict(os.environ, {"RAPIDAPI_ALT_HOSTS": "alt1, alt2, primary", "RAPIDAPI_HEDGE_DELAY": "0.05"}),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_hosts_order_dedupes(self):
+        self.assertEqual(collect._hosts_order("primary"), ["primary", "alt1", "alt2"])
+
+    def test_parallel_collection_respects_concurrency(self):
+        """Todas as tags são coletadas, com no máximo `concurrency` chamadas simultâneas."""
+        def slow(tag):
+            time.sleep(0.05)
+            return page(tag)
+        FakeRapidAPI.behaviors = {"primary": slow}
+        tags = ["#a", "b ", "c", "d", "e", "f", "a"]
+        inserted = collect.collect_hashtags("k", "primary", "dsn", tags, concurrency=3, hedge=False)
+        self.assertEqual(inserted, 12)
+        self.assertEqual(sorted(k for _, k in FakeRapidAPI.calls), ["a", "b", "c", "d", "e", "f"])
+        self.assertGreater(FakeRapidAPI.max_active, 1)
+        self.assertLessEqual(FakeRapidAPI.max_active, 3)
+        tags_saved = {item["tag"] for batch in FakeDatabase.batches for item in batch}
+        self.assertEqual(tags_saved, {"a", "b", "c", "d", "e", "f"})
+
+    def test_sequential_fallback_to_alt_host(self):
+        """Sem hedge, um host com erro ou vazio passa a vez ao próximo."""
+        def fail(tag):
+            raise RapidAPIError(429)
+        FakeRapidAPI.behaviors = {"primary": fail, "alt1": lambda tag: {"items": []}, "alt2": page}
+        inserted = collect.collect_userposts("k", "primary", "dsn", ["user"], hedge=False)
+        self.assertEqual(inserted, 2)
+        self.assertEqual([h for h, _ in FakeRapidAPI.calls], ["primary", "alt1", "alt2"])
+
+    def test_failing_host_moves_behind_healthy_ones(self):
+        """Um host que falhou deixa de ser o primeiro tentado nas chaves seguintes."""
+        def fail(tag):
+            raise RapidAPIError(429)
+        FakeRapidAPI.behaviors = {"primary": fail, "alt1": page, "alt2": page}
+        inserted = collect.collect_hashtags("k", "primary", "dsn", ["a", "b", "c", "d"], concurrency=1, hedge=False)
+        self.assertEqual(inserted, 8)
+        primary_calls = [k for h, k in FakeRapidAPI.calls if h == "primary"]
+        self.assertEqual(primary_calls, ["a"])
+        summary = self.scoreboard.summary()
+        self.assertEqual(summary["primary"]["success_rate"], 0.0)
+        self.assertIsNotNone(summary["primary"]["last_429"])
+
+    def test_cached_responses_not_recorded(self):
+        """Respostas vindas do cache não contam como sucesso nem latência do host."""
+        FakeRapidAPI.behaviors = {"primary": page}
+        FakeRapidAPI.cached_hosts = {"primary"}
+        collect.collect_hashtags("k", "primary", "dsn", ["a", "b"], hedge=False)
+        self.assertEqual(self.scoreboard.summary()["primary"]["calls"], 0)
+        FakeRapidAPI.cached_hosts = set()
+        collect.collect_hashtags("k", "primary", "dsn", ["c"], hedge=False)
+        self.assertEqual(self.scoreboard.summary()["primary"]["calls"], 1)
+
+    def test_coalesced_failures_not_recorded(self):
+        """Falhas recebidas de uma chamada coalescida não contam contra o host."""
+        def fail(tag):
+            raise RapidAPIError(503)
+        FakeRapidAPI.behaviors = {"primary": fail, "alt1": page}
+        FakeRapidAPI.cached_hosts = {"primary"}
+        collect.collect_hashtags("k", "primary", "dsn", ["a", "b", "c"], concurrency=1, hedge=False)
+        self.assertEqual(self.scoreboard.summary()["primary"]["calls"], 0)
+        self.assertEqual(self.scoreboard.summary()["primary"]["circuit"], "closed")
+
+    def test_open_circuit_host_is_not_called(self):
+        """Com o circuito aberto o host não recebe chamadas."""
+        for _ in range(2):
+            self.scoreboard.record("alt1", False, 2.0)
+        FakeRapidAPI.behaviors = {"primary": lambda tag: {"items": []}, "alt2": page}
+        inserted = collect.collect_hashtags("k", "primary", "dsn", ["a"], hedge=False)
+        self.assertEqual(inserted, 2)
+        self.assertEqual([h for h, _ in FakeRapidAPI.calls], ["primary", "alt2"])
+
+    def test_hedged_first_good_response_wins(self):
+        """Com hedge, um host lento não segura a coleta: o mais rápido com dados vence."""
+        release = threading.Event()
+
+        def stuck(tag):
+            release.wait(2)
+            return page("lento")
+        FakeRapidAPI.behaviors = {"primary": stuck, "alt1": page, "alt2": page}
+        started = time.monotonic()
+        inserted = collect.collect_hashtags("k", "primary", "dsn", ["x"], hedge=True)
+        elapsed = time.monotonic() - started
+        release.set()
+        self.assertEqual(inserted, 2)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(FakeDatabase.batches[0][0]["content_code"], "x-0")
+        # alt2 nunca chega a ser disparado: alt1 respondeu antes do próximo hedge
+        self.assertNotIn("alt2", [h for h, _ in FakeRapidAPI.calls])
+
+    def test_discarded_hedge_not_recorded(self):
+        """A tentativa perdedora que termina depois do vencedor não entra no placar."""
+        release = threading.Event()
+        finished = threading.Event()
+
+        def stuck(tag):
+            release.wait(2)
+            finished.set()
+            return page("lento")
+        FakeRapidAPI.behaviors = {"primary": stuck, "alt1": page, "alt2": page}
+        collect.collect_hashtags("k", "primary", "dsn", ["x"], hedge=True)
+        release.set()
+        self.assertTrue(finished.wait(2))
+        time.sleep(0.05)
+        summary = self.scoreboard.summary()
+        self.assertEqual(summary["alt1"]["calls"], 1)
+        self.assertEqual(summary["primary"]["calls"], 0)
+
+    def test_batched_writes(self):
+        """Itens de várias chaves são agrupados em lotes de WRITE_BATCH_SIZE."""
+        FakeRapidAPI.behaviors = {"primary": lambda tag: page(tag, 3)}
+        with patch.object(collect, "WRITE_BATCH_SIZE", 5):
+            inserted = collect.collect_hashtags("k", "primary", "dsn", ["a", "b", "c", "d"], concurrency=2, hedge=False)
+        self.assertEqual(inserted, 12)
+        self.assertLess(len(FakeDatabase.batches), 4)
+        self.assertTrue(all(len(b) >= 5 for b in FakeDatabase.batches[:-1]))
+
+    def test_planner_fetches_shared_keys_once(self):
+        """Hashtags/usuários repetidos entre contas viram uma busca só, distribuída às contas."""
+        FakeRapidAPI.behaviors = {"primary": page}
+        accounts = [
+            {"nome": "a", "hashtags_pesquisa": ["#arte", "design"], "usernames": ["joao"]},
+            {"nome": "b", "hashtags_pesquisa": ["arte", " foto "]},
+            {"nome": "c", "hashtags_pesquisa": ["design"], "usernames": ["joao", "maria"]},
+        ]
+        plan = collect.plan_collection(accounts)
+        self.assertEqual(plan["hashtags"], ["arte", "design", "foto"])
+        self.assertEqual(plan["usernames"], ["joao", "maria"])
+        self.assertEqual(plan["requested"], 8)
+
+        results = collect.collect_for_accounts("k", "primary", "dsn", accounts, hedge=False)
+        self.assertEqual(sorted(k for _, k in FakeRapidAPI.calls), ["arte", "design", "foto", "joao", "maria"])
+        self.assertEqual([r["items"] for r in results], [6, 4, 6])
+        self.assertEqual(results[1]["hashtags"], ["arte", "foto"])
+        self.assertFalse(any(r["failed"] for r in results))
+
+    def test_first_run_fetches_one_page_and_saves_markers(self):
+        FakeRapidAPI.behaviors = {"primary": feed([f"c{i}" for i in range(9)])}
+        inserted = collect.collect_hashtags("k", "primary", "dsn", ["arte"], hedge=False)
+        self.assertEqual(inserted, 3)
+        self.assertEqual(FakeRapidAPI.tokens, [None])
+        state = FakeDatabase.states[("hashtag", "arte")]
+        self.assertEqual(state["last_codes"], ["c0", "c1", "c2"])
+        self.assertIsNone(state["cursor"])
+
+    def test_stops_at_known_content(self):
+        """Com o topo já conhecido, só a primeira página é pedida e só o novo é gravado."""
+        FakeRapidAPI.behaviors = {"primary": feed([f"c{i}" for i in range(9)])}
+        collect.collect_hashtags("k", "primary", "dsn", ["arte"], hedge=False)
+        FakeRapidAPI.tokens = []
+        FakeRapidAPI.behaviors = {"primary": feed(["n1"] + [f"c{i}" for i in range(9)])}
+        inserted = collect.collect_hashtags("k", "primary", "dsn", ["arte"], hedge=False)
+        self.assertEqual(inserted, 1)
+        self.assertEqual(FakeRapidAPI.tokens, [None])
+        self.assertEqual([i["content_code"] for i in FakeDatabase.batches[-1]], ["n1"])
+        self.assertEqual(FakeDatabase.states[("hashtag", "arte")]["last_codes"], ["n1", "c0", "c1"])
+
+    def test_follows_cursor_until_known_and_resumes_gap(self):
+        """Página toda nova: segue o cursor; se o limite acabar, a lacuna é retomada depois."""
+        FakeRapidAPI.behaviors = {"primary": feed(["c0", "c1", "c2"])}
+        collect.collect_userposts("k", "primary", "dsn", ["joao"], hedge=False)
+        newer = [f"n{i}" for i in range(8)]
+        FakeRapidAPI.behaviors = {"primary": feed(newer + ["c0", "c1", "c2"])}
+        FakeRapidAPI.tokens = []
+        with patch.dict(os.environ, {"COLLECT_MAX_PAGES": "2"}):
+            inserted = collect.collect_userposts("k", "primary", "dsn", ["joao"], hedge=False)
+            self.assertEqual(inserted, 6)
+            self.assertEqual(FakeRapidAPI.tokens, [None, "3"])
+            state = FakeDatabase.states[("user", "joao")]
+            self.assertEqual((state["cursor"], state["cursor_host"]), ("6", "primary"))
+
+            FakeRapidAPI.tokens = []
+            inserted = collect.collect_userposts("k", "primary", "dsn", ["joao"], hedge=False)
+        self.assertEqual(inserted, 2)
+        self.assertEqual(FakeRapidAPI.tokens, [None, "6"])
+        self.assertIsNone(FakeDatabase.states[("user", "joao")]["cursor"])
+
+    def test_bloom_filter_skips_exact_check_for_new_codes(self):
+        """Códigos fora do filtro não vão ao banco; só os acertos passam pela verificação exata."""
+        FakeDatabase.codes = {f"c{i}" for i in range(3)}
+        FakeRapidAPI.behaviors = {"primary": feed(["n0", "n1", "c0"])}
+        inserted = collect.collect_hashtags("k", "primary", "dsn", ["arte"], hedge=False)
+        self.assertEqual(inserted, 2)
+        self.assertEqual(FakeDatabase.exact_checks, [["c0"]])
+        summary = self.known_filter.summary()
+        self.assertEqual((summary["lookups"], summary["filter_hits"]), (3, 1))
+        self.assertEqual(summary["false_positives"], 0)
+        # Códigos gravados entram no filtro para as próximas coletas
+        self.assertEqual(self.known_filter.candidates(["n0", "n1"]), ["n0", "n1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
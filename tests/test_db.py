@@ -0,0 +1,275 @@
+"""
+Testes para a camada Database
+Usa um pool falso para validar a ingestão em lote.
+"""
+
+import unittest
+import os
+import sys
+from contextlib import contextmanager
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.db import Database, default_worker_id
+
+
+class FakeCursor:
+    """Simula ON CONFLICT (code) DO NOTHING RETURNING code sobre um conjunto de códigos."""
+
+    def __init__(self, store, statements):
+        self.store = store
+        self.statements = statements
+        self._returned = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.statements.append(sql)
+        self._returned = []
+        for i in range(0, len(params), 5):
+            code = params[i + 2]
+            if code not in self.store:
+                self.store.add(code)
+                self._returned.append((code,))
+
+    def fetchall(self):
+        return self._returned
+
+
+class FakePool:
+    def __init__(self):
+        self.store = set()
+        self.statements = []
+
+    @contextmanager
+    def connection(self):
+        conn = type("Conn", (), {})()
+        conn.cursor = lambda: FakeCursor(self.store, self.statements)
+        yield conn
+
+
+class TestInsertTrends(unittest.TestCase):
+    """Testa Database.insert_trends."""
+
+    def setUp(self):
+        self.db = Database.__new__(Database)
+        self.db.pool = FakePool()
+
+    def _items(self, codes):
+        return [{"prompt": "p", "thumbnail_url": "u", "content_code": c, "tag": "t"} for c in codes]
+
+    def test_single_round_trip_per_page(self):
+        """Uma página inteira vira um único INSERT multi-linha."""
+        inserted = self.db.insert_trends(self._items(["a", "b", "c"]))
+        self.assertEqual(inserted, 3)
+        self.assertEqual(len(self.db.pool.statements), 1)
+        self.assertIn("ON CONFLICT (code) DO NOTHING", self.db.pool.statements[0])
+        self.assertIn("RETURNING code", self.db.pool.statements[0])
+
+    def test_counts_only_new_rows(self):
+        """Códigos existentes e repetidos no lote não contam como novos."""
+        self.db.insert_trends(self._items(["a", "b"]))
+        self.assertEqual(self.db.insert_trends(self._items(["b", "c", "c", "d"])), 2)
+
+    def test_batches_large_pages(self):
+        """Páginas grandes são divididas em lotes."""
+        inserted = self.db.insert_trends(self._items([str(i) for i in range(25)]), batch_size=10)
+        self.assertEqual(inserted, 25)
+        self.assertEqual(len(self.db.pool.statements), 3)
+
+    def test_empty_page_does_not_query(self):
+        self.assertEqual(self.db.insert_trends([]), 0)
+        self.assertEqual(self.db.pool.statements, [])
+
+
+class RecordingCursor:
+    """Registra SQL/parâmetros e devolve linhas pré-definidas."""
+
+    def __init__(self, log, rows, rowcount):
+        self.log = log
+        self.rows = rows
+        self.rowcount = rowcount
+        self.description = [type("Col", (), {"name": n})() for n in ("prompt", "thumbnail_url", "code", "tag")]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.log.append((sql, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+
+class RecordingPool:
+    def __init__(self, rows=(), rowcount=1):
+        self.log = []
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    @contextmanager
+    def connection(self):
+        conn = type("Conn", (), {})()
+        conn.cursor = lambda: RecordingCursor(self.log, self.rows, self.rowcount)
+        yield conn
+
+
+class TestClaimQueue(unittest.TestCase):
+    """Testa a fila com leases (claim/complete/release)."""
+
+    def setUp(self):
+        self.db = Database.__new__(Database)
+
+    def test_claim_skips_locked_and_leased_rows(self):
+        """A reserva usa SKIP LOCKED, ignora leases ativas e grava worker e expiração."""
+        self.db.pool = RecordingPool(rows=[("p", "u", "c1", "t")])
+        rows = self.db.claim_unposted(2, worker_id="w1", lease_seconds=60)
+        self.assertEqual(rows, [{"prompt": "p", "thumbnail_url": "u", "code": "c1", "tag": "t"}])
+        sql, params = self.db.pool.log[0]
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+        self.assertIn("lease_expires_at < NOW()", sql)
+        self.assertNotIn("ANY", sql)
+        self.assertEqual(params, [2, "w1", 60])
+
+    def test_claim_filters_by_tags(self):
+        self.db.pool = RecordingPool()
+        self.db.claim_unposted(1, tags=["a", "b"], worker_id="w1")
+        sql, params = self.db.pool.log[0]
+        self.assertIn("tag = ANY(%s)", sql)
+        self.assertEqual(params, [["a", "b"], 1, "w1", 900])
+
+    def test_claim_with_empty_tags_returns_nothing(self):
+        self.db.pool = RecordingPool()
+        self.assertEqual(self.db.claim_unposted(1, tags=[]), [])
+        self.assertEqual(self.db.pool.log, [])
+
+    def test_complete_and_release(self):
+        """Concluir marca como postado; devolver só afeta leases do próprio worker."""
+        self.db.pool = RecordingPool(rowcount=1)
+        self.assertTrue(self.db.complete_claim("c1"))
+        self.assertIn("isposted = TRUE", self.db.pool.log[0][0])
+        self.assertTrue(self.db.release_claim("c1"))
+        sql, params = self.db.pool.log[1]
+        self.assertIn("claimed_by = %s", sql)
+        self.assertEqual(params, ("c1", default_worker_id()))
+
+
+class TestCollectState(unittest.TestCase):
+    """Testa o estado da coleta incremental e a consulta de códigos conhecidos."""
+
+    def setUp(self):
+        self.db = Database.__new__(Database)
+
+    def test_known_codes_checks_queue_and_archive(self):
+        self.db.pool = RecordingPool(rows=[("a",)])
+        self.assertEqual(self.db.known_codes(["a", "b"]), {"a"})
+        sql, params = self.db.pool.log[0]
+        self.assertIn("top_trends_archive", sql)
+        self.assertEqual(params, (["a", "b"], ["a", "b"]))
+        self.db.pool = RecordingPool()
+        self.assertEqual(self.db.known_codes([]), set())
+        self.assertEqual(self.db.pool.log, [])
+
+    def test_load_and_save_state(self):
+        self.db.pool = RecordingPool(rows=[("hashtag", "arte", ["c1", "c2"], "tok", "host-a")])
+        states = self.db.load_collect_state([("hashtag", "arte"), ("user", "joao")])
+        self.assertEqual(states, {("hashtag", "arte"): {"last_codes": ["c1", "c2"], "cursor": "tok", "cursor_host": "host-a"}})
+        self.assertEqual(self.db.pool.log[0][1], (["hashtag", "user"], ["arte", "joao"]))
+
+        self.db.pool = RecordingPool()
+        self.db.save_collect_state({
+            ("hashtag", "arte"): {"last_codes": ["c3"], "cursor": None, "cursor_host": None},
+            ("user", "joao"): {"last_codes": [], "cursor": "t", "cursor_host": "h"},
+        })
+        sql, params = self.db.pool.log[0]
+        self.assertEqual(len(self.db.pool.log), 1)
+        self.assertIn("ON CONFLICT (kind, key) DO UPDATE", sql)
+        self.assertEqual(params, ["hashtag", "arte", ["c3"], None, None, "user", "joao", [], "t", "h"])
+
+
+class TestArchivePosted(unittest.TestCase):
+    """Testa o arquivamento em lotes."""
+
+    def setUp(self):
+        self.db = Database.__new__(Database)
+
+    def test_counts_only_archived_rows_and_advances_by_id(self):
+        """Conflitos não contam nem encerram o laço cedo; o lote seguinte parte do último id."""
+        # Lote cheio com 1 conflito, depois lote parcial
+        self.db.pool = RecordingPool(rows=[(2, 10, 1), (1, 15, 1)])
+        self.assertEqual(self.db.archive_posted(30, batch_size=2), 2)
+        (sql, first), (_, second) = self.db.pool.log
+        self.assertIn("DELETE FROM top_trends t USING archived", sql)
+        self.assertIn("SELECT count(*) FROM moved", sql)
+        self.assertEqual(first, (30, 0, 2))
+        self.assertEqual(second, (30, 10, 2))
+
+    def test_empty_batch_stops(self):
+        self.db.pool = RecordingPool(rows=[(0, None, 0)])
+        self.assertEqual(self.db.archive_posted(), 0)
+        self.assertEqual(len(self.db.pool.log), 1)
+
+
+class TestPlanCheck(unittest.TestCase):
+    """Testa a verificação de plano por EXPLAIN."""
+
+    def setUp(self):
+        self.db = Database.__new__(Database)
+
+    def test_plan_using_partial_index(self):
+        self.db.explain_claim_candidates = lambda tags, limit, force_index=False: [
+            "Limit", "  ->  Index Scan using idx_top_trends_unposted_tag_created on top_trends"
+        ]
+        check = self.db.check_unposted_plan(["a"])
+        self.assertTrue(check["uses_index"])
+        self.assertTrue(check["index_usable"])
+
+    def test_seq_scan_on_small_table_is_reported_as_usable(self):
+        """Seq scan em tabela pequena: o plano forçado confirma que o índice atende."""
+        def explain(tags, limit, force_index=False):
+            if force_index:
+                return ["Bitmap Index Scan on idx_top_trends_unposted_tag_created"]
+            return ["Seq Scan on top_trends"]
+        self.db.explain_claim_candidates = explain
+        check = self.db.check_unposted_plan(["a"])
+        self.assertFalse(check["uses_index"])
+        self.assertTrue(check["index_usable"])
+
+    def test_explains_claim_query(self):
+        """O EXPLAIN é o da seleção de `claim_unposted` (lease, ANY e SKIP LOCKED)."""
+        log = []
+
+        class Conn:
+            def transaction(self):
+                return contextmanager(lambda: (yield))()
+
+            def cursor(self):
+                return RecordingCursor(log, [("Limit",)], 0)
+
+        @contextmanager
+        def connection():
+            yield Conn()
+
+        self.db.pool = type("Pool", (), {"connection": staticmethod(connection)})()
+        self.assertEqual(self.db.explain_claim_candidates(["a"], 5), ["Limit"])
+        sql, params = log[0]
+        self.assertTrue(sql.startswith("EXPLAIN"))
+        self.assertIn("tag = ANY(%s)", sql)
+        self.assertIn("lease_expires_at", sql)
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+        self.assertEqual(params, [["a"], 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Testes para as migrações versionadas do schema
+Usa uma conexão falsa para validar ordem, idempotência e registro.
+"""
+
+import unittest
+import os
+import sys
+from contextlib import contextmanager
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.db_migrations import MIGRATIONS, apply_migrations
+
+
+class FakeConnection:
+    def __init__(self, applied=()):
+        self.applied = list(applied)
+        self.executed = []
+        self.transactions = 0
+
+    @contextmanager
+    def transaction(self):
+        self.transactions += 1
+        yield
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                conn.executed.append(" ".join(sql.split()))
+                if sql.startswith("INSERT INTO schema_migrations"):
+                    conn.applied.append(params[0])
+
+            def fetchall(self):
+                return [(v,) for v in sorted(conn.applied)]
+
+        return Cursor()
+
+
+class TestMigrations(unittest.TestCase):
+    """Testa apply_migrations."""
+
+    def test_versions_are_unique_and_ordered(self):
+        versions = [v for v, _, _ in MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_applies_all_pending_in_order(self):
+        conn = FakeConnection()
+        self.assertEqual(apply_migrations(conn), [v for v, _, _ in MIGRATIONS])
+        self.assertEqual(conn.transactions, len(MIGRATIONS))
+        self.assertTrue(any("pg_advisory_lock" in sql for sql in conn.executed))
+        self.assertTrue(any("pg_advisory_unlock" in sql for sql in conn.executed))
+
+    def test_lock_taken_before_any_ddl(self):
+        """O lock vem antes do CREATE de schema_migrations e da leitura das versões."""
+        conn = FakeConnection()
+        apply_migrations(conn)
+        self.assertIn("pg_advisory_lock", conn.executed[0])
+        create = next(i for i, sql in enumerate(conn.executed) if "CREATE TABLE IF NOT EXISTS schema_migrations" in sql)
+        self.assertGreater(create, 0)
+        self.assertIn("pg_advisory_unlock", conn.executed[-1])
+
+    def test_skips_applied_versions(self):
+        conn = FakeConnection(applied=[1, 2])
+        self.assertEqual(apply_migrations(conn), [v for v, _, _ in MIGRATIONS if v > 2])
+        self.assertEqual(apply_migrations(conn), [])
+
+    def test_partial_index_migration(self):
+        """A fila de não postados tem índice parcial em (tag, created_at DESC)."""
+        sql = " ".join(dict((v, s) for v, _, s in MIGRATIONS)[3].split())
+        self.assertIn("ON top_trends (tag, created_at DESC) WHERE NOT isposted", sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
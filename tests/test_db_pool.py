@@ -0,0 +1,116 @@
+"""
+Testes para o pool de conexões Postgres
+Usa conexões falsas para validar reuso, limites, saúde e ociosidade.
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.executed = []
+
+    def execute(self, sql):
+        if self.closed:
+            raise RuntimeError("connection is closed")
+        self.executed.append(sql)
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Testa a classe ConnectionPool."""
+
+    def setUp(self):
+        self.created = []
+
+    def _connect(self, dsn):
+        conn = FakeConnection()
+        self.created.append(conn)
+        return conn
+
+    def _pool(self, **kwargs):
+        pool = ConnectionPool("postgresql://fake", connect=self._connect, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connections_are_reused(self):
+        """Uso sequencial reaproveita a mesma conexão."""
+        pool = self._pool(min_size=1, max_size=3)
+        for _ in range(10):
+            with pool.connection():
+                pass
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(pool.get_stats()["requests"], 10)
+
+    def test_configure_runs_once_per_connection(self):
+        """O setup roda ao abrir a conexão, não a cada uso."""
+        configured = []
+        pool = self._pool(min_size=1, max_size=2, configure=configured.append)
+        for _ in range(5):
+            with pool.connection():
+                pass
+        self.assertEqual(configured, self.created)
+
+    def test_max_size_blocks_and_times_out(self):
+        """Com o pool esgotado, a espera respeita o timeout."""
+        pool = self._pool(min_size=0, max_size=1, timeout=0.1)
+        conn = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+
+    def test_waiting_thread_gets_returned_connection(self):
+        """Uma thread esperando recebe a conexão devolvida."""
+        pool = self._pool(min_size=0, max_size=1, timeout=2)
+        conn = pool.getconn()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+        waiter.start()
+        time.sleep(0.05)
+        pool.putconn(conn)
+        waiter.join(1)
+        self.assertEqual(got, [conn])
+
+    def test_broken_connection_is_replaced(self):
+        """Conexões fechadas são descartadas e substituídas."""
+        pool = self._pool(min_size=1, max_size=2)
+        with pool.connection() as conn:
+            conn.close()
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+        self.assertEqual(pool.get_stats()["connections_discarded"], 1)
+
+    def test_health_check_after_idle(self):
+        """Conexões paradas além de check_after são validadas com SELECT 1."""
+        pool = self._pool(min_size=1, max_size=1, check_after=0)
+        with pool.connection() as conn:
+            pass
+        self.assertIn("SELECT 1", conn.executed)
+
+    def test_idle_connections_above_min_are_closed(self):
+        """Conexões ociosas além do mínimo expiram após max_idle."""
+        pool = self._pool(min_size=1, max_size=3, max_idle=0.01)
+        conns = [pool.getconn() for _ in range(3)]
+        for conn in conns:
+            pool.putconn(conn)
+        time.sleep(0.02)
+        with pool.connection():
+            pass
+        self.assertEqual(pool.get_stats()["pool_size"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+"""
+Testes para o pipeline de geração e publicação
+Valida a geração única de imagem e os contadores de uso do resultado.
+"""
+
+import unittest
+import asyncio
+import threading
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pipeline.generate_and_publish as gp
+
+
+class FakeOpenAI:
+    described = []
+
+    def __init__(self, api_key):
+        pass
+
+    def generate_content_from_prompt(self, prompt):
+        return "conteúdo sobre liderança"
+
+    def describe_image(self, image_url, custom_prompt=None):
+        FakeOpenAI.described.append(image_url)
+        return "descrição"
+
+    def generate_caption_with_prompt(self, prompt):
+        return "legenda"
+
+    def generate_caption(self, description, style=None):
+        return "legenda"
+
+
+class FakeReplicate:
+    prompts = []
+
+    def __init__(self, token):
+        pass
+
+    def generate_image(self, prompt):
+        FakeReplicate.prompts.append(prompt)
+        return f"https://replicate/{len(FakeReplicate.prompts)}.png"
+
+
+class FakeInstagram:
+    def __init__(self, *args):
+        pass
+
+    def prepare_media(self, image_url, caption):
+        return "creation"
+
+    def poll_media_status(self, creation_id):
+        return "FINISHED"
+
+    def publish_media(self, creation_id):
+        return "media"
+
+    def poll_published_status(self, media_id):
+        return "PUBLISHED"
+
+
+class FakeSupabaseUploader:
+    def __init__(self, *args):
+        pass
+
+    def upload_from_url(self, image_url, force_jpeg=False):
+        return image_url + "?hosted"
+
+
+class TestGenerateAndPublish(unittest.TestCase):
+    """Testa o fluxo texto-primeiro de `generate_and_publish`."""
+
+    KWARGS = dict(
+        openai_key="k",
+        replicate_token="t",
+        instagram_business_id="1",
+        instagram_access_token="EAAtoken",
+        telegram_bot_token="b",
+        telegram_chat_id="c",
+        source_image_url="https://origem/img.jpg",
+        content_prompt="tema",
+        caption_prompt="Legenda: {descricao}",
+        use_weekly_themes=False,
+        supabase_url="https://supa",
+        supabase_service_key="key",
+        supabase_bucket="bucket",
+    )
+
+    def setUp(self):
+        FakeReplicate.prompts = []
+        FakeOpenAI.described = []
+        patches = [
+            patch.object(gp, "OpenAIClient", FakeOpenAI),
+            patch.object(gp, "ReplicateClient", FakeReplicate),
+            patch.object(gp, "InstagramClient", FakeInstagram),
+            patch.object(gp, "TelegramClient", MagicMock()),
+            patch.object(gp, "SupabaseUploader", FakeSupabaseUploader),
+            patch.object(gp, "track_post_performance", MagicMock()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_single_generation_and_upload(self):
+        """A imagem é gerada uma única vez, a partir do conteúdo, e re-hospedada uma vez."""
+        result = gp.generate_and_publish(**self.KWARGS)
+        self.assertEqual(len(FakeReplicate.prompts), 1)
+        self.assertEqual(result["generated_image_url"], "https://replicate/1.png?hosted")
+        self.assertEqual(result["usage"], {"replicate_generations": 1, "uploads": 1})
+
+    def test_async_matches_sync_usage(self):
+        """A versão assíncrona consome os mesmos recursos."""
+        result = asyncio.run(gp.generate_and_publish_async(**self.KWARGS))
+        self.assertEqual(len(FakeReplicate.prompts), 1)
+        self.assertEqual(result["usage"], {"replicate_generations": 1, "uploads": 1})
+
+    def test_async_weekly_theme_runs_off_event_loop(self):
+        """O tema semanal (arquivos/SDKs síncronos) roda em thread, sem travar o loop."""
+        threads = []
+
+        def apply_theme(content_prompt, replicate_prompt, *args):
+            threads.append(threading.current_thread())
+            return content_prompt, replicate_prompt, {}
+
+        with patch.object(gp, "_apply_weekly_theme", apply_theme):
+            asyncio.run(gp.generate_and_publish_async(**dict(self.KWARGS, use_weekly_themes=True)))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_image_prompt_honors_account_prompt_and_style(self):
+        """O prompt da conta/CLI e o estilo entram na única geração (sync e async)."""
+        kwargs = dict(self.KWARGS, replicate_prompt="fotografia aérea ao pôr do sol", caption_style="minimalista")
+        for run in (gp.generate_and_publish, lambda **kw: asyncio.run(gp.generate_and_publish_async(**kw))):
+            FakeReplicate.prompts = []
+            run(**kwargs)
+            self.assertEqual(len(FakeReplicate.prompts), 1)
+            self.assertIn("fotografia aérea ao pôr do sol", FakeReplicate.prompts[0])
+            self.assertIn("Estilo adicional: minimalista.", FakeReplicate.prompts[0])
+
+    def test_disabled_replicate_only_rehosts(self):
+        """Sem Replicate, apenas a imagem original é re-hospedada."""
+        result = gp.generate_and_publish(**dict(self.KWARGS, disable_replicate=True))
+        self.assertEqual(FakeReplicate.prompts, [])
+        self.assertEqual(result["replicate_error"], "DISABLED")
+        self.assertEqual(result["generated_image_url"], "https://origem/img.jpg?hosted")
+        self.assertEqual(result["usage"], {"replicate_generations": 0, "uploads": 1})
+
+    def test_uploads_count_only_successful_attempts(self):
+        """Falha no Supabase com fallback conta um upload; sem fallback, nenhum."""
+        public = MagicMock()
+        public.return_value.upload_from_url.side_effect = lambda url: url + "?public"
+        failing = MagicMock()
+        failing.return_value.upload_from_url.side_effect = RuntimeError("supabase fora")
+        with patch.object(gp, "SupabaseUploader", failing), patch.object(gp, "PublicUploader", public):
+            usage = gp._new_usage()
+            self.assertEqual(gp._rehost_image("https://x/a.png", "u", "k", "b", usage), "https://x/a.png?public")
+            self.assertEqual(usage["uploads"], 1)
+            public.return_value.upload_from_url.side_effect = RuntimeError("público fora")
+            usage = gp._new_usage()
+            self.assertEqual(gp._rehost_image("https://x/a.png", "u", "k", "b", usage), "https://x/a.png")
+            self.assertEqual(usage["uploads"], 0)
+
+    def test_final_description_skipped_by_default(self):
+        """Sem consumidor, a imagem final não é baixada nem descrita."""
+        result = gp.generate_and_publish(**self.KWARGS)
+        self.assertEqual(FakeOpenAI.described, [])
+        self.assertNotIn("final_description", result)
+
+    def test_final_description_runs_after_publish_when_requested(self):
+        """Com validate_image, a descrição da imagem publicada entra no resultado."""
+        for run in (gp.generate_and_publish, lambda **kw: asyncio.run(gp.generate_and_publish_async(**kw))):
+            FakeOpenAI.described = []
+            result = run(**dict(self.KWARGS, validate_image=True))
+            self.assertEqual(result["status"], "PUBLISHED")
+            self.assertEqual(FakeOpenAI.described, [result["generated_image_url"]])
+            self.assertEqual(result["final_description"], "descrição")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Testes para o placar de saúde dos hosts da RapidAPI
+Valida a ordenação dinâmica, o circuit breaker e a persistência.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.host_health import HostScoreboard, OPEN, CLOSED
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHostScoreboard(unittest.TestCase):
+    """Testa `HostScoreboard`."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.board = HostScoreboard(failure_threshold=3, open_seconds=60, clock=self.clock)
+
+    def test_unknown_hosts_keep_configured_order(self):
+        self.assertEqual(self.board.order(["a", "b", "c"]), ["a", "b", "c"])
+
+    def test_orders_by_success_rate_then_latency(self):
+        self.board.record("a", True, 0.1)
+        self.board.record("a", False, 2.0)
+        self.board.record("b", True, 0.9)
+        self.board.record("c", True, 0.2)
+        self.assertEqual(self.board.order(["a", "b", "c"]), ["c", "b", "a"])
+
+    def test_recent_429_is_penalized(self):
+        self.board.record("a", False, 0.1, status=429)
+        self.board.record("a", True, 0.1)
+        self.board.record("b", True, 0.5)
+        self.board.record("b", False, 0.5)
+        self.assertEqual(self.board.order(["a", "b"]), ["b", "a"])
+        self.clock.now += 600
+        self.assertEqual(self.board.order(["a", "b"]), ["a", "b"])
+
+    def test_circuit_opens_and_half_opens(self):
+        for _ in range(3):
+            self.board.record("a", False, 2.0)
+        self.assertFalse(self.board.is_available("a"))
+        self.assertEqual(self.board.order(["a", "b"]), ["b"])
+        self.clock.now += 61
+        self.assertIn("a", self.board.order(["a", "b"]))
+        # Falha em prova reabre imediatamente
+        self.board.record("a", False, 2.0)
+        self.assertEqual(self.board.summary()["a"]["circuit"], OPEN)
+        self.clock.now += 61
+        self.board.order(["a"])
+        self.board.record("a", True, 0.3)
+        self.assertEqual(self.board.summary()["a"]["circuit"], CLOSED)
+
+    def test_all_open_returns_oldest(self):
+        for host in ("a", "b"):
+            for _ in range(3):
+                self.board.record(host, False, 1.0)
+            self.clock.now += 1
+        self.assertEqual(self.board.order(["b", "a"]), ["a"])
+
+    def test_summary_percentiles_and_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "health.json")
+            board = HostScoreboard(path, failure_threshold=2, clock=self.clock)
+            for latency in (0.1, 0.2, 0.3, 0.4, 1.0):
+                board.record("a", True, latency)
+            board.record("b", False, 1.0)
+            board.record("b", False, 1.0)
+            board.save()
+            reloaded = HostScoreboard(path, failure_threshold=2, clock=self.clock)
+            summary = reloaded.summary()
+            self.assertEqual(summary["a"]["p50_ms"], 300.0)
+            self.assertEqual(summary["a"]["p95_ms"], 1000.0)
+            self.assertEqual(summary["b"]["circuit"], OPEN)
+            self.assertEqual(reloaded.order(["b", "a"]), ["a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
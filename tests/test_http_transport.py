@@ -0,0 +1,116 @@
+"""
+Testes para a camada de transporte HTTP compartilhada
+Valida reuso de conexões keep-alive, timeout padrão e métricas por host.
+"""
+
+import unittest
+import os
+import sys
+import threading
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services import http_transport
+from services.http_transport import HttpTransport
+
+try:
+    import httpx
+except ImportError:  # httpx é opcional (HTTP/2)
+    httpx = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_GET(self):
+        _Handler.connections.add(self.client_address)
+        if self.path.startswith("/grande"):
+            body = b"x" * 200_000
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        status = 503 if self.path.startswith("/erro") else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpTransport(unittest.TestCase):
+    """Testa a classe HttpTransport contra um servidor local."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _Handler.connections = set()
+        self.transport = HttpTransport(timeout=(2, 5), max_retries=0)
+        self.addCleanup(self.transport.close)
+
+    def test_connections_are_reused(self):
+        """Chamadas sequenciais ao mesmo host reutilizam a conexão."""
+        for _ in range(5):
+            resp = self.transport.get(f"{self.base}/item")
+            self.assertTrue(resp.ok)
+            self.assertEqual(resp.json(), {"ok": True})
+        self.assertEqual(len(_Handler.connections), 1)
+
+    def test_metrics_per_host(self):
+        """Métricas contam chamadas, erros e status por host."""
+        self.transport.get(f"{self.base}/item")
+        self.transport.get(f"{self.base}/erro")
+        host = f"127.0.0.1:{self.server.server_port}"
+        metrics = self.transport.metrics()[host]
+        self.assertEqual(metrics["requests"], 2)
+        self.assertEqual(metrics["errors"], 1)
+        self.assertEqual(metrics["statuses"], {200: 1, 503: 1})
+        self.transport.reset_metrics()
+        self.assertEqual(self.transport.metrics(), {})
+
+    def test_connection_failure_is_recorded(self):
+        """Falhas de conexão propagam a exceção e contam como erro."""
+        with self.assertRaises(Exception):
+            self.transport.get("http://127.0.0.1:9/")
+        self.assertEqual(self.transport.metrics()["127.0.0.1:9"]["errors"], 1)
+
+
+    @unittest.skipIf(httpx is None, "httpx não instalado")
+    def test_httpx_backend_streams_body(self):
+        """Com stream=True o backend httpx lê o corpo em blocos, sob demanda."""
+        # Sem o pacote h2 o módulo desliga o httpx; HTTP/1.1 basta para testar o adaptador
+        patcher = patch.object(http_transport, "httpx", httpx)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.transport._httpx_client = httpx.Client()
+        resp = self.transport.get(f"{self.base}/grande", stream=True)
+        self.assertFalse(resp._response.is_stream_consumed)
+        chunks = list(resp.iter_content(64 * 1024))
+        self.assertEqual([len(c) for c in chunks], [65536, 65536, 65536, 3392])
+        self.assertTrue(resp._response.is_closed)
+        self.assertEqual(self.transport.get(f"{self.base}/item").json(), {"ok": True})
+        streamed = self.transport.get(f"{self.base}/item", stream=True)
+        self.assertEqual(streamed.json(), {"ok": True})
+
+
+if __name__ == '__main__':
+    unittest.main()
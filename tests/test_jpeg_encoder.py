@@ -0,0 +1,95 @@
+"""
+Testes para o codificador JPEG com orçamento de bytes
+Valida a busca de qualidade, o palpite memorizado por classe e os relatórios.
+"""
+
+import unittest
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.blob_cache import BlobCache
+from services.jpeg_encoder import JpegEncoder
+from services.stories_image_processor import StoriesImageProcessor
+
+
+def noisy_image(width=540, height=960, seed=0):
+    """Imagem com ruído (difícil de comprimir: o tamanho varia bastante com a qualidade)."""
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 40, (height, width, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), "RGB")
+
+
+class TestJpegEncoder(unittest.TestCase):
+    """Testa `JpegEncoder`."""
+
+    def setUp(self):
+        self.image = noisy_image()
+
+    def test_fits_budget_with_highest_quality(self):
+        """O resultado cabe no orçamento e a qualidade seguinte já não caberia."""
+        encoder = JpegEncoder(target_bytes=120 * 1024, min_quality=30, max_quality=95)
+        result = encoder.encode(self.image, "feed")
+        self.assertLessEqual(result.size, 120 * 1024)
+        self.assertFalse(result.over_budget)
+        self.assertEqual(Image.open(io.BytesIO(result.data)).format, "JPEG")
+        if result.quality < 95 and result.size < 0.9 * 120 * 1024:
+            bigger = encoder._encode_once(self.image, result.quality + 1, True, "4:2:0")
+            self.assertGreater(len(bigger), 120 * 1024)
+
+    def test_small_image_keeps_max_quality(self):
+        """Uma imagem que já cabe sai na qualidade máxima com uma única tentativa."""
+        encoder = JpegEncoder(target_bytes=900 * 1024, max_quality=90)
+        result = encoder.encode(Image.new("RGB", (200, 200), (10, 120, 200)))
+        self.assertEqual(result.quality, 90)
+        self.assertEqual(result.probes, 1)
+
+    def test_class_guess_reduces_probes(self):
+        """A segunda imagem da classe parte da qualidade memorizada."""
+        encoder = JpegEncoder(target_bytes=120 * 1024, min_quality=30, max_quality=95)
+        first = encoder.encode(self.image, "stories")
+        second = encoder.encode(noisy_image(seed=1), "stories")
+        self.assertLess(second.probes, first.probes)
+        self.assertLessEqual(second.size, 120 * 1024)
+
+    def test_over_budget_returns_min_quality(self):
+        """Sem qualidade que caiba, devolve a mínima e sinaliza o estouro."""
+        encoder = JpegEncoder(target_bytes=2 * 1024, min_quality=50, max_quality=90)
+        result = encoder.encode(self.image, "feed")
+        self.assertEqual(result.quality, 50)
+        self.assertTrue(result.over_budget)
+        self.assertEqual(encoder.summary()["feed"]["over_budget"], 1)
+
+    def test_summary_reports_size_and_time(self):
+        """O resumo por classe traz tamanho, tempo e tentativas médias."""
+        encoder = JpegEncoder(target_bytes=120 * 1024, min_quality=30)
+        result = encoder.encode(self.image.convert("RGBA"), "feed", progressive=False, subsampling="4:4:4")
+        self.assertFalse(result.progressive)
+        self.assertEqual(result.subsampling, "4:4:4")
+        self.assertGreaterEqual(result.encode_ms, 0)
+        summary = encoder.summary()["feed"]
+        self.assertEqual(summary["images"], 1)
+        self.assertEqual(summary["quality"], result.quality)
+        self.assertAlmostEqual(summary["avg_kb"], round(result.size / 1024, 1))
+
+    def test_stories_fixed_quality_still_supported(self):
+        """Com `quality` explícita os Stories mantêm a codificação fixa."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = BlobCache(tmp.name)
+        self.addCleanup(cache.close)
+        processor = StoriesImageProcessor(blob_cache=cache)
+        data = processor.encode_processed_image(self.image, quality=80)
+        self.assertEqual(Image.open(io.BytesIO(data)).format, "JPEG")
+
+
+if __name__ == '__main__':
+    unittest.main()
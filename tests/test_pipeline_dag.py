@@ -0,0 +1,59 @@
+"""
+Testes para o executor assíncrono de estágios do pipeline
+Valida ordem de dependências, paralelismo e propagação de erros.
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+import time
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pipeline.dag import PipelineDAG
+
+
+class TestPipelineDAG(unittest.TestCase):
+    """Testa a classe PipelineDAG."""
+
+    def test_dependencies_receive_results(self):
+        """Estágios recebem os resultados das dependências como argumentos."""
+        dag = PipelineDAG()
+        dag.add("a", lambda: 2)
+        dag.add("b", lambda: 3, blocking=False)
+        dag.add("soma", lambda a, b: a + b, deps=("a", "b"))
+        results = asyncio.run(dag.run())
+        self.assertEqual(results, {"a": 2, "b": 3, "soma": 5})
+        self.assertEqual(set(dag.timings), {"a", "b", "soma"})
+
+    def test_independent_blocking_stages_overlap(self):
+        """Estágios bloqueantes independentes rodam em paralelo."""
+        dag = PipelineDAG()
+        dag.add("imagem", lambda: time.sleep(0.3) or "url")
+        dag.add("legenda", lambda: time.sleep(0.3) or "texto")
+        started = time.perf_counter()
+        asyncio.run(dag.run())
+        self.assertLess(time.perf_counter() - started, 0.55)
+
+    def test_undeclared_dependency_is_rejected(self):
+        """Dependências precisam ser declaradas antes (evita ciclos)."""
+        dag = PipelineDAG()
+        with self.assertRaises(ValueError):
+            dag.add("b", lambda a: a, deps=("a",))
+
+    def test_stage_error_propagates(self):
+        """Erros de um estágio interrompem o pipeline."""
+        def falha():
+            raise RuntimeError("Replicate indisponível")
+
+        dag = PipelineDAG()
+        dag.add("imagem", falha)
+        dag.add("depois", lambda imagem: imagem, deps=("imagem",))
+        with self.assertRaises(RuntimeError):
+            asyncio.run(dag.run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Testes para os limites de concorrência por provedor
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.provider_limits import ProviderLimiter
+
+
+class TestProviderLimiter(unittest.TestCase):
+    """Testa a classe ProviderLimiter."""
+
+    def _peak_concurrency(self, limiter, provider, workers=6):
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def call(_):
+            with limiter.slot(provider):
+                with lock:
+                    state["active"] += 1
+                    state["peak"] = max(state["peak"], state["active"])
+                time.sleep(0.05)
+                with lock:
+                    state["active"] -= 1
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(call, range(workers)))
+        return state["peak"]
+
+    def test_limit_caps_concurrent_calls(self):
+        """Com limite configurado, nunca passa do máximo de chamadas simultâneas."""
+        limiter = ProviderLimiter()
+        limiter.configure("openai", 2)
+        self.assertEqual(self._peak_concurrency(limiter, "openai"), 2)
+        self.assertEqual(limiter.limits(), {"openai": 2})
+
+    def test_unconfigured_provider_is_unbounded(self):
+        """Provedores sem limite não bloqueiam."""
+        limiter = ProviderLimiter()
+        self.assertEqual(self._peak_concurrency(limiter, "replicate"), 6)
+
+    def test_zero_removes_limit(self):
+        """Limite zero/None remove a restrição."""
+        limiter = ProviderLimiter()
+        limiter.configure("graph_api", 1)
+        limiter.configure("graph_api", 0)
+        self.assertEqual(limiter.limits(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Testes para o cache de respostas da RapidAPI
+Valida as duas camadas, TTL, evicção por orçamento em bytes e contadores.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.response_cache import ResponseCache, cache_key, purge_legacy_files
+from services.rapidapi_client import RapidAPIClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    """Testa `ResponseCache`."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = FakeClock()
+
+    def make(self, memory=10_000, disk=10_000):
+        cache = ResponseCache(self.tmp.name, memory_budget_bytes=memory, disk_budget_bytes=disk, clock=self.clock)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_memory_then_disk_hits(self):
+        """Um processo novo encontra a entrada no disco e a promove para a memória."""
+        first = self.make()
+        first.put("k", "https://h/x", {"items": [1]}, ttl_seconds=60)
+        self.assertEqual(first.get("k"), {"items": [1]})
+        self.assertEqual(first.stats()["memory_hits"], 1)
+
+        second = self.make()
+        self.assertEqual(second.get("k"), {"items": [1]})
+        self.assertEqual(second.get("k"), {"items": [1]})
+        stats = second.stats()
+        self.assertEqual((stats["disk_hits"], stats["memory_hits"], stats["misses"]), (1, 1, 0))
+
+    def test_ttl_expiry(self):
+        cache = self.make()
+        cache.put("k", "https://h/x", {"a": 1}, ttl_seconds=10)
+        self.clock.now += 11
+        self.assertIsNone(cache.get("k"))
+        stats = cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["disk_entries"], 0)
+
+    def test_lru_eviction_by_bytes(self):
+        """Acima do orçamento saem primeiro as expiradas, depois as menos usadas."""
+        payload = {"blob": "x" * 80}
+        cache = self.make(memory=300, disk=300)
+        cache.put("expira", "u", payload, ttl_seconds=1)
+        cache.put("a", "u", payload, ttl_seconds=60)
+        cache.put("b", "u", payload, ttl_seconds=60)
+        self.clock.now += 2
+        cache.get("a")  # "a" passa a ser a mais recente; "b" vira a menos usada
+        cache.put("c", "u", payload, ttl_seconds=60)
+        cache.put("d", "u", payload, ttl_seconds=60)
+        stats = cache.stats()
+        self.assertLessEqual(stats["memory_bytes"], 300)
+        self.assertLessEqual(stats["disk_bytes"], 300)
+        self.assertGreaterEqual(stats["expired"], 1)
+        self.assertEqual(stats["memory_evictions"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("d"))
+        self.assertEqual(cache.stats()["memory_hits"], 3)
+
+    def test_running_disk_total_matches_table(self):
+        """A ocupação mantida em memória acompanha gravações, substituições, expiração, evicção e limpeza."""
+        payload = {"blob": "x" * 80}
+        cache = self.make(memory=10_000, disk=300)
+
+        def assert_total():
+            self.assertEqual(cache._disk_bytes, cache.stats()["disk_bytes"])
+
+        cache.put("expira", "u", payload, ttl_seconds=1)
+        cache.put("a", "u", payload, ttl_seconds=60)
+        cache.put("a", "u", {"blob": "y"}, ttl_seconds=60)  # substitui com outro tamanho
+        assert_total()
+        self.clock.now += 2
+        cache._memory.clear()
+        self.assertIsNone(cache.get("expira"))  # expirada removida na leitura do disco
+        assert_total()
+        for key in ("b", "c", "d", "e"):
+            cache.put(key, "u", payload, ttl_seconds=60)
+            assert_total()
+        self.assertGreater(cache.stats()["disk_evictions"], 0)
+        cache.clear(key="e")
+        assert_total()
+        self.assertEqual(self.make()._disk_bytes, cache.stats()["disk_bytes"])
+
+    def test_clear_and_lifetime_stats(self):
+        cache = self.make()
+        cache.put("k1", "https://api2/hashtag", {"a": 1}, ttl_seconds=60)
+        cache.put("k2", "https://alt/userposts", {"a": 2}, ttl_seconds=60)
+        self.assertEqual(cache.clear(url_contains="userposts"), 1)
+        self.assertIsNone(cache.get("k2"))
+        self.assertIsNotNone(cache.get("k1"))
+        cache.close()
+        reopened = self.make()
+        self.assertEqual(reopened.lifetime_stats()["misses"], 1)
+        self.assertEqual(reopened.lifetime_stats()["memory_hits"], 1)
+
+    def test_purge_legacy_files(self):
+        """Só os JSON por chave e o índice do cache antigo são apagados; o SQLite fica."""
+        cache = self.make()
+        cache.put("k", "https://h/x", {"a": 1}, ttl_seconds=60)
+        legacy = [os.path.join(self.tmp.name, name) for name in ("a" * 40 + ".json", "index.json")]
+        other = os.path.join(self.tmp.name, "notes.json")
+        for path in legacy + [other]:
+            with open(path, "w") as f:
+                f.write("{}")
+        self.assertEqual(purge_legacy_files(self.tmp.name), 2)
+        self.assertFalse(any(os.path.exists(path) for path in legacy))
+        self.assertTrue(os.path.exists(other))
+        self.assertEqual(cache.get("k"), {"a": 1})
+        self.assertEqual(purge_legacy_files(self.tmp.name), 0)
+        self.assertEqual(purge_legacy_files(os.path.join(self.tmp.name, "missing")), 0)
+
+    def test_clients_share_cache(self):
+        """Clientes diferentes (um por host/tag) reaproveitam a mesma resposta."""
+        cache = self.make()
+        transport = MagicMock()
+        transport.get.return_value.status_code = 200
+        transport.get.return_value.json.return_value = {"items": [{"code": "c1"}]}
+        for _ in range(3):
+            client = RapidAPIClient("k", "instagram-scraper-api2.p.rapidapi.com", transport=transport, cache=cache)
+            client.get_top_by_hashtag("arte")
+        self.assertEqual(transport.get.call_count, 1)
+        url = "https://instagram-scraper-api2.p.rapidapi.com/v1/hashtag"
+        self.assertIsNotNone(cache.get(cache_key(url, {"hashtag": "arte", "feed_type": "top"})))
+
+
+if __name__ == '__main__':
+    unittest.main()
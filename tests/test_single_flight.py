@@ -0,0 +1,117 @@
+"""
+Testes para a coalescência de chamadas idênticas (single-flight)
+Valida que chamadas simultâneas à mesma chave executam uma vez só.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.single_flight import SingleFlight
+from services.response_cache import ResponseCache
+from services.rapidapi_client import RapidAPIClient, RapidAPIError
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Testa `SingleFlight`."""
+
+    def run_concurrently(self, func, count=5):
+        results, errors = [], []
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            try:
+                results.append(func())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        executions = []
+
+        def slow():
+            executions.append(1)
+            time.sleep(0.1)
+            return {"ok": True}
+        results, errors = self.run_concurrently(lambda: flight.do("k", slow))
+        self.assertEqual(errors, [])
+        self.assertEqual(len(executions), 1)
+        self.assertEqual([r[0] for r in results], [{"ok": True}] * 5)
+        self.assertEqual(sum(1 for _, shared in results if shared), 4)
+        self.assertEqual(flight.stats, {"calls": 1, "coalesced": 4})
+
+    def test_errors_are_shared_and_key_released(self):
+        flight = SingleFlight()
+
+        def boom():
+            time.sleep(0.05)
+            raise RuntimeError("HTTP 503")
+        results, errors = self.run_concurrently(lambda: flight.do("k", boom), count=3)
+        self.assertEqual(len(errors), 3)
+        # Depois de terminar, uma nova chamada executa de novo
+        self.assertEqual(flight.do("k", lambda: 42), (42, False))
+
+    def test_rapidapi_clients_coalesce_identical_requests(self):
+        """Clientes diferentes pedindo a mesma hashtag ao mesmo tempo geram uma chamada HTTP."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(tmp)
+            self.addCleanup(cache.close)
+            transport = MagicMock()
+
+            def slow_get(*args, **kwargs):
+                time.sleep(0.1)
+                response = MagicMock(status_code=200)
+                response.json.return_value = {"items": [{"code": "c1"}]}
+                return response
+            transport.get.side_effect = slow_get
+            host = "instagram-scraper-api2.p.rapidapi.com"
+            results, errors = self.run_concurrently(
+                lambda: RapidAPIClient("k", host, transport=transport, cache=cache).get_top_by_hashtag("arte"),
+                count=4,
+            )
+            self.assertEqual(errors, [])
+            self.assertEqual(transport.get.call_count, 1)
+            self.assertEqual(len(results), 4)
+
+    def test_coalesced_failure_counts_one_network_call(self):
+        """Uma falha coalescida chega a todos, mas só o líder registra chamada à rede, com o status tipado."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(tmp)
+            self.addCleanup(cache.close)
+            transport = MagicMock()
+
+            def slow_429(*args, **kwargs):
+                time.sleep(0.1)
+                return MagicMock(status_code=429)
+            transport.get.side_effect = slow_429
+            clients = [RapidAPIClient("k", "h", transport=transport, cache=cache) for _ in range(3)]
+            pending = iter(clients)
+            lock = threading.Lock()
+
+            def call():
+                with lock:
+                    client = next(pending)
+                return client._get_with_backoff("https://h/hashtag", {"hashtag": "arte"})
+            _, errors = self.run_concurrently(call, count=3)
+            self.assertEqual(len(errors), 3)
+            self.assertTrue(all(isinstance(e, RapidAPIError) and e.status == 429 for e in errors))
+            self.assertEqual(sum(c.network_calls for c in clients), 1)
+            self.assertEqual(transport.get.call_count, 3)  # as tentativas do líder
+
+
+if __name__ == '__main__':
+    unittest.main()
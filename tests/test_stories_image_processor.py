@@ -0,0 +1,214 @@
+"""
+Testes para o StoriesImageProcessor
+Valida o motor de gradiente e o detector de pessoas vetorizados contra as
+implementações pixel a pixel originais.
+"""
+
+import unittest
+import io
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services import stories_image_processor
+from services.image_analysis import ImageAnalysis, image_analysis_cache
+from services.blob_cache import BlobCache
+from services.stories_image_processor import StoriesImageProcessor
+
+
+def _processor(test):
+    """Processador com cache de imagens em diretório temporário (não toca o cache do projeto)."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    cache = BlobCache(tmp.name)
+    test.addCleanup(cache.close)
+    return StoriesImageProcessor(blob_cache=cache)
+
+
+def _legacy_gradient(processor, width, height, colors):
+    """Implementação original (putpixel) usada como referência."""
+    background = Image.new('RGB', (width, height))
+    for y in range(height):
+        position = y / height
+        if position <= 0.5:
+            t = position * 2
+            color = processor._interpolate_color(colors[0], colors[1], t)
+        else:
+            t = (position - 0.5) * 2
+            end_color = colors[2] if len(colors) > 2 else colors[1]
+            color = processor._interpolate_color(colors[1], end_color, t)
+        for x in range(width):
+            background.putpixel((x, y), color)
+    return background.filter(ImageFilter.GaussianBlur(radius=2))
+
+
+def _legacy_skin_ratio(section_data):
+    """Contagem de pixels de pele original (laço duplo) usada como referência."""
+    skin_pixels = 0
+    for i in range(section_data.shape[0]):
+        for j in range(section_data.shape[1]):
+            r, g, b = (int(v) for v in section_data[i, j])
+            if (r > 95 and g > 40 and b > 20 and
+                    max(r, g, b) - min(r, g, b) > 15 and
+                    abs(r - g) > 15 and r > g and r > b):
+                skin_pixels += 1
+    return skin_pixels / (section_data.shape[0] * section_data.shape[1])
+
+
+class TestGradientBackground(unittest.TestCase):
+    """Testa o gradiente vetorizado."""
+
+    def setUp(self):
+        self.processor = _processor(self)
+
+    def _max_diff(self, a, b):
+        return int(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max())
+
+    def test_matches_legacy_three_colors(self):
+        """Três cores devem reproduzir o gradiente original."""
+        colors = [(250, 10, 30), (20, 200, 90), (5, 60, 240)]
+        new = self.processor.create_gradient_background(108, 192, colors)
+        old = _legacy_gradient(self.processor, 108, 192, colors)
+        self.assertEqual(new.size, (108, 192))
+        self.assertLessEqual(self._max_diff(new, old), 1)
+
+    def test_matches_legacy_two_colors(self):
+        """Duas cores mantêm a segunda metade na cor final."""
+        colors = [(0, 0, 0), (255, 128, 64)]
+        new = self.processor.create_gradient_background(54, 96, colors)
+        old = _legacy_gradient(self.processor, 54, 96, colors)
+        self.assertLessEqual(self._max_diff(new, old), 1)
+
+    def test_single_color_expands_to_variations(self):
+        """Uma única cor gera variações claras/escuras."""
+        new = self.processor.create_gradient_background(20, 40, [(100, 100, 100)])
+        arr = np.asarray(new)
+        self.assertGreater(int(arr[2, 10, 0]), int(arr[-3, 10, 0]))
+
+    def test_n_stop_gradient(self):
+        """Gradientes com mais de três paradas passam por todas as cores."""
+        colors = [(0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+        arr = self.processor._build_vertical_gradient(4, 400, colors)
+        self.assertEqual(arr.shape, (400, 4, 3))
+        self.assertEqual(arr.dtype, np.uint8)
+        # Paradas intermediárias em 1/4, 2/4 e 3/4 da altura
+        self.assertEqual(tuple(arr[100, 0]), (255, 0, 0))
+        self.assertEqual(tuple(arr[200, 0]), (0, 255, 0))
+        self.assertEqual(tuple(arr[300, 0]), (0, 0, 255))
+        # Todas as colunas são idênticas
+        self.assertTrue((arr == arr[:, :1]).all())
+
+
+class TestPersonDetection(unittest.TestCase):
+    """Testa o detector de pessoas vetorizado."""
+
+    def setUp(self):
+        self.processor = _processor(self)
+        rng = np.random.default_rng(42)
+        self.array = rng.integers(0, 256, size=(480, 270, 3), dtype=np.uint8)
+        # Faixa com tom de pele no topo
+        self.array[20:100, 60:200] = (200, 140, 110)
+
+    def _legacy_score(self, section_data):
+        gray = np.mean(section_data, axis=2)
+        brightness_score = min(np.var(gray) / 1000.0, 1.0)
+        return min(_legacy_skin_ratio(section_data) * 0.6 + brightness_score * 0.2, 1.0)
+
+    def test_matches_legacy_per_section(self):
+        """O score vetorizado reproduz o laço original em cada seção."""
+        bounds = {'top': (0, 160), 'center': (160, 320), 'bottom': (320, 480)}
+        scores = self.processor._person_score_map(self.array, bounds)
+        self.assertEqual(set(scores), set(bounds))
+        for name, (start, end) in bounds.items():
+            section = self.array[start:end]
+            if stories_image_processor.ndimage is None:
+                self.assertAlmostEqual(scores[name], self._legacy_score(section), places=9)
+            self.assertAlmostEqual(scores[name], self.processor._detect_person_like_features(section), places=9)
+
+    def test_skin_band_raises_top_score(self):
+        """A seção com tons de pele recebe score maior."""
+        scores = self.processor._person_score_map(self.array, {'top': (0, 120), 'bottom': (360, 480)})
+        self.assertGreater(scores['top'], scores['bottom'])
+
+    def test_empty_section_scores_zero(self):
+        """Seções vazias não geram divisão por zero."""
+        scores = self.processor._person_score_map(self.array, {'none': (10, 10)})
+        self.assertEqual(scores['none'], 0.0)
+
+    def test_text_area_detection_returns_known_section(self):
+        """As heurísticas de posicionamento continuam retornando seções válidas."""
+        image = Image.fromarray(np.repeat(np.repeat(self.array, 4, axis=0), 4, axis=1))
+        self.assertIn(self.processor.detect_best_text_area(image, 100), ('top', 'center', 'bottom'))
+        self.assertIn(self.processor.detect_best_text_area_for_short_phrase(image, 100), ('top', 'bottom'))
+
+
+class TestImageAnalysisCache(unittest.TestCase):
+    """Testa o cache compartilhado de análise de imagens."""
+
+    def setUp(self):
+        self.processor = _processor(self)
+        image_analysis_cache.clear()
+        rng = np.random.default_rng(7)
+        self.image = Image.fromarray(rng.integers(0, 256, size=(960, 540, 3), dtype=np.uint8))
+
+    def test_same_content_reuses_analysis(self):
+        """Cópias com o mesmo conteúdo reaproveitam a mesma análise."""
+        first = image_analysis_cache.get(self.image)
+        second = image_analysis_cache.get(self.image.copy())
+        self.assertIs(first, second)
+        self.assertEqual(image_analysis_cache.misses, 1)
+        self.assertEqual(image_analysis_cache.hits, 1)
+
+    def test_placement_and_palette_share_analysis(self):
+        """Posicionamento e paleta usam uma única análise por imagem."""
+        self.processor.detect_best_text_area(self.image, 100)
+        self.processor.detect_best_text_area_for_short_phrase(self.image, 100)
+        palette = self.processor.get_dominant_colors(self.image)
+        self.assertEqual(palette, self.processor.get_dominant_colors(self.image))
+        self.assertEqual(image_analysis_cache.misses, 1)
+
+    def test_band_stats_match_direct_computation(self):
+        """As estatísticas por faixa equivalem ao cálculo direto."""
+        analysis = ImageAnalysis(self.image)
+        section = analysis.array[160:320]
+        stats = analysis.band_stats(160, 320)
+        self.assertAlmostEqual(stats['variance'], float(np.var(section)))
+        self.assertAlmostEqual(stats['gray_variance'], float(np.var(np.mean(section, axis=2))))
+
+    def test_cache_is_bounded(self):
+        """O cache descarta as análises menos usadas."""
+        for value in range(image_analysis_cache.max_entries + 2):
+            image_analysis_cache.get(Image.new('RGB', (8, 8), (value, value, value)))
+        self.assertEqual(len(image_analysis_cache._entries), image_analysis_cache.max_entries)
+
+
+class TestInMemoryEncoding(unittest.TestCase):
+    """Testa a entrega do JPEG em memória para o uploader."""
+
+    def setUp(self):
+        self.processor = _processor(self)
+        rng = np.random.default_rng(3)
+        self.source = Image.fromarray(rng.integers(0, 255, (400, 400, 3), dtype=np.uint8))
+
+    def test_stories_bytes_are_decodable_jpeg(self):
+        """O renderer retorna um JPEG 9:16 pronto para upload, sem arquivo temporário."""
+        with patch.object(self.processor, "download_image", return_value=self.source), \
+                patch("tempfile.NamedTemporaryFile") as temp_file:
+            data = self.processor.process_for_stories_with_text_bytes(
+                "https://exemplo/img.jpg", text="Cresça todos os dias", text_position="bottom"
+            )
+        temp_file.assert_not_called()
+        decoded = Image.open(io.BytesIO(data))
+        self.assertEqual(decoded.format, "JPEG")
+        self.assertEqual(decoded.size, (StoriesImageProcessor.STORIES_WIDTH, StoriesImageProcessor.STORIES_HEIGHT))
+
+
+if __name__ == '__main__':
+    unittest.main()